@@ -0,0 +1,34 @@
+"""add_steam_auth_sessions_table
+
+Revision ID: 3c9d2f7a1b4e
+Revises: de5113c4c3e0
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9d2f7a1b4e'
+down_revision: Union[str, Sequence[str], None] = 'de5113c4c3e0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('steam_auth_sessions',
+        sa.Column('token', sa.String(), nullable=False),
+        sa.Column('telegram_id', sa.String(), nullable=False),
+        sa.Column('chat_id', sa.String(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('token')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('steam_auth_sessions')
@@ -0,0 +1,30 @@
+"""add_poll_and_vote_indexes
+
+Revision ID: 5e8a0c6d2f91
+Revises: 3c9d2f7a1b4e
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8a0c6d2f91'
+down_revision: Union[str, Sequence[str], None] = '3c9d2f7a1b4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_polls_chat_id_trigger_time', 'polls', ['chat_id', 'trigger_time'], unique=False)
+    op.create_index('ix_votes_poll_id', 'votes', ['poll_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_votes_poll_id', table_name='votes')
+    op.drop_index('ix_polls_chat_id_trigger_time', table_name='polls')
@@ -0,0 +1,41 @@
+"""add_chat_aggregates_table
+
+Revision ID: 7f3b1d9e4a26
+Revises: 5e8a0c6d2f91
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3b1d9e4a26'
+down_revision: Union[str, Sequence[str], None] = '5e8a0c6d2f91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('chat_aggregates',
+        sa.Column('chat_id', sa.String(), nullable=False),
+        sa.Column('chat_name', sa.String(), nullable=True),
+        sa.Column('total_polls', sa.Integer(), nullable=True),
+        sa.Column('total_votes', sa.Integer(), nullable=True),
+        sa.Column('voters', sa.Integer(), nullable=True),
+        sa.Column('participation_rate', sa.Float(), nullable=True),
+        sa.Column('last_poll_end', sa.TIMESTAMP(), nullable=True),
+        sa.Column('matches_stored', sa.Integer(), nullable=True),
+        sa.Column('matches_won', sa.Integer(), nullable=True),
+        sa.Column('win_rate', sa.Float(), nullable=True),
+        sa.Column('refreshed_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('chat_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('chat_aggregates')
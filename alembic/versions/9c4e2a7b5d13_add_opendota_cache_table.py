@@ -0,0 +1,36 @@
+"""add_opendota_cache_table
+
+Revision ID: 9c4e2a7b5d13
+Revises: 7f3b1d9e4a26
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4e2a7b5d13'
+down_revision: Union[str, Sequence[str], None] = '7f3b1d9e4a26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('opendota_cache',
+        sa.Column('endpoint', sa.String(), nullable=False),
+        sa.Column('response', sa.Text(), nullable=False),
+        sa.Column('fetched_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('expires_at', sa.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('endpoint')
+    )
+    op.create_index('ix_opendota_cache_expires_at', 'opendota_cache', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_opendota_cache_expires_at', table_name='opendota_cache')
+    op.drop_table('opendota_cache')
@@ -0,0 +1,44 @@
+"""add_player_match_sync_tables
+
+Revision ID: b2d8f4a61c37
+Revises: 9c4e2a7b5d13
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d8f4a61c37'
+down_revision: Union[str, Sequence[str], None] = '9c4e2a7b5d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('player_sync_cursors',
+        sa.Column('steam_id_32', sa.String(), nullable=False),
+        sa.Column('last_match_id', sa.Integer(), nullable=True),
+        sa.Column('last_start_time', sa.Integer(), nullable=True),
+        sa.Column('synced_since', sa.Integer(), nullable=False),
+        sa.Column('synced_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('steam_id_32')
+    )
+    op.create_table('player_matches',
+        sa.Column('steam_id_32', sa.String(), nullable=False),
+        sa.Column('match_id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('steam_id_32', 'match_id')
+    )
+    op.create_index('ix_player_matches_steam_id_32_start_time', 'player_matches', ['steam_id_32', 'start_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_player_matches_steam_id_32_start_time', table_name='player_matches')
+    op.drop_table('player_matches')
+    op.drop_table('player_sync_cursors')
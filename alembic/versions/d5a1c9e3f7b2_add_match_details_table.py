@@ -0,0 +1,38 @@
+"""add_match_details_table
+
+Revision ID: d5a1c9e3f7b2
+Revises: b2d8f4a61c37
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a1c9e3f7b2'
+down_revision: Union[str, Sequence[str], None] = 'b2d8f4a61c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('match_details',
+        sa.Column('match_id', sa.Integer(), nullable=False),
+        sa.Column('radiant_win', sa.Boolean(), nullable=True),
+        sa.Column('start_time', sa.Integer(), nullable=True),
+        sa.Column('duration', sa.Integer(), nullable=True),
+        sa.Column('players', sa.Text(), nullable=False),
+        sa.Column('raw', sa.LargeBinary(), nullable=True),
+        sa.Column('raw_encoding', sa.String(), nullable=True),
+        sa.Column('fetched_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('match_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('match_details')
@@ -0,0 +1,30 @@
+"""add_notify_dota_start_to_chat_settings
+
+Revision ID: e8f6b3d2a194
+Revises: d5a1c9e3f7b2
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8f6b3d2a194'
+down_revision: Union[str, Sequence[str], None] = 'd5a1c9e3f7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('chat_settings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('notify_dota_start', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('chat_settings', schema=None) as batch_op:
+        batch_op.drop_column('notify_dota_start')
@@ -3,16 +3,22 @@ import os
 import asyncio
 from dotenv import load_dotenv
 
+from telegram import Update
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
     PollAnswerHandler,
     CallbackQueryHandler,
+    TypeHandler,
 )
 
 import handlers
+import health
+import metrics
 from scheduler import setup_jobs
+import steam
 import web_server
+import web_workers
 
 # Configure logging
 logging.basicConfig(
@@ -21,6 +27,27 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def startup(application):
+    """Prepare the bot once the Telegram application is initialized."""
+    await handlers.setup_commands(application)
+    application.create_task(metrics.monitor_event_loop_lag())
+
+
+async def start_web(application):
+    """Start the web server in this process or in separate worker processes."""
+    if web_workers.WEB_WORKERS > 0:
+        await web_workers.start_web_workers(application)
+    else:
+        await web_server.start_web_server(application)
+
+
+async def shutdown(application):
+    """Release resources held outside of the Telegram application."""
+    await web_workers.stop_web_workers()
+    await web_server.stop_web_server()
+    await steam.close_opendota_session()
+
+
 def main():
     """Main function to start the bot."""
 
@@ -34,6 +61,9 @@ def main():
     # Create the Telegram Application
     application = ApplicationBuilder().token(TOKEN).build()
 
+    # Track when updates arrive, before any other handler runs
+    application.add_handler(TypeHandler(Update, health.record_telegram_update), group=-1)
+
     # Register command handlers
     application.add_handler(CommandHandler("start", handlers.start))
     application.add_handler(CommandHandler("poll_now", handlers.poll_now_command))
@@ -47,6 +77,7 @@ def main():
         CommandHandler("get_poll_time", handlers.get_poll_time_command)
     )
     application.add_handler(CommandHandler("pause_polls", handlers.pause_polls_command))
+    application.add_handler(CommandHandler("dota_notify", handlers.dota_notify_command))
 
     # Register Steam-related command handlers
     application.add_handler(CommandHandler("link_steam", handlers.link_steam_command))
@@ -79,12 +110,13 @@ def main():
     # Register poll answer handler
     application.add_handler(PollAnswerHandler(handlers.handle_poll_answer))
 
-    # Set up bot commands to be suggested in the Telegram UI
-    application.post_init = handlers.setup_commands
+    # Set up bot commands to be suggested in the Telegram UI and start monitoring
+    application.post_init = startup
+    application.post_shutdown = shutdown
 
     # Schedule the web server to start
     application.job_queue.run_once(
-        lambda ctx: asyncio.create_task(web_server.start_web_server()), 0
+        lambda ctx: asyncio.create_task(start_web(application)), 0
     )
     logger.info("Scheduled web server startup")
 
@@ -0,0 +1,116 @@
+import logging
+import os
+import secrets
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import db
+from exceptions import DatabaseError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Session store settings
+SESSION_TTL = int(os.environ.get("STEAM_AUTH_SESSION_TTL", 15 * 60))  # seconds
+SESSION_MAX_SIZE = int(os.environ.get("STEAM_AUTH_SESSION_MAX_SIZE", 1000))
+SESSION_PERSIST = os.environ.get("STEAM_AUTH_SESSION_PERSIST", "0") == "1"
+
+
+class SteamAuthSessionStore:
+    """Pending Steam OpenID logins, keyed by the token passed through return_to"""
+
+    def __init__(self, ttl: int, max_size: int, persist: bool = False):
+        self.ttl = timedelta(seconds=ttl)
+        self.max_size = max_size
+        self.persist = persist
+        # token -> (telegram_id, chat_id, created_at), oldest first
+        self.sessions: "OrderedDict[str, Tuple[str, str, datetime]]" = OrderedDict()
+        self.user_sessions: Dict[str, str] = {}  # telegram_id -> token
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    async def create(self, telegram_id: str, chat_id: str) -> str:
+        """Start a new session for the user, replacing any pending one"""
+        telegram_id = str(telegram_id)
+        stale_tokens = self._evict_expired()
+
+        previous_token = self.user_sessions.pop(telegram_id, None)
+        if previous_token and self.sessions.pop(previous_token, None):
+            stale_tokens.append(previous_token)
+
+        while len(self.sessions) >= self.max_size:
+            token, (old_telegram_id, _, _) = self.sessions.popitem(last=False)
+            self.user_sessions.pop(old_telegram_id, None)
+            stale_tokens.append(token)
+            logger.warning(f"Steam auth session store is full, dropped session of user {old_telegram_id}")
+
+        token = secrets.token_urlsafe(16)
+        created_at = datetime.now()
+        self.sessions[token] = (telegram_id, chat_id, created_at)
+        self.user_sessions[telegram_id] = token
+
+        if self.persist:
+            try:
+                await db.store_steam_auth_session(token, telegram_id, chat_id, created_at)
+                if stale_tokens:
+                    await db.delete_steam_auth_sessions(stale_tokens)
+            except DatabaseError as e:
+                logger.error(f"Failed to persist Steam auth session: {e}")
+
+        return token
+
+    async def pop(self, token: str) -> Optional[Tuple[str, str]]:
+        """Remove and return (telegram_id, chat_id) for a live session"""
+        stale_tokens = self._evict_expired()
+        session = self.sessions.pop(token, None)
+
+        if session:
+            telegram_id, chat_id, _ = session
+            if self.user_sessions.get(telegram_id) == token:
+                del self.user_sessions[telegram_id]
+            stale_tokens.append(token)
+
+        if self.persist and stale_tokens:
+            try:
+                await db.delete_steam_auth_sessions(stale_tokens)
+            except DatabaseError as e:
+                logger.error(f"Failed to delete persisted Steam auth sessions: {e}")
+
+        return (session[0], session[1]) if session else None
+
+    async def load(self) -> None:
+        """Restore persisted sessions that have not expired yet"""
+        if not self.persist:
+            return
+
+        try:
+            rows = await db.get_steam_auth_sessions(datetime.now() - self.ttl)
+        except DatabaseError as e:
+            logger.error(f"Failed to load persisted Steam auth sessions: {e}")
+            return
+
+        for token, telegram_id, chat_id, created_at in rows[-self.max_size:]:
+            self.sessions[token] = (telegram_id, chat_id or "", created_at)
+            self.user_sessions[telegram_id] = token
+
+        logger.info(f"Restored {len(self.sessions)} pending Steam auth sessions")
+
+    def _evict_expired(self) -> list:
+        """Drop expired sessions from the front of the queue and return their tokens"""
+        expired = []
+        deadline = datetime.now() - self.ttl
+        while self.sessions:
+            token, (telegram_id, _, created_at) = next(iter(self.sessions.items()))
+            if created_at >= deadline:
+                break
+            self.sessions.popitem(last=False)
+            if self.user_sessions.get(telegram_id) == token:
+                del self.user_sessions[telegram_id]
+            expired.append(token)
+        return expired
+
+
+# Create a global instance
+steam_auth_sessions = SteamAuthSessionStore(SESSION_TTL, SESSION_MAX_SIZE, SESSION_PERSIST)
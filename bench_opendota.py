@@ -0,0 +1,74 @@
+"""Benchmark of the OpenDota client against the local OpenDota/Steam mock.
+
+Compares a new ClientSession per request (the previous behaviour) with the
+pooled session in steam.py, counting the TCP connections the server accepted.
+
+Usage: python bench_opendota.py [--requests 200] [--latency 0.005] [--concurrency 10]
+"""
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+import steam
+from mock_steam_api import MockSteamApi
+
+
+async def fetch_with_new_session(url):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            return await response.json()
+
+
+async def run(label, mock, fetch, requests, concurrency):
+    mock.connections.clear()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await fetch(i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<22} {elapsed * 1000:8.1f} ms total  {elapsed / requests * 1000:6.2f} ms/request  "
+        f"{len(mock.connections):4d} connections"
+    )
+
+
+async def main(requests, latency, concurrency):
+    mock = MockSteamApi(players=requests, days=0, latency=latency)
+    await mock.start()
+    steam.OPENDOTA_API_URL = mock.opendota_url
+    # Measure the connections, not the rate limit
+    steam.opendota_limiter = steam.PriorityTokenBucket(rate=1e9, capacity=requests)
+    try:
+        await run(
+            "new session per call",
+            mock,
+            lambda i: fetch_with_new_session(f"{mock.opendota_url}/players/{i + 1}"),
+            requests,
+            concurrency,
+        )
+        await run(
+            "pooled session",
+            mock,
+            lambda i: steam._send_opendota_request(f"players/{i + 1}"),
+            requests,
+            concurrency,
+        )
+    finally:
+        await steam.close_opendota_session()
+        await mock.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005, help="server latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.latency, args.concurrency))
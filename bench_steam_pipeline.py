@@ -0,0 +1,125 @@
+"""Benchmark of the Dota pipeline against the local OpenDota/Steam mock.
+
+Seeds a temporary database with chats of linked players who just took part in
+a poll, then times check_and_store_dota_games (cold, then warm with the local
+stores filled), get_steam_player_statuses and a Steam presence refresh, and
+prints how many requests every mocked endpoint served.
+
+Usage: python bench_steam_pipeline.py [--players 20] [--days 30] [--latency 0.02]
+                                      [--error-rate 0.0] [--rate-limit-rate 0.0]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import db
+import presence
+import steam
+from mock_steam_api import PARTY_SIZE, STEAM_ID_64_OFFSET, MockSteamApi
+
+
+class RecordingBot:
+    """Stands in for the Telegram bot and keeps the messages it was asked to send"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.messages.append((chat_id, text))
+
+
+class BenchContext:
+    def __init__(self):
+        self.bot = RecordingBot()
+        self.job = None
+
+
+def seed_database(mock):
+    """Links every mock account to a user and puts each party into a chat of its own"""
+    session = db.SessionLocal()
+    chats = {}
+    for account_id in mock.account_ids:
+        steam_id_64 = str(account_id + STEAM_ID_64_OFFSET)
+        chat_id = str(-100 - (account_id - 1) // PARTY_SIZE)
+        session.add(db.User(telegram_id=str(account_id), steam_id=steam_id_64, first_name=f"user{account_id}"))
+        session.add(db.UserSteamChat(telegram_id=str(account_id), steam_id=steam_id_64, chat_id=chat_id))
+        chats.setdefault(chat_id, []).append(str(account_id))
+    session.commit()
+    session.close()
+    return chats
+
+
+async def add_poll_participants(chats):
+    for chat_id, user_ids in chats.items():
+        await db.store_game_participants(chat_id, user_ids)
+
+
+async def timed(label, mock, coro):
+    before = mock.requests.copy()
+    started = time.perf_counter()
+    result = await coro
+    elapsed = time.perf_counter() - started
+    served = sum((mock.requests - before).values())
+    print(f"{label:<34} {elapsed * 1000:9.1f} ms  {served:5d} requests")
+    return result
+
+
+async def main(args):
+    mock = MockSteamApi(
+        players=args.players,
+        days=args.days,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+    )
+    await mock.start()
+    steam.OPENDOTA_API_URL = mock.opendota_url
+    steam.STEAM_API_URL = mock.steam_url
+    steam.STEAM_API_KEY = "bench"
+    # Measure the pipeline, not the rate limits of the real APIs
+    steam.opendota_limiter = steam.PriorityTokenBucket(rate=1e9, capacity=1000)
+    steam.steam_api_limiter = steam.PriorityTokenBucket(rate=1e9, capacity=1000)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        db.Base.metadata.create_all(engine)
+        db.SessionLocal = sessionmaker(bind=engine)
+        chats = seed_database(mock)
+        context = BenchContext()
+
+        try:
+            await add_poll_participants(chats)
+            await timed("check_and_store_dota_games (cold)", mock, steam.check_and_store_dota_games(context))
+            await add_poll_participants(chats)
+            await timed("check_and_store_dota_games (warm)", mock, steam.check_and_store_dota_games(context))
+
+            chat_id = next(iter(chats))
+            await timed("get_steam_player_statuses", mock, steam.get_steam_player_statuses(chat_id))
+            tracker = presence.PresenceTracker()
+            await timed("presence refresh", mock, tracker.refresh())
+        finally:
+            await steam.close_opendota_session()
+            await mock.stop()
+            engine.dispose()
+
+    print(f"\n{len(context.bot.messages)} messages sent, {mock.bytes_sent / 1024:.0f} KiB served")
+    for route, count in sorted(mock.requests.items()):
+        print(f"{count:6d}  {route}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30, help="days of generated match history")
+    parser.add_argument("--latency", type=float, default=0.02, help="server latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After of injected 429s in seconds")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,137 @@
+"""Server-side SVG charts for the statistics page."""
+
+import os
+from collections import OrderedDict
+from html import escape
+
+CHART_WIDTH = 640
+CHART_COLORS = ["#5865F2", "#57F287", "#ED4245", "#FEE75C", "#EB459E"]
+TEXT_COLOR = "#333"
+GRID_COLOR = "#ddd"
+
+# Display order of the grouped series
+WEEKDAY_ORDER = [
+    "Понедельник",
+    "Вторник",
+    "Среда",
+    "Четверг",
+    "Пятница",
+    "Суббота",
+    "Воскресенье",
+]
+TIME_OF_DAY_ORDER = ["Утро", "День", "Вечер", "Ночь"]
+
+# Rendered charts keyed by (chat_id, chart name, data version), least recently used first
+CHART_CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", 256))
+_chart_cache = OrderedDict()
+
+
+def get_cached_chart(key):
+    """Return a cached chart and mark it as recently used"""
+    svg = _chart_cache.get(key)
+    if svg is not None:
+        _chart_cache.move_to_end(key)
+    return svg
+
+
+def store_chart(key, svg):
+    """Cache a rendered chart, evicting the least recently used ones"""
+    _chart_cache[key] = svg
+    _chart_cache.move_to_end(key)
+    while len(_chart_cache) > CHART_CACHE_SIZE:
+        _chart_cache.popitem(last=False)
+
+
+def _color(index):
+    return CHART_COLORS[index % len(CHART_COLORS)]
+
+
+def _shorten(text, length):
+    return text if len(text) <= length else text[: length - 1] + "…"
+
+
+def _svg(width, height, body):
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="Segoe UI, Tahoma, sans-serif" font-size="12">'
+        f"{''.join(body)}</svg>"
+    )
+
+
+def render_bar_chart(labels, values):
+    """Horizontal bars, one per label"""
+    row_height = 28
+    label_width = 220
+    bar_area = CHART_WIDTH - label_width - 50
+    max_value = max(values) if values and max(values) > 0 else 1
+    height = row_height * len(labels) + 10
+
+    body = []
+    for i, (label, value) in enumerate(zip(labels, values)):
+        y = 5 + i * row_height
+        bar_width = round(bar_area * value / max_value, 1)
+        body.append(
+            f'<text x="0" y="{y + 18}" fill="{TEXT_COLOR}">{escape(_shorten(label, 32))}</text>'
+            f'<rect x="{label_width}" y="{y + 4}" width="{bar_width}" height="{row_height - 8}" '
+            f'rx="3" fill="{_color(i)}"/>'
+            f'<text x="{label_width + bar_width + 6}" y="{y + 18}" fill="{TEXT_COLOR}">{value}</text>'
+        )
+    return _svg(CHART_WIDTH, height, body)
+
+
+def render_stacked_chart(categories, votes_by_category, series_labels):
+    """Vertical columns per category, stacked by series, with a legend below"""
+    plot_top = 10
+    plot_height = 180
+    axis_y = plot_top + plot_height
+    legend_row_height = 18
+    height = axis_y + 30 + legend_row_height * len(series_labels)
+
+    totals = [sum(votes_by_category.get(category, [])) for category in categories]
+    max_total = max(totals) if totals and max(totals) > 0 else 1
+    slot_width = (CHART_WIDTH - 40) / max(len(categories), 1)
+    column_width = min(60, slot_width * 0.6)
+
+    body = [
+        f'<line x1="30" y1="{axis_y}" x2="{CHART_WIDTH}" y2="{axis_y}" stroke="{GRID_COLOR}"/>',
+        f'<text x="0" y="{plot_top + 10}" fill="{TEXT_COLOR}">{max_total}</text>',
+    ]
+    for i, category in enumerate(categories):
+        x = 40 + i * slot_width + (slot_width - column_width) / 2
+        y = axis_y
+        for series_index, value in enumerate(votes_by_category.get(category, [])):
+            if value <= 0:
+                continue
+            segment_height = plot_height * value / max_total
+            y -= segment_height
+            body.append(
+                f'<rect x="{x:.1f}" y="{y:.1f}" width="{column_width:.1f}" '
+                f'height="{segment_height:.1f}" fill="{_color(series_index)}">'
+                f"<title>{escape(series_labels[series_index])}: {value}</title></rect>"
+            )
+        body.append(
+            f'<text x="{x + column_width / 2:.1f}" y="{axis_y + 16}" text-anchor="middle" '
+            f'fill="{TEXT_COLOR}">{escape(_shorten(category, 11))}</text>'
+        )
+
+    for series_index, label in enumerate(series_labels):
+        y = axis_y + 30 + series_index * legend_row_height
+        body.append(
+            f'<rect x="30" y="{y}" width="12" height="12" fill="{_color(series_index)}"/>'
+            f'<text x="48" y="{y + 10}" fill="{TEXT_COLOR}">{escape(label)}</text>'
+        )
+    return _svg(CHART_WIDTH, height, body)
+
+
+def render_stats_charts(stats_data):
+    """Render all charts of the statistics page from its aggregates"""
+    poll_options = stats_data["poll_options"]
+    return {
+        "options": render_bar_chart(poll_options, stats_data["option_votes"]),
+        "weekdays": render_stacked_chart(
+            WEEKDAY_ORDER, stats_data["weekday_votes_data"], poll_options
+        ),
+        "times": render_stacked_chart(
+            TIME_OF_DAY_ORDER, stats_data["time_votes_data"], poll_options
+        ),
+    }
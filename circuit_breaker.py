@@ -0,0 +1,81 @@
+"""Circuit breaker that stops calls to a failing service and probes it before resuming."""
+
+import logging
+import math
+import time
+from collections import deque
+from datetime import datetime
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and fails calls fast while open.
+
+    After `reset_timeout` seconds one probe call is let through (half-open): its
+    success closes the breaker, its failure opens it again. Latencies of
+    successful calls are kept to pick a hedging delay.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, latency_window: int = 100):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.last_success = None
+        self.last_failure = None
+        self.latencies = deque(maxlen=latency_window)
+
+    def allow_request(self) -> bool:
+        """Whether a call may go out now; in half-open state only a single probe may"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def record_success(self, latency: float = None) -> None:
+        self.consecutive_failures = 0
+        self.last_success = datetime.now()
+        self.probe_in_flight = False
+        if latency is not None:
+            self.latencies.append(latency)
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self.last_failure = datetime.now()
+        self.probe_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            if self.state != OPEN:
+                self._set_state(OPEN)
+
+    def release(self) -> None:
+        """End a call that neither succeeded nor failed, e.g. a client error"""
+        self.probe_in_flight = False
+
+    def latency_percentile(self, percentile: float, min_samples: int = 20):
+        """Latency below which `percentile` percent of recent calls finished, or None with too few samples"""
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, math.ceil(len(ordered) * percentile / 100) - 1)
+        return ordered[max(index, 0)]
+
+    def _set_state(self, state: str) -> None:
+        logger.warning(f"{self.name} circuit breaker {self.state} -> {state}")
+        self.state = state
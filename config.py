@@ -33,6 +33,7 @@ MSG_MANUAL_POLL_INVITATION = "{user_name} приглашает всех на п
 MSG_POLL_STATUS = "Статус опроса:"
 MSG_VOTED = "Проголосовали:"
 MSG_NOT_VOTED_YET = "Еще не проголосовали:"
+MSG_LIVE_URL = "Следить за опросом в реальном времени: {url}"
 MSG_STATS_TITLE = "📊 Статистика опросов"
 MSG_TOTAL_POLLS = "Всего опросов: {total_polls}"
 MSG_MOST_POPULAR_OPTION = "Самый популярный ответ: {option} ({count} голосов)"
@@ -80,6 +81,14 @@ MSG_UNLINK_STEAM_CANCEL = "❌ Отвязка Steam аккаунта отмен
 MSG_WHO_IS_PLAYING_CHECKING = "🔍 Проверяю статус игроков..."
 MSG_STEAM_API_KEY_MISSING = "⚠️ Не задан API ключ Steam. Обратитесь к администратору бота."
 MSG_WHO_IS_PLAYING_ERROR = "❌ Произошла ошибка: {error}"
+MSG_WHO_IS_PLAYING_IN_DOTA = "🎮 В Dota 2:"
+MSG_WHO_IS_PLAYING_ONLINE = "Онлайн:"
+MSG_WHO_IS_PLAYING_OFFLINE = "Оффлайн:"
+MSG_WHO_IS_PLAYING_UPDATED = "🕒 Данные обновлены {age} назад"
+MSG_DOTA_STARTED_PLAYING = "🎮 Зашли в Dota 2: {players}"
+MSG_DOTA_NOTIFY_ON = "🔔 Буду сообщать в этом чате, когда кто-то заходит в Dota 2."
+MSG_DOTA_NOTIFY_OFF = "🔕 Больше не сообщаю в этом чате, когда кто-то заходит в Dota 2."
+MSG_DOTA_NOTIFY_USAGE = "Использование: /dota_notify on|off"
 MSG_POLL_RESULT_ALL_ACCEPTED = "Сасают все!"
 MSG_POLL_RESULT_ALL_DECLINED = "Сегодня никто не хочет сасать, даешь отдых глотке!"
 MSG_POLL_RESULT_ALL_DEFERRED = "Пока что никто не готов сасать, предлагали подождать {delay} минут"
@@ -1,15 +1,19 @@
 import asyncio
+import json
 import logging
 import os
 import sys
+import time
 import traceback
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 
-from sqlalchemy import create_engine, Column, Integer, String, TIMESTAMP, ForeignKey, Boolean, func, or_
+from sqlalchemy import create_engine, Column, Integer, Float, String, Text, LargeBinary, TIMESTAMP, ForeignKey, Boolean, Index, false, func, or_, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+import metrics
 from exceptions import DatabaseError
 from utils import convert_steamid_64_to_32
 
@@ -18,7 +22,11 @@ logger = logging.getLogger(__name__)
 
 # Constants
 DB_FILE = "poll_bot.db"
-DATABASE_URL = f"sqlite:///{DB_FILE}"
+# Web worker processes only read, the bot process is the only writer
+DB_READ_ONLY = os.environ.get("DB_READ_ONLY", "0") == "1"
+DATABASE_URL = (
+    f"sqlite:///file:{DB_FILE}?mode=ro&uri=true" if DB_READ_ONLY else f"sqlite:///{DB_FILE}"
+)
 
 # SQLAlchemy setup
 engine = create_engine(DATABASE_URL)
@@ -46,6 +54,8 @@ class Poll(Base):
     trigger_type = Column(String)
     total_votes = Column(Integer, default=0)
 
+    __table_args__ = (Index("ix_polls_chat_id_trigger_time", "chat_id", "trigger_time"),)
+
 
 class Vote(Base):
     __tablename__ = "votes"
@@ -55,6 +65,8 @@ class Vote(Base):
     option_index = Column(Integer)
     response_time = Column(TIMESTAMP)
 
+    __table_args__ = (Index("ix_votes_poll_id", "poll_id"),)
+
 
 class LastActivity(Base):
     __tablename__ = "last_activity"
@@ -68,6 +80,7 @@ class ChatSettings(Base):
     poll_time = Column(String, default="15:30")
     chat_name = Column(String)
     paused_polls_count = Column(Integer, default=0)
+    notify_dota_start = Column(Boolean, default=False, server_default=false(), nullable=False)
 
 
 class UserSteamChat(Base):
@@ -98,8 +111,100 @@ class GameParticipant(Base):
     poll_end_time = Column(TIMESTAMP, default=datetime.now)
 
 
+class SteamAuthSession(Base):
+    __tablename__ = "steam_auth_sessions"
+    token = Column(String, primary_key=True)
+    telegram_id = Column(String, nullable=False)
+    chat_id = Column(String)
+    created_at = Column(TIMESTAMP, default=datetime.now)
+
+
+class ChatAggregate(Base):
+    """Per-chat totals for the admin dashboard, rebuilt periodically by a job"""
+
+    __tablename__ = "chat_aggregates"
+    chat_id = Column(String, primary_key=True)
+    chat_name = Column(String)
+    total_polls = Column(Integer, default=0)
+    total_votes = Column(Integer, default=0)
+    voters = Column(Integer, default=0)
+    participation_rate = Column(Float, default=0.0)
+    last_poll_end = Column(TIMESTAMP)
+    matches_stored = Column(Integer, default=0)
+    matches_won = Column(Integer, default=0)
+    win_rate = Column(Float)
+    refreshed_at = Column(TIMESTAMP, default=datetime.now)
+
+
+class OpenDotaCacheEntry(Base):
+    """OpenDota response kept until it expires, so restarts don't refetch everything"""
+
+    __tablename__ = "opendota_cache"
+    endpoint = Column(String, primary_key=True)
+    response = Column(Text, nullable=False)
+    fetched_at = Column(TIMESTAMP, nullable=False, default=datetime.now)
+    expires_at = Column(TIMESTAMP, nullable=False)
+
+    __table_args__ = (Index("ix_opendota_cache_expires_at", "expires_at"),)
+
+
+class PlayerSyncCursor(Base):
+    """How far a player's OpenDota match history has been synced into player_matches"""
+
+    __tablename__ = "player_sync_cursors"
+    steam_id_32 = Column(String, primary_key=True)
+    last_match_id = Column(Integer)  # newest synced match
+    last_start_time = Column(Integer)  # unix time the newest synced match started
+    synced_since = Column(Integer, nullable=False)  # unix time the synced history reaches back to
+    synced_at = Column(TIMESTAMP, default=datetime.now)
+
+
+class PlayerMatch(Base):
+    __tablename__ = "player_matches"
+    steam_id_32 = Column(String, primary_key=True)
+    match_id = Column(Integer, primary_key=True)
+    start_time = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_player_matches_steam_id_32_start_time", "steam_id_32", "start_time"),)
+
+
+class MatchDetails(Base):
+    """Projected OpenDota match details, plus the compressed raw payload if it was kept"""
+
+    __tablename__ = "match_details"
+    match_id = Column(Integer, primary_key=True)
+    radiant_win = Column(Boolean)
+    start_time = Column(Integer)
+    duration = Column(Integer)
+    players = Column(Text, nullable=False)  # JSON list of projected players
+    raw = Column(LargeBinary)
+    raw_encoding = Column(String)
+    fetched_at = Column(TIMESTAMP, default=datetime.now)
+
+
+class InstrumentedSemaphore:
+    """Single-holder semaphore that records wait and hold times."""
+
+    def __init__(self):
+        self._semaphore = asyncio.Semaphore(1)
+        self._acquired_at = None
+
+    def locked(self):
+        return self._semaphore.locked()
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        await self._semaphore.acquire()
+        self._acquired_at = time.perf_counter()
+        metrics.DB_WAIT_SECONDS.observe(self._acquired_at - started)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        metrics.DB_EXEC_SECONDS.observe(time.perf_counter() - self._acquired_at)
+        self._semaphore.release()
+
+
 # Global semaphore for database access
-db_semaphore = asyncio.Semaphore(1)
+db_semaphore = InstrumentedSemaphore()
 
 
 def log_error_with_link(error_msg, e):
@@ -127,6 +232,21 @@ def get_db_session():
         session.close()
 
 
+def _ping():
+    with get_db_session() as session:
+        session.execute(text("SELECT 1"))
+
+
+async def ping():
+    """Run a trivial query to check that the database is reachable.
+
+    The query runs in an executor, so a hanging database cannot block the event loop
+    and callers can time out waiting for it.
+    """
+    async with db_semaphore:
+        await asyncio.get_running_loop().run_in_executor(None, _ping)
+
+
 async def store_user_info(user):
     """Store or update user information in the database"""
     async with db_semaphore:
@@ -229,6 +349,15 @@ async def get_steam_users():
             return steam_users, last_activities
 
 
+async def get_linked_steam_ids():
+    """Get the 64-bit Steam IDs of all linked accounts, in any chat."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            steam_ids = {row[0] for row in session.query(UserSteamChat.steam_id).filter(UserSteamChat.steam_id.isnot(None)).distinct()}
+            steam_ids.update(row[0] for row in session.query(User.steam_id).filter(User.steam_id.isnot(None)).distinct())
+            return sorted(steam_ids)
+
+
 async def update_user_steam_id(user_id, steam_id, chat_id=None):
     """Update user's Steam ID and optionally link it to a specific chat"""
     async with db_semaphore:
@@ -437,6 +566,47 @@ async def get_paused_polls(chat_id):
             return chat_settings.paused_polls_count if chat_settings else 0
 
 
+async def set_dota_start_notifications(chat_id, enabled):
+    """Turn "started playing Dota 2" notifications on or off for a chat."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            chat_settings = (
+                session.query(ChatSettings).filter(ChatSettings.chat_id == str(chat_id)).first()
+            )
+            if chat_settings:
+                chat_settings.notify_dota_start = enabled
+            else:
+                chat_settings = ChatSettings(chat_id=str(chat_id), notify_dota_start=enabled)
+                session.add(chat_settings)
+            return True
+
+
+async def get_dota_start_notification_chats():
+    """Get the IDs of the chats that opted in to "started playing Dota 2" notifications."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            rows = session.query(ChatSettings.chat_id).filter(ChatSettings.notify_dota_start.is_(True))
+            return [row[0] for row in rows]
+
+
+async def get_chats_by_steam_ids_32(steam_ids_32):
+    """Get the chats the given accounts are linked in, with the accounts of each chat."""
+    steam_ids_64 = {str(int(steam_id_32) + 76561197960265728): str(steam_id_32) for steam_id_32 in steam_ids_32}
+    if not steam_ids_64:
+        return {}
+    async with db_semaphore:
+        with get_db_session() as session:
+            rows = (
+                session.query(UserSteamChat.chat_id, UserSteamChat.steam_id)
+                .filter(UserSteamChat.steam_id.in_(list(steam_ids_64)))
+                .distinct()
+            )
+            chats = {}
+            for chat_id, steam_id in rows:
+                chats.setdefault(chat_id, []).append(steam_ids_64[steam_id])
+            return chats
+
+
 async def decrement_paused_polls(chat_id):
     """Decrement the paused polls count for a chat."""
     async with db_semaphore:
@@ -544,6 +714,35 @@ async def store_match(match_id, chat_id, winner, radiant_players, dire_players):
             session.add(match)
 
 
+async def store_matches(chat_id, matches):
+    """Store several matches of a chat at once, skipping any that are already stored.
+
+    Each match is a (match_id, winner, radiant_players, dire_players) tuple.
+    """
+    if not matches:
+        return
+    async with db_semaphore:
+        with get_db_session() as session:
+            now = datetime.now()
+            session.execute(
+                sqlite_insert(Match)
+                .values(
+                    [
+                        {
+                            "match_id": str(match_id),
+                            "chat_id": str(chat_id),
+                            "winner": winner,
+                            "radiant_players": radiant_players,
+                            "dire_players": dire_players,
+                            "created_at": now,
+                        }
+                        for match_id, winner, radiant_players, dire_players in matches
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=["match_id"])
+            )
+
+
 async def get_games_stats(chat_id, days, user_id=None):
     """Get games statistics for a chat or a user."""
     async with db_semaphore:
@@ -584,7 +783,10 @@ async def get_game_participants():
     async with db_semaphore:
         with get_db_session() as session:
             time_filter = datetime.now() - timedelta(hours=2)
-            return session.query(GameParticipant).filter(GameParticipant.poll_end_time >= time_filter).all()
+            participants = session.query(GameParticipant).filter(GameParticipant.poll_end_time >= time_filter).all()
+            # Detach before the commit so the loaded values stay readable
+            session.expunge_all()
+            return participants
 
 
 async def delete_game_participants(participant_ids):
@@ -618,6 +820,28 @@ async def get_match(match_id):
             return session.query(Match).filter(Match.match_id == str(match_id)).first()
 
 
+async def get_existing_match_ids(match_ids):
+    """Get which of the given match IDs are already stored, as strings."""
+    match_ids = [str(match_id) for match_id in match_ids]
+    if not match_ids:
+        return set()
+    async with db_semaphore:
+        with get_db_session() as session:
+            rows = session.query(Match.match_id).filter(Match.match_id.in_(match_ids))
+            return {row[0] for row in rows}
+
+
+async def get_user_names_by_steam_ids_32(steam_ids_32):
+    """Get the first names of the users linked to 32-bit Steam IDs; unknown IDs are left out."""
+    steam_ids_64 = {str(int(steam_id_32) + 76561197960265728): str(steam_id_32) for steam_id_32 in steam_ids_32}
+    if not steam_ids_64:
+        return {}
+    async with db_semaphore:
+        with get_db_session() as session:
+            rows = session.query(User.steam_id, User.first_name).filter(User.steam_id.in_(list(steam_ids_64)))
+            return {steam_ids_64[steam_id]: first_name for steam_id, first_name in rows}
+
+
 async def get_user_info_by_steam_id_32(steam_id_32):
     """Get user information by 32-bit steam ID."""
     async with db_semaphore:
@@ -632,4 +856,324 @@ async def get_user_info_by_steam_id_32(steam_id_32):
                     "last_name": user.last_name,
                     "steam_id": user.steam_id,
                 }
-            return None
\ No newline at end of file
+            return None
+
+
+async def store_steam_auth_session(token, telegram_id, chat_id, created_at):
+    """Persist a pending Steam authentication session."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            session.merge(
+                SteamAuthSession(
+                    token=token,
+                    telegram_id=str(telegram_id),
+                    chat_id=str(chat_id) if chat_id else None,
+                    created_at=created_at,
+                )
+            )
+
+
+async def delete_steam_auth_sessions(tokens):
+    """Delete persisted Steam authentication sessions by token."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            session.query(SteamAuthSession).filter(SteamAuthSession.token.in_(tokens)).delete(synchronize_session=False)
+
+
+async def get_steam_auth_sessions(created_after):
+    """Get persisted Steam authentication sessions created after the given time."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            session.query(SteamAuthSession).filter(SteamAuthSession.created_at < created_after).delete(synchronize_session=False)
+            rows = (
+                session.query(SteamAuthSession)
+                .filter(SteamAuthSession.created_at >= created_after)
+                .order_by(SteamAuthSession.created_at)
+                .all()
+            )
+            return [(row.token, row.telegram_id, row.chat_id, row.created_at) for row in rows]
+
+
+async def get_opendota_cache(endpoint, include_expired=False):
+    """Get the cached OpenDota response of an endpoint if it has not expired, or at all."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            query = session.query(OpenDotaCacheEntry).filter(OpenDotaCacheEntry.endpoint == endpoint)
+            if not include_expired:
+                query = query.filter(OpenDotaCacheEntry.expires_at > datetime.now())
+            entry = query.first()
+            return entry.response if entry else None
+
+
+async def store_opendota_cache(endpoint, response, expires_at):
+    """Store the OpenDota response of an endpoint until the given time."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            session.merge(
+                OpenDotaCacheEntry(
+                    endpoint=endpoint,
+                    response=response,
+                    fetched_at=datetime.now(),
+                    expires_at=expires_at,
+                )
+            )
+
+
+async def purge_opendota_cache(expired_before=None):
+    """Delete OpenDota responses that expired before a time (default now) and return how many were removed."""
+    expired_before = expired_before or datetime.now()
+    async with db_semaphore:
+        with get_db_session() as session:
+            return (
+                session.query(OpenDotaCacheEntry)
+                .filter(OpenDotaCacheEntry.expires_at <= expired_before)
+                .delete(synchronize_session=False)
+            )
+
+
+async def get_player_sync_cursor(steam_id_32):
+    """Get how far a player's match history has been synced, or None before the first sync."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            cursor = session.get(PlayerSyncCursor, str(steam_id_32))
+            if not cursor:
+                return None
+            first_match_id = (
+                session.query(func.min(PlayerMatch.match_id))
+                .filter(PlayerMatch.steam_id_32 == str(steam_id_32))
+                .scalar()
+            )
+            return {
+                "first_match_id": first_match_id,
+                "last_match_id": cursor.last_match_id,
+                "last_start_time": cursor.last_start_time,
+                "synced_since": cursor.synced_since,
+                "synced_at": cursor.synced_at,
+            }
+
+
+async def store_player_matches(steam_id_32, matches, synced_since):
+    """Store newly synced matches of a player and move their sync cursor forward."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            steam_id_32 = str(steam_id_32)
+            known_ids = {
+                row[0]
+                for row in session.query(PlayerMatch.match_id).filter(
+                    PlayerMatch.steam_id_32 == steam_id_32,
+                    PlayerMatch.match_id.in_([m["match_id"] for m in matches]),
+                )
+            }
+            for match in matches:
+                if match["match_id"] not in known_ids:
+                    known_ids.add(match["match_id"])
+                    session.add(
+                        PlayerMatch(
+                            steam_id_32=steam_id_32,
+                            match_id=match["match_id"],
+                            start_time=match["start_time"],
+                        )
+                    )
+
+            cursor = session.get(PlayerSyncCursor, steam_id_32)
+            if not cursor:
+                cursor = PlayerSyncCursor(steam_id_32=steam_id_32, synced_since=synced_since)
+                session.add(cursor)
+            cursor.synced_since = min(cursor.synced_since, synced_since)
+            cursor.synced_at = datetime.now()
+            if matches:
+                newest = max(matches, key=lambda m: m["match_id"])
+                if cursor.last_match_id is None or newest["match_id"] > cursor.last_match_id:
+                    cursor.last_match_id = newest["match_id"]
+                    cursor.last_start_time = newest["start_time"]
+
+
+async def get_player_match_ids(steam_id_32, since):
+    """Get the IDs of a player's synced matches that started at or after a unix time."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            rows = session.query(PlayerMatch.match_id).filter(
+                PlayerMatch.steam_id_32 == str(steam_id_32), PlayerMatch.start_time >= since
+            )
+            return {row[0] for row in rows}
+
+
+def _match_details_dict(details):
+    return {
+        "match_id": details.match_id,
+        "radiant_win": details.radiant_win,
+        "start_time": details.start_time,
+        "duration": details.duration,
+        "players": json.loads(details.players),
+    }
+
+
+async def get_match_details_many(match_ids):
+    """Get the stored projections of several matches, keyed by match ID; unknown matches are left out."""
+    match_ids = [int(match_id) for match_id in match_ids]
+    if not match_ids:
+        return {}
+    async with db_semaphore:
+        with get_db_session() as session:
+            rows = session.query(MatchDetails).filter(MatchDetails.match_id.in_(match_ids)).all()
+            return {row.match_id: _match_details_dict(row) for row in rows}
+
+
+async def store_match_details(details, raw=None, raw_encoding=None):
+    """Store the projection of a match's details and optionally its encoded raw payload."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            session.merge(
+                MatchDetails(
+                    match_id=int(details["match_id"]),
+                    radiant_win=details["radiant_win"],
+                    start_time=details["start_time"],
+                    duration=details["duration"],
+                    players=json.dumps(details["players"]),
+                    raw=raw,
+                    raw_encoding=raw_encoding,
+                    fetched_at=datetime.now(),
+                )
+            )
+
+
+async def get_raw_match_details(match_id):
+    """Get the encoded raw payload of a match and its encoding, or None if it was not kept."""
+    async with db_semaphore:
+        with get_db_session() as session:
+            details = session.get(MatchDetails, int(match_id))
+            if not details or details.raw is None:
+                return None
+            return details.raw, details.raw_encoding
+
+
+# Columns the admin dashboard can sort chats by
+CHAT_AGGREGATE_SORT_COLUMNS = {
+    "polls": ChatAggregate.total_polls,
+    "participation": ChatAggregate.participation_rate,
+    "last_activity": ChatAggregate.last_poll_end,
+    "matches": ChatAggregate.matches_stored,
+    "win_rate": ChatAggregate.win_rate,
+}
+
+
+def _chat_won_match(match, chat_steam_ids_32):
+    """Whether a player of the chat was on the winning side of a match."""
+    radiant_players = match.radiant_players.split(",") if match.radiant_players else []
+    dire_players = match.dire_players.split(",") if match.dire_players else []
+    if match.winner == "radiant":
+        return any(p in radiant_players for p in chat_steam_ids_32)
+    return any(p in dire_players for p in chat_steam_ids_32)
+
+
+def _compute_chat_aggregates():
+    """Aggregate polls, votes and matches per chat; a plain read, run in an executor."""
+    with get_db_session() as session:
+        poll_counts = dict(
+            session.query(Poll.chat_id, func.count(Poll.id)).group_by(Poll.chat_id).all()
+        )
+        vote_counts = {
+            chat_id: (total_votes, voters)
+            for chat_id, total_votes, voters in session.query(
+                Poll.chat_id, func.count(Vote.id), func.count(func.distinct(Vote.user_id))
+            )
+            .join(Vote, Vote.poll_id == Poll.id)
+            .group_by(Poll.chat_id)
+            .all()
+        }
+        last_activity = dict(
+            session.query(LastActivity.chat_id, LastActivity.last_poll_end).all()
+        )
+
+        # Steam accounts of every chat, linked per chat or through legacy votes
+        chat_steam_ids = {}
+        linked = session.query(UserSteamChat.chat_id, UserSteamChat.steam_id).filter(
+            UserSteamChat.steam_id.isnot(None)
+        )
+        legacy = (
+            session.query(Poll.chat_id, User.steam_id)
+            .join(Vote, Vote.poll_id == Poll.id)
+            .join(User, User.telegram_id == Vote.user_id)
+            .filter(User.steam_id.isnot(None))
+            .distinct()
+        )
+        for chat_id, steam_id in linked.union(legacy).all():
+            if not steam_id.isdigit():
+                continue
+            chat_steam_ids.setdefault(chat_id, set()).add(convert_steamid_64_to_32(steam_id))
+
+        match_counts = {}
+        for match in session.query(
+            Match.chat_id, Match.winner, Match.radiant_players, Match.dire_players
+        ).yield_per(1000):
+            stored, won = match_counts.get(match.chat_id, (0, 0))
+            if _chat_won_match(match, chat_steam_ids.get(match.chat_id, ())):
+                won += 1
+            match_counts[match.chat_id] = (stored + 1, won)
+
+        rows = []
+        for chat_id, chat_name in session.query(ChatSettings.chat_id, ChatSettings.chat_name).all():
+            total_polls = poll_counts.get(chat_id, 0)
+            total_votes, voters = vote_counts.get(chat_id, (0, 0))
+            matches_stored, matches_won = match_counts.get(chat_id, (0, 0))
+            rows.append(
+                {
+                    "chat_id": chat_id,
+                    "chat_name": chat_name,
+                    "total_polls": total_polls,
+                    "total_votes": total_votes,
+                    "voters": voters,
+                    # Share of the chat's voters answering an average poll
+                    "participation_rate": total_votes / (total_polls * voters)
+                    if total_polls and voters
+                    else 0.0,
+                    "last_poll_end": last_activity.get(chat_id),
+                    "matches_stored": matches_stored,
+                    "matches_won": matches_won,
+                    "win_rate": matches_won / matches_stored if matches_stored else None,
+                }
+            )
+        return rows
+
+
+async def refresh_chat_aggregates():
+    """Rebuild the chat_aggregates table from polls, votes and matches.
+
+    The scan over all matches runs in an executor without holding db_semaphore,
+    so other database calls and the event loop go on meanwhile; only the
+    replacement of the table's rows is serialized with the other writers.
+    """
+    rows = await asyncio.get_running_loop().run_in_executor(None, _compute_chat_aggregates)
+    refreshed_at = datetime.now()
+    async with db_semaphore:
+        with get_db_session() as session:
+            session.query(ChatAggregate).delete(synchronize_session=False)
+            session.add_all(ChatAggregate(**row, refreshed_at=refreshed_at) for row in rows)
+
+
+async def get_chat_aggregates(sort="participation"):
+    """Get the precomputed per-chat aggregates, best first by the given column."""
+    column = CHAT_AGGREGATE_SORT_COLUMNS.get(sort, ChatAggregate.participation_rate)
+    async with db_semaphore:
+        with get_db_session() as session:
+            rows = (
+                session.query(ChatAggregate)
+                .order_by(column.is_(None), column.desc(), ChatAggregate.chat_id)
+                .all()
+            )
+            return [
+                {
+                    "chat_id": row.chat_id,
+                    "chat_name": row.chat_name,
+                    "total_polls": row.total_polls,
+                    "total_votes": row.total_votes,
+                    "voters": row.voters,
+                    "participation_rate": row.participation_rate,
+                    "last_poll_end": row.last_poll_end,
+                    "matches_stored": row.matches_stored,
+                    "matches_won": row.matches_won,
+                    "win_rate": row.win_rate,
+                    "refreshed_at": row.refreshed_at,
+                }
+                for row in rows
+            ]
@@ -7,6 +7,8 @@ from db import set_chat_name
 from telegram.error import BadRequest
 import logging
 
+import metrics
+
 logger = logging.getLogger(__name__)
 
 
@@ -72,3 +74,12 @@ def admin_only(func):
 
         return await func(update, context, *args, **kwargs)
     return wrapper
+
+
+def track_latency(func):
+    """Decorator to record how long a command handler takes."""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        with metrics.COMMAND_DURATION_SECONDS.time(command=func.__name__):
+            return await func(*args, **kwargs)
+    return wrapper
@@ -11,3 +11,11 @@ class DatabaseError(HwgaBotError):
 class DotaApiError(HwgaBotError):
     """Raised when there is an error with the Dota API."""
     pass
+
+class OpenDotaUnavailableError(DotaApiError):
+    """Raised without a request while the OpenDota circuit breaker is open."""
+    pass
+
+class SteamApiError(HwgaBotError):
+    """Raised when there is an error with the Steam Web API."""
+    pass
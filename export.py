@@ -0,0 +1,160 @@
+"""Streaming export of a chat's polls, votes and matches as CSV or NDJSON.
+
+Rows are read in keyset-paginated batches, each in its own short read-only query
+run in an executor, so an export of any size runs in constant memory, never
+blocks the event loop and never holds a read lock the bot has to wait for.
+
+Usage: python export.py CHAT_ID [--format csv|ndjson] [--table polls|votes|matches] [-o FILE]
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import sys
+
+from db import DB_FILE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+EXPORT_FORMATS = ("csv", "ndjson")
+
+# Exported columns and the batch query of every table; the first column is the keyset cursor
+EXPORT_TABLES = {
+    "polls": (
+        ["id", "chat_id", "poll_id", "trigger_time", "end_time", "trigger_type", "total_votes"],
+        """
+        SELECT id, chat_id, poll_id, trigger_time, end_time, trigger_type, total_votes
+        FROM polls
+        WHERE chat_id = ? AND id > ?
+        ORDER BY id
+        LIMIT ?
+        """,
+    ),
+    "votes": (
+        ["id", "poll_id", "user_id", "option_index", "response_time"],
+        """
+        SELECT v.id, v.poll_id, v.user_id, v.option_index, v.response_time
+        FROM votes v
+        JOIN polls p ON v.poll_id = p.id
+        WHERE p.chat_id = ? AND v.id > ?
+        ORDER BY v.id
+        LIMIT ?
+        """,
+    ),
+    "matches": (
+        ["id", "match_id", "chat_id", "winner", "radiant_players", "dire_players", "created_at"],
+        """
+        SELECT id, match_id, chat_id, winner, radiant_players, dire_players, created_at
+        FROM matches
+        WHERE chat_id = ? AND id > ?
+        ORDER BY id
+        LIMIT ?
+        """,
+    ),
+}
+
+
+def _fetch_batch(database, query, chat_id, after_id, batch_size):
+    conn = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    try:
+        return conn.execute(query, (chat_id, after_id, batch_size)).fetchall()
+    finally:
+        conn.close()
+
+
+async def iter_table_batches(chat_id, table, database=DB_FILE, batch_size=EXPORT_BATCH_SIZE):
+    """Yields the chat's rows of a table in batches, oldest first"""
+    _, query = EXPORT_TABLES[table]
+    loop = asyncio.get_running_loop()
+    after_id = 0
+    while True:
+        rows = await loop.run_in_executor(
+            None, _fetch_batch, database, query, chat_id, after_id, batch_size
+        )
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+
+
+def format_csv_rows(rows, columns=None):
+    """Formats rows (and an optional header) as CSV text"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if columns:
+        writer.writerow(columns)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def format_ndjson_rows(table, columns, rows):
+    """Formats rows as one JSON object per line, tagged with their table"""
+    return "".join(
+        json.dumps({"table": table, **dict(zip(columns, row))}, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+async def iter_export(
+    chat_id, export_format, tables, database=DB_FILE, batch_size=EXPORT_BATCH_SIZE
+):
+    """Yields the export of the given tables as text chunks
+
+    CSV holds a single table, NDJSON can hold several since every line names its table.
+    """
+    if export_format == "csv" and len(tables) != 1:
+        raise ValueError("CSV export holds exactly one table")
+
+    for table in tables:
+        columns, _ = EXPORT_TABLES[table]
+        header_written = False
+        async for rows in iter_table_batches(chat_id, table, database, batch_size):
+            if export_format == "csv":
+                yield format_csv_rows(rows, None if header_written else columns)
+                header_written = True
+            else:
+                yield format_ndjson_rows(table, columns, rows)
+        if export_format == "csv" and not header_written:
+            yield format_csv_rows([], columns)
+
+
+async def export_to_file(chat_id, export_format, tables, output, database=DB_FILE):
+    """Writes an export to an open text file"""
+    async for chunk in iter_export(chat_id, export_format, tables, database):
+        output.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a chat's polls, votes and matches")
+    parser.add_argument("chat_id")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument(
+        "--table",
+        choices=list(EXPORT_TABLES),
+        action="append",
+        help="table to export, can be repeated (default: votes for CSV, all for NDJSON)",
+    )
+    parser.add_argument("--database", default=DB_FILE)
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    tables = args.table or (["votes"] if args.format == "csv" else list(EXPORT_TABLES))
+    if args.format == "csv" and len(tables) != 1:
+        parser.error("CSV export holds exactly one table")
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as output:
+            asyncio.run(export_to_file(args.chat_id, args.format, tables, output, args.database))
+    else:
+        asyncio.run(export_to_file(args.chat_id, args.format, tables, sys.stdout, args.database))
+
+
+if __name__ == "__main__":
+    main()
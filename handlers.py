@@ -14,13 +14,14 @@ from telegram import (
 from telegram.error import BadRequest, Forbidden
 
 import db
+import presence
 import scheduler
 import web_server
 import steam
 from poll_state import poll_state
 import config
 from exceptions import DatabaseError, DotaApiError
-from decorators import update_chat_name_decorator, admin_only
+from decorators import update_chat_name_decorator, admin_only, track_latency
 
 # Configure logging
 logging.basicConfig(
@@ -46,6 +47,7 @@ async def send_message(context, chat_id, user_id, text, reply_markup=None):
         )
 
 
+@track_latency
 @update_chat_name_decorator
 async def start(update, context):
     """Send a message when the command /start is issued."""
@@ -64,6 +66,7 @@ async def start(update, context):
         await update.message.reply_text("Произошла ошибка базы данных. Попробуйте позже.")
 
 
+@track_latency
 @update_chat_name_decorator
 async def poll_now_command(update, context):
     """Start a new poll manually."""
@@ -84,6 +87,7 @@ async def poll_now_command(update, context):
         await update.message.reply_text("Произошла ошибка базы данных. Попробуйте позже.")
 
 
+@track_latency
 @update_chat_name_decorator
 async def stop_poll(update, context):
     """Manually stop the current poll."""
@@ -110,6 +114,7 @@ async def stop_poll(update, context):
         await update.message.reply_text("Произошла ошибка базы данных. Попробуйте позже.")
 
 
+@track_latency
 @update_chat_name_decorator
 async def status_command(update, context):
     """Check the status of the current poll."""
@@ -149,12 +154,15 @@ async def status_command(update, context):
                 # We don't have user names for those who haven't voted yet
                 status_message += f"• User ID: {user_id}\n"
 
+        status_message += "\n" + config.MSG_LIVE_URL.format(url=web_server.get_live_url(chat_id))
+
         await update.message.reply_text(status_message)
     except DatabaseError as e:
         logger.error(f"Database error in status_command: {e}")
         await update.message.reply_text("Произошла ошибка базы данных. Попробуйте позже.")
 
 
+@track_latency
 @update_chat_name_decorator
 async def stats_command(update, context):
     """Display poll statistics."""
@@ -233,6 +241,7 @@ async def stats_command(update, context):
         await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
 
 
+@track_latency
 @update_chat_name_decorator
 async def set_poll_time_command(update, context):
     """Set custom poll time for a chat."""
@@ -283,6 +292,7 @@ async def set_poll_time_command(update, context):
         await update.message.reply_text("Произошла ошибка базы данных. Попробуйте позже.")
 
 
+@track_latency
 @update_chat_name_decorator
 async def get_poll_time_command(update, context):
     """Display the currently configured poll time."""
@@ -305,6 +315,7 @@ async def get_poll_time_command(update, context):
         await update.message.reply_text("Произошла ошибка базы данных. Попробуйте позже.")
 
 
+@track_latency
 @admin_only
 @update_chat_name_decorator
 async def pause_polls_command(update, context):
@@ -326,6 +337,31 @@ async def pause_polls_command(update, context):
     await update.message.reply_text(f"Okay, I will pause the next {n_polls} poll(s) for this chat.")
 
 
+@track_latency
+@admin_only
+@update_chat_name_decorator
+async def dota_notify_command(update, context):
+    """Turn "started playing Dota 2" notifications on or off for this chat."""
+    chat_id = str(update.effective_chat.id)
+
+    setting = context.args[0].lower() if context.args else ""
+    if setting not in ("on", "off"):
+        await update.message.reply_text(config.MSG_DOTA_NOTIFY_USAGE)
+        return
+
+    try:
+        await db.set_dota_start_notifications(chat_id, setting == "on")
+    except DatabaseError as e:
+        logger.error(f"Database error in dota_notify_command: {e}")
+        await update.message.reply_text("Произошла ошибка базы данных. Попробуйте позже.")
+        return
+
+    await update.message.reply_text(
+        config.MSG_DOTA_NOTIFY_ON if setting == "on" else config.MSG_DOTA_NOTIFY_OFF
+    )
+
+
+@track_latency
 @update_chat_name_decorator
 async def link_steam_command(update, context):
     """Handler for the command to link a Steam ID via OAuth"""
@@ -381,6 +417,7 @@ async def link_steam_command(update, context):
         await update.message.reply_text("Произошла ошибка базы данных. Попробуйте позже.")
 
 
+@track_latency
 @update_chat_name_decorator
 async def unlink_steam_command(update, context):
     """Unlinks a Steam ID from a user's account."""
@@ -465,6 +502,7 @@ async def unlink_steam_command(update, context):
         await update.message.reply_text("Произошла ошибка. Попробуйте позже.")
 
 
+@track_latency
 @update_chat_name_decorator
 async def handle_unlink_steam_confirm(update, context):
     """Handles the confirmation of unlinking a Steam ID."""
@@ -509,6 +547,7 @@ async def handle_unlink_steam_confirm(update, context):
         await query.edit_message_text(config.MSG_UNLINK_STEAM_ERROR)
 
 
+@track_latency
 @update_chat_name_decorator
 async def handle_unlink_steam_cancel(update, context):
     """Handles the cancellation of unlinking a Steam ID."""
@@ -527,6 +566,7 @@ async def handle_unlink_steam_cancel(update, context):
     )
 
 
+@track_latency
 @update_chat_name_decorator
 async def handle_poll_answer(update, context):
     """Handle when a user answers the poll."""
@@ -835,6 +875,7 @@ async def setup_commands(application):
         BotCommand("set_poll_time", "Установить время опроса (ЧЧ:ММ)"),
         BotCommand("get_poll_time", "Показать установленное время опроса"),
         BotCommand("pause_polls", "Пропустить следующие n опросов"),
+        BotCommand("dota_notify", "Сообщать, когда кто-то заходит в Dota 2 (on/off)"),
     ]
 
     # Set commands globally
@@ -853,12 +894,21 @@ async def setup_commands(application):
     logger.info("Bot commands have been set up")
 
 
+@track_latency
 @update_chat_name_decorator
 async def who_is_playing_command(update, context):
     """Displays the status of Steam users in the current chat"""
     chat_id = str(update.effective_chat.id)
 
     try:
+        # Answer from the presence tracker when it is running
+        presence_text = await presence.get_chat_presence_text(chat_id)
+        if presence_text is not None:
+            await update.message.reply_text(
+                presence_text, reply_to_message_id=update.message.message_id
+            )
+            return
+
         # Send a message that the check has started
         status_message = await update.message.reply_text(
             config.MSG_WHO_IS_PLAYING_CHECKING,
@@ -931,6 +981,7 @@ async def _build_games_stat_message(chat_id, days, user_id=None):
         return "An unexpected error occurred. Please try again later.", None
 
 
+@track_latency
 @update_chat_name_decorator
 async def games_stat_command(update, context):
     """Display games statistics."""
@@ -949,6 +1000,7 @@ async def games_stat_command(update, context):
     await update.message.reply_text(stats_message, reply_markup=reply_markup)
 
 
+@track_latency
 @update_chat_name_decorator
 async def refresh_games_stat_command(update, context):
     """Refresh games statistics."""
@@ -972,6 +1024,7 @@ async def refresh_games_stat_command(update, context):
     await query.edit_message_text(stats_message, reply_markup=reply_markup)
 
 
+@track_latency
 @update_chat_name_decorator
 async def check_games_command(update, context):
     """Check for games on demand."""
@@ -983,6 +1036,6 @@ async def check_games_command(update, context):
         await update.message.reply_text("Please provide a valid number of days. Usage: /check_games <days>")
         return
 
-    await update.message.reply_text(f"Checking for common games in the last {days} days. This might take a while...")
+    progress_message = await update.message.reply_text(f"Checking for common games in the last {days} days. This might take a while...")
 
-    await steam.check_games_on_demand(context, chat_id, days)
\ No newline at end of file
+    await steam.check_games_on_demand(context, chat_id, days, progress_message)
\ No newline at end of file
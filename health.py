@@ -0,0 +1,130 @@
+"""Health and readiness checks for the bot process."""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import db
+import metrics
+import steam
+from exceptions import DatabaseError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Thresholds
+MAX_EVENT_LOOP_LAG = float(os.environ.get("HEALTH_MAX_EVENT_LOOP_LAG", 1.0))  # seconds
+DB_TIMEOUT = float(os.environ.get("HEALTH_DB_TIMEOUT", 2.0))  # seconds
+MAX_DB_LATENCY = float(os.environ.get("HEALTH_MAX_DB_LATENCY", 0.5))  # seconds
+MAX_JOB_DELAY = float(os.environ.get("HEALTH_MAX_JOB_DELAY", 120))  # seconds
+# Quiet chats send no updates, so the age of the last one only fails readiness when configured
+MAX_UPDATE_AGE = float(os.environ["HEALTH_MAX_UPDATE_AGE"]) if os.environ.get("HEALTH_MAX_UPDATE_AGE") else None  # seconds
+
+# Unix time of the last update received from Telegram
+last_telegram_update_at = None
+
+
+async def record_telegram_update(update, context):
+    """Remember when the bot last received an update from Telegram."""
+    global last_telegram_update_at
+    last_telegram_update_at = time.time()
+
+
+def check_event_loop():
+    """Check that the event loop runs timers on time."""
+    lag = metrics.latest_event_loop_lag
+    return {
+        "ok": lag <= MAX_EVENT_LOOP_LAG,
+        "lag_seconds": round(lag, 4),
+        "threshold_seconds": MAX_EVENT_LOOP_LAG,
+    }
+
+
+async def check_database():
+    """Check that the database answers a trivial query quickly."""
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(db.ping(), DB_TIMEOUT)
+    except asyncio.TimeoutError:
+        return {"ok": False, "error": f"no answer within {DB_TIMEOUT}s"}
+    except DatabaseError as e:
+        return {"ok": False, "error": str(e)}
+
+    latency = time.perf_counter() - started
+    return {
+        "ok": latency <= MAX_DB_LATENCY,
+        "latency_seconds": round(latency, 4),
+        "threshold_seconds": MAX_DB_LATENCY,
+    }
+
+
+def check_job_queue(application):
+    """Check that the JobQueue scheduler runs and no job is overdue."""
+    if application is None or application.job_queue is None:
+        return {"ok": True, "status": "unknown"}
+
+    job_queue = application.job_queue
+    now = datetime.now(timezone.utc)
+    overdue_jobs = [
+        job.name
+        for job in job_queue.jobs()
+        if job.enabled and job.next_t and (now - job.next_t).total_seconds() > MAX_JOB_DELAY
+    ]
+    running = job_queue.scheduler.running
+    return {
+        "ok": running and not overdue_jobs,
+        "running": running,
+        "overdue_jobs": overdue_jobs,
+        "last_game_check": metrics.JOB_LAST_RUN_TIMESTAMP.get(job="dota_game_check") or None,
+    }
+
+
+def check_telegram(application):
+    """Check that polling runs; the age of the last update is reported, and checked if configured."""
+    polling = bool(application and application.updater and application.updater.running)
+    if last_telegram_update_at is None:
+        update_age = None
+    else:
+        update_age = round(time.time() - last_telegram_update_at, 1)
+    return {
+        "ok": (application is None or polling)
+        and (MAX_UPDATE_AGE is None or update_age is None or update_age <= MAX_UPDATE_AGE),
+        "polling": polling,
+        "last_update_age_seconds": update_age,
+        "threshold_seconds": MAX_UPDATE_AGE,
+    }
+
+
+def check_opendota():
+    """Report the OpenDota circuit breaker; it never fails readiness on its own."""
+    opendota = steam.get_opendota_health()
+    return {
+        "ok": True,
+        "circuit": opendota["state"],
+        "consecutive_failures": opendota["consecutive_failures"],
+        "last_success": opendota["last_success"].isoformat() if opendota["last_success"] else None,
+        "last_failure": opendota["last_failure"].isoformat() if opendota["last_failure"] else None,
+    }
+
+
+def get_liveness():
+    """Liveness only depends on the event loop not being wedged."""
+    checks = {"event_loop": check_event_loop()}
+    return all(check["ok"] for check in checks.values()), checks
+
+
+async def get_readiness(application):
+    """Readiness covers the loop, the database, the scheduler and Telegram."""
+    checks = {
+        "event_loop": check_event_loop(),
+        "database": await check_database(),
+        "job_queue": check_job_queue(application),
+        "telegram": check_telegram(application),
+        "opendota": check_opendota(),
+    }
+    failed = [name for name, check in checks.items() if not check["ok"]]
+    if failed:
+        logger.warning(f"Readiness check failed: {', '.join(failed)}")
+    return not failed, checks
@@ -0,0 +1,213 @@
+"""Prometheus-style metrics for the bot process."""
+
+import asyncio
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+EVENT_LOOP_LAG_INTERVAL = 1.0  # seconds between event loop lag samples
+
+# All registered metrics in the order of registration
+REGISTRY = []
+
+# Most recently measured event loop lag in seconds
+latest_event_loop_lag = 0.0
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    """Formats a label set as {name="value",...}"""
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        if not self.labelnames and not self._values:
+            yield f"{self.name} 0"
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Counter(_Metric):
+    """A value that only goes up"""
+
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, or is read from a callback"""
+
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def set_function(self, function):
+        """Read the (unlabelled) value from function() on every scrape"""
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            try:
+                yield f"{self.name} {self._function()}"
+            except Exception as e:
+                logger.error(f"Error reading gauge {self.name}: {e}")
+            return
+        yield from super()._samples()
+
+
+class Histogram(_Metric):
+    """Observations counted in cumulative buckets"""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # Per-bucket counts (last one is +Inf), sum of observations
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def get_count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labels = _format_labels(self.labelnames, key, [("le", le)])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+def render():
+    """Render all metrics in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+async def monitor_event_loop_lag(interval=EVENT_LOOP_LAG_INTERVAL):
+    """Measure how late the event loop wakes us up, forever"""
+    global latest_event_loop_lag
+
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        latest_event_loop_lag = max(0.0, loop.time() - started - interval)
+        EVENT_LOOP_LAG_SECONDS.observe(latest_event_loop_lag)
+
+
+# Bot metrics
+COMMAND_DURATION_SECONDS = Histogram(
+    "hwga_command_duration_seconds", "Time spent handling bot commands and callbacks", ["command"]
+)
+VOTES_TOTAL = Counter("hwga_votes_total", "Poll votes received")
+ACTIVE_POLLS = Gauge("hwga_active_polls", "Polls that are currently open")
+DB_WAIT_SECONDS = Histogram(
+    "hwga_db_wait_seconds", "Time spent waiting for the database semaphore"
+)
+DB_EXEC_SECONDS = Histogram(
+    "hwga_db_exec_seconds", "Time the database semaphore was held by a query"
+)
+OPENDOTA_REQUEST_SECONDS = Histogram(
+    "hwga_opendota_request_seconds", "OpenDota API request latency", ["endpoint"]
+)
+OPENDOTA_RESPONSES_TOTAL = Counter(
+    "hwga_opendota_responses_total", "OpenDota API responses by status code", ["status"]
+)
+OPENDOTA_QUEUE_WAIT_SECONDS = Histogram(
+    "hwga_opendota_queue_wait_seconds",
+    "Time OpenDota requests waited for the rate limiter",
+    ["priority"],
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+OPENDOTA_QUEUE_DEPTH = Gauge(
+    "hwga_opendota_queue_depth", "OpenDota requests waiting for the rate limiter"
+)
+OPENDOTA_CACHE_TOTAL = Counter(
+    "hwga_opendota_cache_total", "OpenDota cache lookups by endpoint and result", ["endpoint", "result"]
+)
+OPENDOTA_CIRCUIT_STATE = Gauge(
+    "hwga_opendota_circuit_state", "OpenDota circuit breaker state (0 closed, 1 half-open, 2 open)"
+)
+OPENDOTA_HEDGED_TOTAL = Counter(
+    "hwga_opendota_hedged_requests_total", "Second requests sent for slow interactive OpenDota requests"
+)
+JOB_DURATION_SECONDS = Histogram(
+    "hwga_job_duration_seconds", "Duration of scheduled JobQueue jobs", ["job"]
+)
+JOB_LAST_RUN_TIMESTAMP = Gauge(
+    "hwga_job_last_run_timestamp_seconds", "Unix time when a scheduled job last finished", ["job"]
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "hwga_event_loop_lag_seconds",
+    "How late the event loop runs a timer",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
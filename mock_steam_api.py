@@ -0,0 +1,306 @@
+"""Local mock of the OpenDota and Steam Web API endpoints the bot uses.
+
+Responses are built from the JSON fixtures in fixtures/ for a synthetic group
+of players who play in parties of five, so there are common games to find.
+Latency, server errors and 429 responses can be injected to see how the
+client copes with a slow or overloaded API.
+
+Usage: python mock_steam_api.py [--port 8099] [--players 20] [--latency 0.05]
+                                [--error-rate 0.01] [--rate-limit-rate 0.02]
+
+Point the bot at it with
+OPENDOTA_API_URL=http://127.0.0.1:8099/opendota/api STEAM_API_URL=http://127.0.0.1:8099/steam
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+STEAM_ID_64_OFFSET = 76561197960265728
+STEAM_SUMMARIES_MAX_IDS = 100
+DOTA2_APP_ID = "570"
+PARTY_SIZE = 5
+FIRST_MATCH_ID = 7_000_000_000
+FILLER_ACCOUNT_BASE = 900_000_000  # accounts of strangers who fill up the teams
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class MockSteamApi:
+    """OpenDota and Steam Web API lookalike with a generated match history"""
+
+    def __init__(
+        self,
+        players=20,
+        days=30,
+        matches_per_day=3,
+        latency=0.0,
+        error_rate=0.0,
+        rate_limit_rate=0.0,
+        retry_after=1,
+        seed=0,
+    ):
+        self.account_ids = list(range(1, players + 1))
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = Counter()  # route -> requests served, injected failures included
+        self.connections = set()  # client addresses, one per TCP connection
+        self.bytes_sent = 0
+
+        self.player_fixture = load_fixture("opendota_player.json")
+        self.player_match_fixture = load_fixture("opendota_player_match.json")
+        self.match_fixture = load_fixture("opendota_match.json")
+        self.summary_fixture = load_fixture("steam_player_summary.json")
+
+        # Everyone starts online, nobody in a game
+        self.online = set(self.account_ids)
+        self.in_game = set()
+
+        self.matches = {}  # match_id -> {"start_time", "radiant", "dire", "radiant_win"}
+        self.next_match_id = FIRST_MATCH_ID
+        self._build_history(days, matches_per_day)
+
+        self.runner = None
+        self.url = None
+
+    def _build_history(self, days, matches_per_day):
+        now = int(time.time())
+        parties = [
+            self.account_ids[i : i + PARTY_SIZE] for i in range(0, len(self.account_ids), PARTY_SIZE)
+        ]
+        starts = []
+        for day in range(days):
+            for party_index, party in enumerate(parties):
+                for game in range(matches_per_day):
+                    start_time = now - day * 24 * 3600 - (game + 1) * 3 * 3600 - party_index * 60
+                    starts.append((start_time, party))
+        for start_time, party in sorted(starts):
+            self.add_match(party, start_time)
+
+    def add_match(self, account_ids, start_time=None):
+        """Add a match the given accounts played together on the Radiant side"""
+        match_id = self.next_match_id
+        self.next_match_id += 1
+        radiant = list(account_ids)[:PARTY_SIZE]
+        filler = FILLER_ACCOUNT_BASE + match_id % 1000 * 10
+        radiant += [filler + i for i in range(PARTY_SIZE - len(radiant))]
+        self.matches[match_id] = {
+            "start_time": start_time or int(time.time()) - 2400,
+            "radiant": radiant,
+            "dire": [filler + PARTY_SIZE + i for i in range(PARTY_SIZE)],
+            "radiant_win": match_id % 2 == 0,
+        }
+        return match_id
+
+    def set_presence(self, account_id, online=True, in_game=False):
+        """Change what Steam reports about an account"""
+        (self.online.add if online else self.online.discard)(account_id)
+        (self.in_game.add if in_game else self.in_game.discard)(account_id)
+
+    @web.middleware
+    async def fault_middleware(self, request, handler):
+        """Counts requests and connections and injects latency, 429s and server errors"""
+        self.requests[request.match_info.route.resource.canonical] += 1
+        self.connections.add(request.transport.get_extra_info("peername"))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limit_rate and self.random.random() < self.rate_limit_rate:
+            return web.Response(status=429, headers={"Retry-After": str(self.retry_after)})
+        if self.error_rate and self.random.random() < self.error_rate:
+            return web.Response(status=500)
+        response = await handler(request)
+        if response.body is not None:
+            self.bytes_sent += len(response.body)
+        return response
+
+    def _last_login(self, account_id):
+        seen = datetime.now(timezone.utc)
+        if account_id not in self.online:
+            seen -= timedelta(days=3)
+        return seen.isoformat().replace("+00:00", "Z")
+
+    async def opendota_player(self, request):
+        account_id = int(request.match_info["account_id"])
+        if account_id not in self.account_ids:
+            return web.json_response({"profile": None})
+
+        data = copy.deepcopy(self.player_fixture)
+        steam_id_64 = str(account_id + STEAM_ID_64_OFFSET)
+        data["profile"].update(
+            {
+                "account_id": account_id,
+                "personaname": f"player{account_id}",
+                "steamid": steam_id_64,
+                "profileurl": f"https://steamcommunity.com/profiles/{steam_id_64}/",
+                "last_login": self._last_login(account_id),
+            }
+        )
+        return web.json_response(data)
+
+    async def opendota_player_matches(self, request):
+        account_id = int(request.match_info["account_id"])
+        query = request.query
+        since = time.time() - int(query["date"]) * 24 * 3600 if "date" in query else 0
+        less_than = int(query.get("less_than_match_id", 2**62))
+        limit = int(query.get("limit", 0)) or None
+        project = query.getall("project", [])
+
+        rows = []
+        for match_id in sorted(self.matches, reverse=True):
+            match = self.matches[match_id]
+            if match_id >= less_than or match["start_time"] < since:
+                continue
+            if account_id not in match["radiant"] and account_id not in match["dire"]:
+                continue
+            row = dict(
+                self.player_match_fixture,
+                match_id=match_id,
+                start_time=match["start_time"],
+                radiant_win=match["radiant_win"],
+                player_slot=0 if account_id in match["radiant"] else 128,
+                hero_id=account_id % 120 + 1,
+            )
+            rows.append({field: row.get(field) for field in project} if project else row)
+            if limit and len(rows) >= limit:
+                break
+        return web.json_response(rows)
+
+    async def opendota_match(self, request):
+        match_id = int(request.match_info["match_id"])
+        match = self.matches.get(match_id)
+        if match is None:
+            return web.json_response({"error": "Not Found"}, status=404)
+
+        data = copy.deepcopy(self.match_fixture)
+        player_template = data["players"][0]
+        data.update(
+            match_id=match_id,
+            match_seq_num=match_id,
+            start_time=match["start_time"],
+            radiant_win=match["radiant_win"],
+        )
+        data["players"] = []
+        for slot, account_id in enumerate(match["radiant"] + match["dire"]):
+            is_radiant = slot < PARTY_SIZE
+            player = copy.deepcopy(player_template)
+            player.update(
+                match_id=match_id,
+                account_id=account_id,
+                player_slot=slot if is_radiant else 128 + slot - PARTY_SIZE,
+                isRadiant=is_radiant,
+                hero_id=account_id % 120 + 1,
+                personaname=f"player{account_id}",
+                start_time=match["start_time"],
+                radiant_win=match["radiant_win"],
+                win=int(is_radiant == match["radiant_win"]),
+                lose=int(is_radiant != match["radiant_win"]),
+            )
+            data["players"].append(player)
+        return web.json_response(data)
+
+    async def steam_player_summaries(self, request):
+        if not request.query.get("key"):
+            return web.Response(status=403)
+        steam_ids = [sid for sid in request.query.get("steamids", "").split(",") if sid]
+        if len(steam_ids) > STEAM_SUMMARIES_MAX_IDS:
+            return web.Response(status=400)
+
+        players = []
+        for steam_id in steam_ids:
+            account_id = int(steam_id) - STEAM_ID_64_OFFSET
+            if account_id not in self.account_ids:
+                continue
+            summary = dict(
+                self.summary_fixture,
+                steamid=steam_id,
+                personaname=f"player{account_id}",
+                profileurl=f"https://steamcommunity.com/profiles/{steam_id}/",
+                personastate=1 if account_id in self.online else 0,
+                lastlogoff=int(time.time()) - 3600,
+            )
+            if account_id in self.in_game:
+                summary.update(gameid=DOTA2_APP_ID, gameextrainfo="Dota 2")
+            players.append(summary)
+        return web.json_response({"response": {"players": players}})
+
+    def create_app(self):
+        app = web.Application(middlewares=[self.fault_middleware])
+        app.router.add_get("/opendota/api/players/{account_id}", self.opendota_player)
+        app.router.add_get("/opendota/api/players/{account_id}/matches", self.opendota_player_matches)
+        app.router.add_get("/opendota/api/matches/{match_id}", self.opendota_match)
+        app.router.add_get("/steam/ISteamUser/GetPlayerSummaries/v2/", self.steam_player_summaries)
+        return app
+
+    @property
+    def opendota_url(self):
+        return f"{self.url}/opendota/api"
+
+    @property
+    def steam_url(self):
+        return f"{self.url}/steam"
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.runner = web.AppRunner(self.create_app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        logger.info(f"Mock OpenDota at {self.opendota_url}, mock Steam at {self.steam_url}")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+async def serve(args):
+    mock = MockSteamApi(
+        players=args.players,
+        days=args.days,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    await mock.start(args.host, args.port)
+    print(f"OPENDOTA_API_URL={mock.opendota_url} STEAM_API_URL={mock.steam_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await mock.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30, help="days of generated match history")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--seed", type=int, default=0)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
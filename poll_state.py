@@ -3,11 +3,16 @@ import logging
 from typing import Dict, Set, Optional
 from datetime import datetime
 
+import config
 import db
+import metrics
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Events a live page subscriber may lag behind before it is sent a fresh snapshot instead
+LIVE_QUEUE_SIZE = 100
+
 
 class PollState:
     def __init__(self):
@@ -17,6 +22,7 @@ class PollState:
             set()
         )  # Set of chat_ids where the bot has been activated
         self.steam_check_task = None  # Task for checking Steam status
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}  # chat_id -> live page queues
 
     def is_active(self, chat_id: str) -> bool:
         return chat_id in self.active_polls
@@ -44,11 +50,26 @@ class PollState:
             chat_id, poll_id, trigger_type
         )
 
+        self._publish(chat_id, self.get_live_snapshot(chat_id))
+
     async def add_vote(self, poll_id: str, user, option_index: int) -> None:
         for chat_id, poll_data in self.active_polls.items():
             if poll_data["poll_id"] == poll_id:
+                previous_vote = poll_data["votes"].get(user.id)
                 poll_data["votes"][user.id] = {"user": user, "option": option_index}
                 poll_data["voted_users"].add(user.id)
+                metrics.VOTES_TOTAL.inc()
+
+                self._publish(
+                    chat_id,
+                    {
+                        "type": "vote",
+                        "user_id": user.id,
+                        "name": user.first_name,
+                        "option": option_index,
+                        "previous_option": previous_vote["option"] if previous_vote else None,
+                    },
+                )
 
                 # Store user info in database
                 await db.store_user_info(user)
@@ -72,12 +93,53 @@ class PollState:
                 chat_id, self.active_polls[chat_id]["db_poll_id"]
             )
             del self.active_polls[chat_id]
+            self._publish(chat_id, {"type": "closed"})
 
         # Cancel any running tasks for this chat
         if chat_id in self.scheduled_tasks:
             self.scheduled_tasks[chat_id].cancel()
             del self.scheduled_tasks[chat_id]
 
+    def get_live_snapshot(self, chat_id: str) -> Dict:
+        """Full state of the chat's poll, the starting point for live updates"""
+        poll_data = self.active_polls.get(chat_id)
+        snapshot = {"type": "snapshot", "options": config.POLL_OPTIONS, "active": bool(poll_data)}
+        if poll_data:
+            snapshot.update(
+                {
+                    "started_at": poll_data["started_at"].isoformat(),
+                    "voters": [
+                        {"user_id": user_id, "name": vote["user"].first_name, "option": vote["option"]}
+                        for user_id, vote in poll_data["votes"].items()
+                    ],
+                    "not_voted": len(poll_data["all_users"] - poll_data["voted_users"]),
+                }
+            )
+        return snapshot
+
+    def subscribe(self, chat_id: str) -> asyncio.Queue:
+        """Queue receiving the live events of a chat's polls"""
+        queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+        self.subscribers.setdefault(chat_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, chat_id: str, queue: asyncio.Queue) -> None:
+        queues = self.subscribers.get(chat_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[chat_id]
+
+    def _publish(self, chat_id: str, event: Dict) -> None:
+        for queue in self.subscribers.get(chat_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # The subscriber fell behind, replace its backlog with the current state
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.get_live_snapshot(chat_id))
+
     def set_task(self, chat_id: str, task: asyncio.Task) -> None:
         # Cancel existing task if any
         if chat_id in self.scheduled_tasks:
@@ -99,3 +161,4 @@ class PollState:
 
 # Create a global instance
 poll_state = PollState()
+metrics.ACTIVE_POLLS.set_function(lambda: len(poll_state.active_polls))
@@ -0,0 +1,233 @@
+"""Background tracker of the Steam presence of every linked account.
+
+A job polls batched Steam player summaries and keeps the latest presence of
+each account in memory, so /who_is_playing can answer without any API call.
+Successive polls are diffed into started_playing and stopped_playing events:
+the first notifies opted-in chats, the second triggers a game check for just
+the players who left Dota 2.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from telegram.error import TelegramError
+
+import config
+import db
+import steam
+from exceptions import DatabaseError, SteamApiError
+from utils import convert_steamid_64_to_32
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PRESENCE_INTERVAL = int(os.environ.get("PRESENCE_INTERVAL", 60))  # seconds between refreshes
+DOTA2_APP_ID = "570"
+
+# Presence transitions
+STARTED_PLAYING = "started_playing"
+STOPPED_PLAYING = "stopped_playing"
+
+# OpenDota lists a match a few minutes after it ends
+MATCH_CHECK_DELAY = int(os.environ.get("MATCH_CHECK_DELAY", 5 * 60))  # seconds
+# Players who stopped within this window may have been in the same match
+STOPPED_PLAYING_WINDOW = timedelta(minutes=15)
+
+
+class PresenceTracker:
+    def __init__(self):
+        self.presence: Dict[str, Dict] = {}  # steam_id_32 -> latest presence
+        self.refreshed_at: Optional[datetime] = None
+        self.stopped_at: Dict[str, datetime] = {}  # steam_id_32 -> when they last left Dota 2
+
+    @property
+    def ready(self) -> bool:
+        return self.refreshed_at is not None
+
+    async def refresh(self) -> List[Dict]:
+        """Poll the presence of all linked accounts and return the transitions since the last poll
+
+        The first poll only fills the map, so a restart doesn't report everyone already playing.
+        """
+        steam_ids_64 = await db.get_linked_steam_ids()
+        summaries = await steam.get_player_summaries(steam_ids_64)
+        if steam_ids_64 and not summaries:
+            # Every batch failed: keep the old refresh time, so a tracker that never got
+            # an answer stays not ready and callers keep using their fallback
+            logger.warning(f"No Steam presence returned for {len(steam_ids_64)} accounts")
+            return []
+        now = datetime.now()
+
+        presence = {}
+        for steam_id_64 in steam_ids_64:
+            steam_id_32 = convert_steamid_64_to_32(steam_id_64)
+            summary = summaries.get(str(steam_id_64))
+            if summary is None:
+                # Keep what we knew if the account's batch failed
+                if steam_id_32 in self.presence:
+                    presence[steam_id_32] = self.presence[steam_id_32]
+                continue
+            presence[steam_id_32] = {
+                "name": summary.get("personaname"),
+                "online": summary.get("personastate", 0) > 0,
+                "game_id": summary.get("gameid"),
+                "game_name": summary.get("gameextrainfo"),
+                "seen_at": now,
+            }
+
+        events = self._diff(self.presence, presence, now) if self.ready else []
+        self.presence = presence
+        self.refreshed_at = now
+        return events
+
+    def _diff(self, old: Dict[str, Dict], new: Dict[str, Dict], now: datetime) -> List[Dict]:
+        events = []
+        for steam_id_32, entry in new.items():
+            was_playing = is_playing_dota(old.get(steam_id_32))
+            if is_playing_dota(entry) and not was_playing:
+                events.append({"type": STARTED_PLAYING, "steam_id_32": steam_id_32, "name": entry["name"], "at": now})
+            elif was_playing and not is_playing_dota(entry):
+                self.stopped_at[steam_id_32] = now
+                events.append({"type": STOPPED_PLAYING, "steam_id_32": steam_id_32, "name": entry["name"], "at": now})
+
+        for steam_id_32, stopped_at in list(self.stopped_at.items()):
+            if now - stopped_at > STOPPED_PLAYING_WINDOW:
+                del self.stopped_at[steam_id_32]
+        return events
+
+    def recently_stopped(self, steam_ids_32) -> List[str]:
+        """Those of the accounts that left Dota 2 within the last STOPPED_PLAYING_WINDOW"""
+        cutoff = datetime.now() - STOPPED_PLAYING_WINDOW
+        return [sid for sid in steam_ids_32 if self.stopped_at.get(str(sid), datetime.min) >= cutoff]
+
+    def get(self, steam_id_32: str) -> Optional[Dict]:
+        return self.presence.get(str(steam_id_32))
+
+
+def is_playing_dota(entry: Optional[Dict]) -> bool:
+    return bool(entry) and entry.get("game_id") == DOTA2_APP_ID
+
+
+def format_age(seconds: float) -> str:
+    if seconds < 60:
+        return f"{int(seconds)} сек."
+    if seconds < 3600:
+        return f"{int(seconds // 60)} мин."
+    return f"{int(seconds // 3600)} ч."
+
+
+async def get_chat_presence_text(chat_id: str) -> Optional[str]:
+    """Who in a chat is playing Dota 2, online or offline, or None before the first refresh"""
+    if not presence_tracker.ready:
+        return None
+
+    steam_ids_32 = await db.get_chat_steam_ids_32(chat_id)
+    if not steam_ids_32:
+        return "⚠️ В этом чате нет пользователей с привязанными Steam ID.\n\nИспользуйте команду /link_steam для привязки аккаунта."
+
+    in_dota, online, offline = [], [], []
+    oldest_seen_at = presence_tracker.refreshed_at
+    missing = [sid for sid in steam_ids_32 if not presence_tracker.get(sid)]
+    names = await db.get_user_names_by_steam_ids_32(missing) if missing else {}
+
+    for steam_id_32 in steam_ids_32:
+        entry = presence_tracker.get(steam_id_32)
+        if not entry:
+            offline.append(names.get(str(steam_id_32), f"Unknown user ({steam_id_32})"))
+            continue
+        oldest_seen_at = min(oldest_seen_at, entry["seen_at"])
+        if is_playing_dota(entry):
+            in_dota.append(entry["name"])
+        elif entry["online"]:
+            online.append(entry["name"])
+        else:
+            offline.append(entry["name"])
+
+    lines = []
+    for title, players in (
+        (config.MSG_WHO_IS_PLAYING_IN_DOTA, in_dota),
+        (config.MSG_WHO_IS_PLAYING_ONLINE, online),
+        (config.MSG_WHO_IS_PLAYING_OFFLINE, offline),
+    ):
+        if players:
+            lines.append(title)
+            lines.append(", ".join(players))
+    age = (datetime.now() - oldest_seen_at).total_seconds()
+    lines.append(config.MSG_WHO_IS_PLAYING_UPDATED.format(age=format_age(age)))
+    return "\n".join(lines)
+
+
+async def notify_started_playing(context, events):
+    """Tell the opted-in chats which of their players just started Dota 2"""
+    chat_ids = set(await db.get_dota_start_notification_chats())
+    if not chat_ids:
+        return
+
+    names = {event["steam_id_32"]: event["name"] for event in events}
+    chats = await db.get_chats_by_steam_ids_32(names)
+    for chat_id, steam_ids_32 in chats.items():
+        if chat_id not in chat_ids:
+            continue
+        players = ", ".join(names[sid] for sid in steam_ids_32)
+        try:
+            await context.bot.send_message(
+                chat_id=chat_id, text=config.MSG_DOTA_STARTED_PLAYING.format(players=players)
+            )
+        except TelegramError as e:
+            logger.error(f"Error notifying chat {chat_id} about started games: {e}")
+
+
+async def check_games_after_stop(context):
+    """Look for common games of the players who just left Dota 2, in every chat they share"""
+    steam_ids_32 = context.job.data
+    try:
+        chats = await db.get_chats_by_steam_ids_32(steam_ids_32)
+
+        # Teammates who stopped in an earlier poll count as well
+        chat_players = {}
+        for chat_id in chats:
+            players = presence_tracker.recently_stopped(await db.get_chat_steam_ids_32(chat_id))
+            if len(players) >= 2:
+                chat_players[chat_id] = players
+    except DatabaseError as e:
+        logger.error(f"Error finding the chats of players who stopped playing: {e}")
+        return
+    if not chat_players:
+        return
+
+    unique_players = list(dict.fromkeys(sid for players in chat_players.values() for sid in players))
+    logger.info(f"Checking games of {len(unique_players)} players who stopped playing in {len(chat_players)} chats")
+    player_matches = await steam._sync_players(unique_players, 1)
+    for chat_id, players in chat_players.items():
+        await steam._find_and_store_common_games(
+            context, chat_id, players, 1, player_matches=player_matches, quiet=True
+        )
+
+
+async def handle_presence_events(context, events):
+    """Notify about started games and schedule a game check for stopped ones"""
+    started = [event for event in events if event["type"] == STARTED_PLAYING]
+    stopped = [event["steam_id_32"] for event in events if event["type"] == STOPPED_PLAYING]
+
+    if started:
+        await notify_started_playing(context, started)
+    if stopped:
+        context.job_queue.run_once(
+            check_games_after_stop, when=MATCH_CHECK_DELAY, data=stopped, name="check_games_after_stop"
+        )
+
+
+async def refresh_presence(context):
+    """Job callback that refreshes the presence map and acts on its transitions"""
+    try:
+        events = await presence_tracker.refresh()
+        logger.info(f"Refreshed Steam presence of {len(presence_tracker.presence)} accounts, {len(events)} transitions")
+        await handle_presence_events(context, events)
+    except (DatabaseError, SteamApiError) as e:
+        logger.error(f"Error refreshing Steam presence: {e}")
+
+
+# Create a global instance
+presence_tracker = PresenceTracker()
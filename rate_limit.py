@@ -0,0 +1,93 @@
+"""Token bucket rate limiter that serves waiting callers by priority."""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class PriorityTokenBucket:
+    """Hands out `rate` tokens per second with bursts of up to `capacity`.
+
+    Callers that have to wait are queued by priority, then by arrival. After a
+    rate limit response the bucket can be blocked for the server's Retry-After.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0:
+            raise ValueError(f"Token bucket rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._waiters = []  # heap of (priority, arrival, future)
+        self._arrivals = itertools.count()
+        self._dispatcher = None
+        self._loop = None
+
+    def __len__(self) -> int:
+        """Number of callers waiting for a token"""
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: int = PRIORITY_BACKGROUND) -> float:
+        """Wait for a token and return how long that took in seconds"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # A new event loop (e.g. after a restart in tests) cannot reuse the old waiters
+            self._loop = loop
+            self._waiters = []
+            self._dispatcher = None
+
+        if not self._waiters and self._take():
+            return 0.0
+
+        started = time.monotonic()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._arrivals), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+        await future
+        return time.monotonic() - started
+
+    def block_for(self, seconds: float) -> None:
+        """Hand out no tokens for the given time, e.g. after a 429 with Retry-After"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+        # Refill only from the end of the block, so no burst follows it
+        self.updated = self.blocked_until
+
+    def _take(self) -> bool:
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return False
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def _dispatch(self):
+        while self._waiters:
+            # Skip callers that gave up waiting
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+                continue
+
+            if self._take():
+                _, _, future = heapq.heappop(self._waiters)
+                future.set_result(None)
+                continue
+
+            now = time.monotonic()
+            delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.001)
+            await asyncio.sleep(delay)
@@ -1,14 +1,45 @@
 import logging
+import os
+import time as time_module
 from datetime import time, datetime, timedelta
 import re
 
 import db
+import metrics
+from exceptions import DatabaseError
 from poll_state import poll_state
+import presence
 import steam
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# How often poll participants are checked for common games; presence events
+# find games as soon as players leave Dota 2, so the poll is only a fallback then
+DOTA_GAME_CHECK_INTERVAL = 15 * 60  # seconds
+DOTA_GAME_CHECK_FALLBACK_INTERVAL = 60 * 60  # seconds
+
+# How often expired OpenDota responses are removed from the cache, and how long
+# they are kept after expiring to answer with while OpenDota is down
+OPENDOTA_CACHE_PURGE_INTERVAL = 60 * 60  # seconds
+OPENDOTA_CACHE_STALE_FOR = timedelta(days=1)
+
+# How often the admin dashboard aggregates are rebuilt
+CHAT_AGGREGATES_INTERVAL = int(os.environ.get("CHAT_AGGREGATES_INTERVAL", 10 * 60))  # seconds
+
+
+def timed_job(job_kind, callback):
+    """Wrap a job callback to record its duration and completion time"""
+
+    async def wrapper(context):
+        try:
+            with metrics.JOB_DURATION_SECONDS.time(job=job_kind):
+                await callback(context)
+        finally:
+            metrics.JOB_LAST_RUN_TIMESTAMP.set(time_module.time(), job=job_kind)
+
+    return wrapper
+
 
 async def setup_jobs(job_queue, send_poll_func):
     """Set up scheduled jobs"""
@@ -20,7 +51,7 @@ async def setup_jobs(job_queue, send_poll_func):
         # No custom schedules - run default poll at 21:30 (GMT+6)
         target_time = time(hour=15, minute=30)  # 21:30 GMT+6 = 15:30 UTC
         job_queue.run_daily(
-            lambda ctx: daily_poll(ctx, send_poll_func),
+            timed_job("daily_poll", lambda ctx: daily_poll(ctx, send_poll_func)),
             time=target_time,
             days=(0, 1, 2, 3, 4, 5, 6),
             name="daily_poll",
@@ -31,12 +62,40 @@ async def setup_jobs(job_queue, send_poll_func):
 
     # Set up Dota 2 game checker
     dota_game_check_job = job_queue.run_repeating(
-        lambda ctx: steam.check_and_store_dota_games(ctx),
-        interval=15 * 60,  # Check every 15 minutes
+        timed_job("dota_game_check", steam.check_and_store_dota_games),
+        interval=DOTA_GAME_CHECK_FALLBACK_INTERVAL if steam.STEAM_API_KEY else DOTA_GAME_CHECK_INTERVAL,
         first=0,  # Start immediately
         name="dota_game_check",
     )
 
+    # Keep the Steam presence of linked accounts in memory for /who_is_playing,
+    # and check for games when players leave Dota 2
+    if steam.STEAM_API_KEY:
+        job_queue.run_repeating(
+            timed_job("refresh_presence", presence.refresh_presence),
+            interval=presence.PRESENCE_INTERVAL,
+            first=0,
+            name="refresh_presence",
+        )
+    else:
+        logger.warning("STEAM_API_KEY is not set, /who_is_playing will ask OpenDota on every call")
+
+    # Drop expired OpenDota responses
+    job_queue.run_repeating(
+        timed_job("purge_opendota_cache", purge_opendota_cache),
+        interval=OPENDOTA_CACHE_PURGE_INTERVAL,
+        first=OPENDOTA_CACHE_PURGE_INTERVAL,
+        name="purge_opendota_cache",
+    )
+
+    # Keep the admin dashboard aggregates fresh
+    job_queue.run_repeating(
+        timed_job("refresh_chat_aggregates", refresh_chat_aggregates),
+        interval=CHAT_AGGREGATES_INTERVAL,
+        first=0,
+        name="refresh_chat_aggregates",
+    )
+
     logger.info("Scheduled jobs set up successfully")
 
 
@@ -52,7 +111,10 @@ async def setup_custom_poll_times(job_queue, send_poll_func, chat_times):
 
             # Schedule the job
             job_queue.run_daily(
-                lambda ctx, chat=chat_id: custom_poll(ctx, send_poll_func, chat),
+                timed_job(
+                    "custom_poll",
+                    lambda ctx, chat=chat_id: custom_poll(ctx, send_poll_func, chat),
+                ),
                 time=target_time,
                 days=(0, 1, 2, 3, 4, 5, 6),  # Run every day
                 name=f"custom_poll_{chat_id}_{poll_time_str}",
@@ -142,6 +204,23 @@ async def custom_poll(context, send_poll_func, chat_id):
         )
 
 
+async def refresh_chat_aggregates(context):
+    """Rebuild the per-chat aggregates shown on the admin dashboard."""
+    try:
+        await db.refresh_chat_aggregates()
+    except DatabaseError as e:
+        logger.error(f"Error refreshing chat aggregates: {e}")
+
+
+async def purge_opendota_cache(context):
+    """Remove expired OpenDota responses from the cache."""
+    try:
+        removed = await db.purge_opendota_cache(datetime.now() - OPENDOTA_CACHE_STALE_FOR)
+        logger.info(f"Removed {removed} expired OpenDota cache entries")
+    except DatabaseError as e:
+        logger.error(f"Error purging OpenDota cache: {e}")
+
+
 async def reschedule_poll_for_chat(job_queue, chat_id, send_poll_func):
     """Reschedule the poll for a chat based on its stored time."""
     # Remove existing scheduled jobs for this chat
@@ -160,7 +239,10 @@ async def reschedule_poll_for_chat(job_queue, chat_id, send_poll_func):
 
         # Schedule the job
         job_queue.run_daily(
-            lambda ctx, chat=chat_id: custom_poll(ctx, send_poll_func, chat),
+            timed_job(
+                "custom_poll",
+                lambda ctx, chat=chat_id: custom_poll(ctx, send_poll_func, chat),
+            ),
             time=target_time,
             days=(0, 1, 2, 3, 4, 5, 6),  # Run every day
             name=f"custom_poll_{chat_id}_{poll_time_str}",
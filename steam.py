@@ -1,38 +1,376 @@
 import asyncio
+import json
 import logging
-from datetime import datetime, timedelta
+import math
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 
 import aiohttp
+from telegram.error import TelegramError
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, without it only the projection is kept
+    zstandard = None
 
 import db
-from exceptions import DatabaseError, DotaApiError
+import metrics
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from exceptions import DatabaseError, DotaApiError, OpenDotaUnavailableError, SteamApiError
+from rate_limit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PriorityTokenBucket
 import summary
-from utils import convert_steamid_64_to_32
+from utils import convert_steamid_64_to_32, split_message
 
 logger = logging.getLogger(__name__)
 
+# OpenDota client settings
+OPENDOTA_API_URL = os.environ.get("OPENDOTA_API_URL", "https://api.opendota.com/api")
+OPENDOTA_POOL_SIZE = int(os.environ.get("OPENDOTA_POOL_SIZE", 20))
+OPENDOTA_DNS_CACHE_TTL = 300  # seconds
+OPENDOTA_KEEPALIVE_TIMEOUT = 60  # seconds
+OPENDOTA_TIMEOUT = aiohttp.ClientTimeout(
+    total=float(os.environ.get("OPENDOTA_TIMEOUT", 30)), connect=5, sock_read=15
+)
+
+# How many OpenDota requests one fan-out over a chat's players keeps in flight
+OPENDOTA_CONCURRENCY = int(os.environ.get("OPENDOTA_CONCURRENCY", 8))
+
+# OpenDota allows about 60 requests per minute without an API key
+OPENDOTA_RATE_LIMIT = float(os.environ.get("OPENDOTA_RATE_LIMIT", 60))  # requests per minute
+OPENDOTA_BURST = int(os.environ.get("OPENDOTA_BURST", 5))
+OPENDOTA_MAX_RETRIES = 3  # retries after a 429 response
+OPENDOTA_BACKOFF_BASE = 2.0  # seconds, doubled on every retry without Retry-After
+OPENDOTA_MAX_BACKOFF = 120.0  # seconds
+
+# How long OpenDota responses are cached, by endpoint; other endpoints are not cached
+OPENDOTA_CACHE_TTLS = {
+    "players/:id": int(os.environ.get("OPENDOTA_CACHE_TTL_PLAYER", 5 * 60)),  # seconds
+}
+
+# Match history sync: only match IDs and start times are requested, page by page
+MATCH_SYNC_PAGE_SIZE = 100
+MATCH_SYNC_MAX_PAGES = int(os.environ.get("MATCH_SYNC_MAX_PAGES", 20))
+MATCH_SYNC_PROJECTION = "project=match_id&project=start_time"
+
+# Match details are stored once as a projection; the raw payload is kept compressed if enabled
+MATCH_DETAILS_STORE_RAW = os.environ.get("MATCH_DETAILS_STORE_RAW", "1") == "1"
+MATCH_DETAILS_ZSTD_LEVEL = 10
+MATCH_DETAILS_FIELDS = ("match_id", "radiant_win", "start_time", "duration")
+MATCH_PLAYER_FIELDS = ("account_id", "isRadiant", "hero_id", "kills", "deaths", "assists")
+
+OPENDOTA_MATCH_URL = "https://www.opendota.com/matches/{match_id}"
+
+# Steam Web API settings; it shares the pooled client session with OpenDota
+STEAM_API_URL = os.environ.get("STEAM_API_URL", "https://api.steampowered.com")
+STEAM_API_KEY = os.environ.get("STEAM_API_KEY", "")
+STEAM_SUMMARIES_BATCH_SIZE = 100  # most steamids GetPlayerSummaries accepts per call
+STEAM_RATE_LIMIT = float(os.environ.get("STEAM_RATE_LIMIT", 60))  # requests per minute
+STEAM_BURST = int(os.environ.get("STEAM_BURST", 5))
+STEAM_MAX_RETRIES = 3  # retries after a 429 response
+
+# Shared by every OpenDota caller in the process
+opendota_limiter = PriorityTokenBucket(OPENDOTA_RATE_LIMIT / 60, OPENDOTA_BURST)
+metrics.OPENDOTA_QUEUE_DEPTH.set_function(lambda: len(opendota_limiter))
+steam_api_limiter = PriorityTokenBucket(STEAM_RATE_LIMIT / 60, STEAM_BURST)
+
+# Long-lived OpenDota session and the event loop it belongs to
+_opendota_session = None
+_opendota_session_loop = None
+
+
+# Stops OpenDota calls after consecutive failures; also reported by the readiness probe
+OPENDOTA_FAILURE_THRESHOLD = int(os.environ.get("OPENDOTA_FAILURE_THRESHOLD", 5))  # consecutive failures
+OPENDOTA_RESET_TIMEOUT = float(os.environ.get("OPENDOTA_RESET_TIMEOUT", 60))  # seconds before a probe
+opendota_breaker = CircuitBreaker("OpenDota", OPENDOTA_FAILURE_THRESHOLD, OPENDOTA_RESET_TIMEOUT)
+metrics.OPENDOTA_CIRCUIT_STATE.set_function(
+    lambda: {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[opendota_breaker.state]
+)
+
+# Interactive requests slower than this latency percentile get a second, hedged request
+OPENDOTA_HEDGE_PERCENTILE = float(os.environ.get("OPENDOTA_HEDGE_PERCENTILE", 95))  # 0 disables hedging
+OPENDOTA_HEDGE_MIN_DELAY = 0.5  # seconds
+
+
+def get_opendota_health():
+    """Summarize the OpenDota circuit breaker."""
+    return {
+        "state": opendota_breaker.state,
+        "consecutive_failures": opendota_breaker.consecutive_failures,
+        "last_success": opendota_breaker.last_success,
+        "last_failure": opendota_breaker.last_failure,
+    }
+
+
+def _endpoint_label(endpoint):
+    """Metric label for an endpoint, with IDs and the query string removed."""
+    return re.sub(r"\d+", ":id", endpoint.split("?", 1)[0])
+
+
+def _get_opendota_session():
+    """Return the pooled OpenDota session, creating it on first use."""
+    global _opendota_session, _opendota_session_loop
+
+    loop = asyncio.get_running_loop()
+    if _opendota_session is None or _opendota_session.closed or _opendota_session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=OPENDOTA_POOL_SIZE,
+            ttl_dns_cache=OPENDOTA_DNS_CACHE_TTL,
+            keepalive_timeout=OPENDOTA_KEEPALIVE_TIMEOUT,
+        )
+        _opendota_session = aiohttp.ClientSession(connector=connector, timeout=OPENDOTA_TIMEOUT)
+        _opendota_session_loop = loop
+    return _opendota_session
+
+
+async def close_opendota_session():
+    """Close the pooled OpenDota session on shutdown."""
+    global _opendota_session, _opendota_session_loop
+
+    if _opendota_session is not None and not _opendota_session.closed:
+        await _opendota_session.close()
+    _opendota_session = None
+    _opendota_session_loop = None
+
+
+def _retry_after_seconds(retry_after, attempt):
+    """Seconds to back off after a 429, from Retry-After or exponentially."""
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), OPENDOTA_MAX_BACKOFF)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+            delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+            return min(max(delay, 0.0), OPENDOTA_MAX_BACKOFF)
+        except (TypeError, ValueError):
+            pass
+    return min(OPENDOTA_BACKOFF_BASE * 2 ** attempt, OPENDOTA_MAX_BACKOFF)
+
+
+async def _fetch_opendota(url, endpoint):
+    """Send one request to OpenDota and return its status, Retry-After header and JSON body."""
+    started = time.perf_counter()
+    try:
+        with metrics.OPENDOTA_REQUEST_SECONDS.time(endpoint=_endpoint_label(endpoint)):
+            async with _get_opendota_session().get(url) as response:
+                metrics.OPENDOTA_RESPONSES_TOTAL.inc(status=response.status)
+                data = await response.json() if response.status == 200 else None
+                return response.status, response.headers.get("Retry-After"), data, time.perf_counter() - started
+    except asyncio.TimeoutError:
+        metrics.OPENDOTA_RESPONSES_TOTAL.inc(status="timeout")
+        raise DotaApiError(f"OpenDota API request to {endpoint} timed out")
+    except aiohttp.ClientError as e:
+        metrics.OPENDOTA_RESPONSES_TOTAL.inc(status="error")
+        raise DotaApiError(f"Error in OpenDota API request: {e}")
+
+
+async def _hedged_fetch_opendota(url, endpoint, priority):
+    """Fetch from OpenDota, sending a second request if the first is unusually slow.
+
+    Only interactive requests are hedged, once enough latencies are known.
+    """
+    hedge_delay = None
+    if OPENDOTA_HEDGE_PERCENTILE and priority <= PRIORITY_INTERACTIVE:
+        hedge_delay = opendota_breaker.latency_percentile(OPENDOTA_HEDGE_PERCENTILE)
+    if hedge_delay is None:
+        return await _fetch_opendota(url, endpoint)
 
-async def _send_opendota_request(endpoint):
-    """Helper function to send a request to the OpenDota API."""
-    url = f"https://api.opendota.com/api/{endpoint}"
-    logger.info(f"Sending OpenDota API request to {url}")
+    async def hedge():
+        await opendota_limiter.acquire(priority)
+        metrics.OPENDOTA_HEDGED_TOTAL.inc()
+        logger.info(f"Hedging slow OpenDota request to {url}")
+        return await _fetch_opendota(url, endpoint)
 
+    first = asyncio.ensure_future(_fetch_opendota(url, endpoint))
+    pending = {first}
+    error = None
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
+        # A caller cancelled during the hedge delay cancels the first request, too
+        done, pending = await asyncio.wait(pending, timeout=max(hedge_delay, OPENDOTA_HEDGE_MIN_DELAY))
+        if done:
+            return first.result()
+
+        pending.add(asyncio.ensure_future(hedge()))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _send_opendota_request(endpoint, priority=PRIORITY_BACKGROUND):
+    """Helper function to send a request to the OpenDota API.
+
+    Requests go through the shared rate limiter; interactive ones are served first.
+    While the circuit breaker is open, requests fail at once with OpenDotaUnavailableError.
+    """
+    url = f"{OPENDOTA_API_URL}/{endpoint}"
+    priority_label = "interactive" if priority <= PRIORITY_INTERACTIVE else "background"
+
+    for attempt in range(OPENDOTA_MAX_RETRIES + 1):
+        if not opendota_breaker.allow_request():
+            raise OpenDotaUnavailableError(f"OpenDota API is unavailable, not requesting {endpoint}")
+
+        try:
+            # A caller cancelled while queued must give back a half-open probe, too
+            waited = await opendota_limiter.acquire(priority)
+            metrics.OPENDOTA_QUEUE_WAIT_SECONDS.observe(waited, priority=priority_label)
+            logger.info(f"Sending OpenDota API request to {url}")
+            status, retry_after, data, latency = await _hedged_fetch_opendota(url, endpoint, priority)
+        except DotaApiError:
+            opendota_breaker.record_failure()
+            raise
+        except BaseException:
+            opendota_breaker.release()
+            raise
+
+        if status == 429:
+            opendota_breaker.release()
+            delay = _retry_after_seconds(retry_after, attempt)
+            logger.warning(f"OpenDota rate limit hit, pausing all requests for {delay:.1f}s")
+            opendota_limiter.block_for(delay)
+            continue
+        if status >= 500:
+            opendota_breaker.record_failure()
+            raise DotaApiError(f"OpenDota API returned status {status}")
+        if status != 200:
+            # The service works, the request was wrong
+            opendota_breaker.record_success()
+            raise DotaApiError(f"OpenDota API returned status {status}")
+
+        opendota_breaker.record_success(latency)
+        return data
+
+    # Rate limiting is not an outage; the breaker was released at every 429
+    raise DotaApiError(f"OpenDota API rate limit exceeded after {OPENDOTA_MAX_RETRIES} retries")
+
+
+async def _send_steam_api_request(path, params, priority=PRIORITY_BACKGROUND):
+    """Send a request to the Steam Web API; a 429 pauses every Steam caller before the retry."""
+    if not STEAM_API_KEY:
+        raise SteamApiError("STEAM_API_KEY is not set")
+    url = f"{STEAM_API_URL}/{path}"
+
+    for attempt in range(STEAM_MAX_RETRIES + 1):
+        await steam_api_limiter.acquire(priority)
+        try:
+            async with _get_opendota_session().get(url, params={"key": STEAM_API_KEY, **params}) as response:
+                if response.status == 429:
+                    delay = _retry_after_seconds(response.headers.get("Retry-After"), attempt)
+                    logger.warning(f"Steam API rate limit hit, pausing all requests for {delay:.1f}s")
+                    steam_api_limiter.block_for(delay)
+                    continue
                 if response.status != 200:
-                    raise DotaApiError(f"OpenDota API returned status {response.status}")
+                    raise SteamApiError(f"Steam API returned status {response.status}")
                 return await response.json()
-    except aiohttp.ClientError as e:
-        raise DotaApiError(f"Error in OpenDota API request: {e}")
+        except asyncio.TimeoutError:
+            raise SteamApiError(f"Steam API request to {path} timed out")
+        except aiohttp.ClientError as e:
+            raise SteamApiError(f"Error in Steam API request: {e}")
+
+    raise SteamApiError(f"Steam API rate limit exceeded after {STEAM_MAX_RETRIES} retries")
+
+
+async def get_player_summaries(steam_ids_64, priority=PRIORITY_BACKGROUND):
+    """Get Steam player summaries keyed by 64-bit Steam ID, up to 100 IDs per request.
+
+    Accounts of a failed batch are left out, the others are still returned.
+    """
+    unique_ids = list(dict.fromkeys(str(steam_id) for steam_id in steam_ids_64))
+    batches = [
+        unique_ids[i : i + STEAM_SUMMARIES_BATCH_SIZE]
+        for i in range(0, len(unique_ids), STEAM_SUMMARIES_BATCH_SIZE)
+    ]
+    responses = await _gather_bounded(
+        lambda batch: _send_steam_api_request(
+            "ISteamUser/GetPlayerSummaries/v2/", {"steamids": ",".join(batch)}, priority
+        ),
+        batches,
+    )
+
+    summaries = {}
+    for batch, data in zip(batches, responses):
+        if isinstance(data, BaseException):
+            if not isinstance(data, SteamApiError):
+                raise data
+            logger.error(f"Error getting Steam player summaries for {len(batch)} accounts: {data}")
+            continue
+        for player in data.get("response", {}).get("players", []):
+            summaries[player["steamid"]] = player
+    return summaries
+
 
+async def _get_opendota(endpoint, priority=PRIORITY_BACKGROUND):
+    """Read-through cache in front of _send_opendota_request.
 
-async def verify_steam_id(steam_id_64):
+    Responses are kept in the database for the TTL of their endpoint. A failing
+    cache only costs the network call, it never fails the request.
+    """
+    label = _endpoint_label(endpoint)
+    ttl = OPENDOTA_CACHE_TTLS.get(label)
+    if not ttl:
+        return await _send_opendota_request(endpoint, priority)
+
+    try:
+        cached = await db.get_opendota_cache(endpoint)
+    except DatabaseError as e:
+        logger.warning(f"Error reading OpenDota cache for {endpoint}: {e}")
+        cached = None
+    if cached is not None:
+        metrics.OPENDOTA_CACHE_TOTAL.inc(endpoint=label, result="hit")
+        return json.loads(cached)
+
+    metrics.OPENDOTA_CACHE_TOTAL.inc(endpoint=label, result="miss")
+    try:
+        data = await _send_opendota_request(endpoint, priority)
+    except DotaApiError as e:
+        # Better an expired answer than none while OpenDota is down
+        try:
+            stale = await db.get_opendota_cache(endpoint, include_expired=True)
+        except DatabaseError:
+            stale = None
+        if stale is None:
+            raise
+        logger.warning(f"Serving stale OpenDota response for {endpoint}: {e}")
+        metrics.OPENDOTA_CACHE_TOTAL.inc(endpoint=label, result="stale")
+        return json.loads(stale)
+    try:
+        await db.store_opendota_cache(endpoint, json.dumps(data), datetime.now() + timedelta(seconds=ttl))
+    except DatabaseError as e:
+        logger.warning(f"Error storing OpenDota cache for {endpoint}: {e}")
+    return data
+
+
+async def _gather_bounded(func, items, limit=None):
+    """Await func(item) for all items, at most `limit` at a time.
+
+    Results come back in the order of items; a failed call leaves its exception in place.
+    """
+    semaphore = asyncio.Semaphore(limit or OPENDOTA_CONCURRENCY)
+
+    async def run(item):
+        async with semaphore:
+            return await func(item)
+
+    return await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+
+
+async def verify_steam_id(steam_id_64, priority=PRIORITY_INTERACTIVE):
     """Verify Steam ID by checking if it exists in OpenDota API."""
     steam_id_32 = convert_steamid_64_to_32(steam_id_64)
     try:
-        data = await _send_opendota_request(f"players/{steam_id_32}")
-        if not data or "profile" not in data:
+        data = await _get_opendota(f"players/{steam_id_32}", priority)
+        if not data or not data.get("profile"):
             return None
 
         profile_data = {
@@ -47,27 +385,125 @@ async def verify_steam_id(steam_id_64):
         return None
 
 
-async def get_player_dota_stats(steam_id_32, limit=100):
-    """Get player's Dota 2 stats from OpenDota API."""
+async def _fetch_match_pages(steam_id_32, days, priority, stop_at_match_id=None, before_match_id=None):
+    """Page backwards through a player's matches of the last `days` days.
+
+    Starts below before_match_id if given and stops at the first match at or
+    below stop_at_match_id, at the end of the window or after
+    MATCH_SYNC_MAX_PAGES pages. Returns the matches and whether the whole
+    window was covered.
+    """
+    matches = []
+    less_than_match_id = before_match_id
+    for _ in range(MATCH_SYNC_MAX_PAGES):
+        endpoint = (
+            f"players/{steam_id_32}/matches?date={days}&limit={MATCH_SYNC_PAGE_SIZE}"
+            f"&{MATCH_SYNC_PROJECTION}"
+        )
+        if less_than_match_id is not None:
+            endpoint += f"&less_than_match_id={less_than_match_id}"
+        # Never from the cache: a cached page would hide the matches played since
+        page = await _send_opendota_request(endpoint, priority) or []
+
+        for match in page:
+            if stop_at_match_id is not None and match["match_id"] <= stop_at_match_id:
+                return matches, True
+            matches.append({"match_id": match["match_id"], "start_time": match["start_time"]})
+
+        if len(page) < MATCH_SYNC_PAGE_SIZE:
+            return matches, True
+        less_than_match_id = min(match["match_id"] for match in page)
+
+    logger.warning(f"Match sync of {steam_id_32} stopped after {MATCH_SYNC_MAX_PAGES} pages")
+    return matches, False
+
+
+async def sync_player_matches(steam_id_32, days, priority=PRIORITY_BACKGROUND):
+    """Sync a player's match history and return their match IDs of the last `days` days.
+
+    Once a player is synced, only matches newer than their cursor are fetched.
+    A longer window pages on from the oldest synced match into older history.
+    """
+    now = time.time()
+    since = now - days * 24 * 60 * 60
+    cursor = await db.get_player_sync_cursor(steam_id_32)
+
     try:
-        data = await _send_opendota_request(f"players/{steam_id_32}/matches?limit={limit}")
-        return data
+        matches = []
+        synced_since = now
+        if cursor:
+            newest = cursor["last_start_time"] or cursor["synced_since"]
+            newer_days = max(1, math.ceil((now - newest) / (24 * 60 * 60)))
+            matches, _ = await _fetch_match_pages(
+                steam_id_32, newer_days, priority, stop_at_match_id=cursor["last_match_id"]
+            )
+            synced_since = cursor["synced_since"]
+        if synced_since > since:
+            older, complete = await _fetch_match_pages(
+                steam_id_32, days, priority, before_match_id=cursor and cursor["first_match_id"]
+            )
+            matches += older
+            synced_since = since if complete else min((m["start_time"] for m in older), default=synced_since)
     except DotaApiError as e:
-        logger.error(f"Error getting player dota stats for {steam_id_32}: {e}")
+        if not cursor:
+            raise
+        # Answer from what was synced before while OpenDota is down
+        logger.warning(f"Using previously synced matches of {steam_id_32}: {e}")
+        return await db.get_player_match_ids(steam_id_32, since)
+
+    await db.store_player_matches(steam_id_32, matches, synced_since)
+    return await db.get_player_match_ids(steam_id_32, since)
+
+
+def project_match_details(data):
+    """Keep only the match and player fields we use from an OpenDota match payload."""
+    details = {field: data.get(field) for field in MATCH_DETAILS_FIELDS}
+    details["players"] = [
+        {field: player.get(field) for field in MATCH_PLAYER_FIELDS} for player in data.get("players", [])
+    ]
+    return details
+
+
+def _compress_match_details(data):
+    """Encode a raw match payload for storage, or (None, None) if it is not kept."""
+    if not MATCH_DETAILS_STORE_RAW or zstandard is None:
+        return None, None
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return zstandard.ZstdCompressor(level=MATCH_DETAILS_ZSTD_LEVEL).compress(raw), "zstd"
+
+
+async def get_raw_match_details(match_id):
+    """Get the full stored OpenDota payload of a match, or None if it was not kept."""
+    stored = await db.get_raw_match_details(match_id)
+    if stored is None:
+        return None
+    raw, encoding = stored
+    if encoding != "zstd" or zstandard is None:
+        logger.warning(f"Cannot decode raw match details of {match_id} stored as {encoding}")
         return None
+    return json.loads(zstandard.ZstdDecompressor().decompress(raw))
 
 
-async def get_match_details(match_id):
-    """Get details of a Dota 2 match from OpenDota API."""
+async def _fetch_match_details(match_id, priority=PRIORITY_BACKGROUND):
+    """Fetch a match from OpenDota API and store its projection."""
     try:
-        data = await _send_opendota_request(f"matches/{match_id}")
-        return data
+        data = await _send_opendota_request(f"matches/{match_id}", priority)
     except DotaApiError as e:
         logger.error(f"Error getting match details for {match_id}: {e}")
         return None
+    if not data or "players" not in data:
+        return None
+
+    details = project_match_details(data)
+    raw, raw_encoding = _compress_match_details(data)
+    try:
+        await db.store_match_details(details, raw, raw_encoding)
+    except DatabaseError as e:
+        logger.warning(f"Error storing match details for {match_id}: {e}")
+    return details
 
 
-async def get_steam_player_statuses(chat_id: str):
+async def get_steam_player_statuses(chat_id: str, priority=PRIORITY_INTERACTIVE):
     """Get the Steam status of all users in a chat."""
     try:
         user_steam_ids_32 = await db.get_chat_steam_ids_32(chat_id)
@@ -77,28 +513,29 @@ async def get_steam_player_statuses(chat_id: str):
         online_players = []
         offline_players = []
 
-        for steam_id_32 in user_steam_ids_32:
-            try:
-                data = await _send_opendota_request(f"players/{steam_id_32}")
-                if data and data.get("profile"):
-                    if data.get("profile").get("last_login") is None:
-                        offline_players.append(data["profile"]["personaname"])
-                    else:
-                        last_login_time = datetime.fromisoformat(data["profile"]["last_login"].replace("Z", "+00:00"))
-                        if datetime.now(last_login_time.tzinfo) - last_login_time < timedelta(minutes=30):
-                            online_players.append(data["profile"]["personaname"])
-                        else:
-                            offline_players.append(data["profile"]["personaname"])
+        profiles = await _gather_bounded(
+            lambda steam_id_32: _get_opendota(f"players/{steam_id_32}", priority),
+            user_steam_ids_32,
+        )
+
+        for steam_id_32, data in zip(user_steam_ids_32, profiles):
+            if isinstance(data, BaseException):
+                if not isinstance(data, DotaApiError):
+                    raise data
+                logger.error(f"Error getting OpenDota data for {steam_id_32}: {data}")
+                data = None
+
+            if data and data.get("profile"):
+                if data.get("profile").get("last_login") is None:
+                    offline_players.append(data["profile"]["personaname"])
                 else:
-                    logger.warning(f"No OpenDota user data for {steam_id_32}")
-                    user_info = await db.get_user_info_by_steam_id_32(steam_id_32)
-                    if user_info:
-                        offline_players.append(user_info["first_name"])
+                    last_login_time = datetime.fromisoformat(data["profile"]["last_login"].replace("Z", "+00:00"))
+                    if datetime.now(last_login_time.tzinfo) - last_login_time < timedelta(minutes=30):
+                        online_players.append(data["profile"]["personaname"])
                     else:
-                        offline_players.append(f"Unknown user ({steam_id_32})")
-
-            except DotaApiError as e:
-                logger.error(f"Error getting OpenDota data for {steam_id_32}: {e}")
+                        offline_players.append(data["profile"]["personaname"])
+            else:
+                logger.warning(f"No OpenDota user data for {steam_id_32}")
                 user_info = await db.get_user_info_by_steam_id_32(steam_id_32)
                 if user_info:
                     offline_players.append(user_info["first_name"])
@@ -136,46 +573,131 @@ async def check_and_store_dota_games(context):
             chat_participants[p.chat_id] = []
         chat_participants[p.chat_id].append(p)
 
+    chat_steam_ids = {}
     for chat_id, participant_group in chat_participants.items():
         if len(participant_group) < 2:
             continue
 
         user_ids = [p.user_id for p in participant_group]
-        steam_ids_32 = [convert_steamid_64_to_32(user.steam_id) for user in (await asyncio.gather(*[db.get_user_info(uid) for uid in user_ids])) if user and user.get("steam_id")]
+        steam_ids_32 = [convert_steamid_64_to_32(user["steam_id"]) for user in (await asyncio.gather(*[db.get_user_info(uid) for uid in user_ids])) if user and user.get("steam_id")]
 
         if len(steam_ids_32) < 2:
             continue
+        chat_steam_ids[chat_id] = steam_ids_32
+
+    # A player who took part in several chats is synced once for all of them
+    unique_steam_ids = list(dict.fromkeys(sid for steam_ids_32 in chat_steam_ids.values() for sid in steam_ids_32))
+    if unique_steam_ids:
+        logger.info(f"Syncing matches of {len(unique_steam_ids)} players for {len(chat_steam_ids)} chats.")
+    player_matches = await _sync_players(unique_steam_ids, 1)
 
-        await _find_and_store_common_games(context, chat_id, steam_ids_32, 1)
-        participant_ids_to_delete = [p.id for p in participant_group]
+    for chat_id, steam_ids_32 in chat_steam_ids.items():
+        await _find_and_store_common_games(context, chat_id, steam_ids_32, 1, player_matches=player_matches)
+        participant_ids_to_delete = [p.id for p in chat_participants[chat_id]]
         await db.delete_game_participants(participant_ids_to_delete)
         logger.info(f"Deleted {len(participant_ids_to_delete)} game participants for chat {chat_id}.")
 
 
-async def check_games_on_demand(context, chat_id, days):
-    """Check for games on demand for all linked users in a chat."""
+async def check_games_on_demand(context, chat_id, days, progress_message=None):
+    """Check for games on demand for all linked users in a chat.
+
+    If a progress message is given, it is edited while the check runs and ends up holding the result.
+    """
     logger.info(f"Checking for games on demand in chat {chat_id} for the last {days} days.")
     user_steam_ids_32 = await db.get_chat_steam_ids_32(chat_id)
     if len(user_steam_ids_32) < 2:
-        await context.bot.send_message(chat_id=chat_id, text="Not enough users with linked Steam accounts in this chat to check for common games.")
+        await _send_report(context, chat_id, "Not enough users with linked Steam accounts in this chat to check for common games.", progress_message)
         return
 
-    await _find_and_store_common_games(context, chat_id, user_steam_ids_32, days)
+    await _find_and_store_common_games(
+        context,
+        chat_id,
+        user_steam_ids_32,
+        days,
+        priority=PRIORITY_INTERACTIVE,
+        progress_message=progress_message,
+    )
 
 
-async def _find_and_store_common_games(context, chat_id, steam_ids_32, days):
-    """Find and store common games for a list of players."""
+async def _show_progress(progress_message, text):
+    """Edit the progress message, if there is one; a failed edit doesn't stop the check."""
+    if progress_message is None:
+        return
     try:
-        time_filter = datetime.now() - timedelta(days=days)
-        player_matches = {}
-
-        for steam_id_32 in steam_ids_32:
-            matches = await get_player_dota_stats(steam_id_32, limit=100)
-            if matches:
-                player_matches[steam_id_32] = {m["match_id"] for m in matches if datetime.fromtimestamp(m["start_time"]) >= time_filter}
+        await progress_message.edit_text(text)
+    except TelegramError as e:
+        logger.warning(f"Error updating progress message: {e}")
+
+
+async def _send_report(context, chat_id, text, progress_message=None):
+    """Send a report in as few messages as possible, reusing the progress message for the first part."""
+    chunks = split_message(text)
+    if progress_message is not None:
+        try:
+            await progress_message.edit_text(chunks[0])
+            chunks = chunks[1:]
+        except TelegramError as e:
+            logger.warning(f"Error updating progress message: {e}")
+    for chunk in chunks:
+        await context.bot.send_message(chat_id=chat_id, text=chunk)
+
+
+def format_games_digest(found_games, player_names, days):
+    """One message listing the newly found common games, oldest first."""
+    lines = [f"Found and stored {len(found_games)} new common games from the last {days} days."]
+    for match_id, players, match_details in sorted(found_games, key=lambda game: game[2].get("start_time") or 0):
+        names = ", ".join(player_names.get(str(steam_id_32), f"Unknown({steam_id_32})") for steam_id_32 in players)
+        started = match_details.get("start_time")
+        when = datetime.fromtimestamp(started).strftime("%d.%m %H:%M") + " " if started else ""
+        lines.append(f"• {when}{names} — {OPENDOTA_MATCH_URL.format(match_id=match_id)}")
+    return "\n".join(lines)
+
+
+async def _sync_players(steam_ids_32, days, priority=PRIORITY_BACKGROUND):
+    """Sync the matches of several players and return their match IDs by player.
+
+    Players whose sync failed or who played no matches are left out.
+    """
+    player_matches = {}
+    match_id_sets = await _gather_bounded(
+        lambda steam_id_32: sync_player_matches(steam_id_32, days, priority),
+        steam_ids_32,
+    )
+    for steam_id_32, match_ids in zip(steam_ids_32, match_id_sets):
+        if isinstance(match_ids, BaseException):
+            logger.error(f"Error syncing matches of {steam_id_32}: {match_ids}")
+            continue
+        if match_ids:
+            player_matches[steam_id_32] = match_ids
+    return player_matches
+
+
+async def _find_and_store_common_games(
+    context,
+    chat_id,
+    steam_ids_32,
+    days,
+    priority=PRIORITY_BACKGROUND,
+    progress_message=None,
+    player_matches=None,
+    quiet=False,
+):
+    """Find and store common games for a list of players and report them in one digest.
+
+    Match IDs already synced for the players (e.g. for several chats at once) can be passed in.
+    A quiet check only sends a message when it found new games.
+    """
+    try:
+        if player_matches is None:
+            await _show_progress(progress_message, f"Syncing the matches of {len(steam_ids_32)} players...")
+            player_matches = await _sync_players(steam_ids_32, days, priority)
+        else:
+            player_matches = {sid: player_matches[sid] for sid in steam_ids_32 if sid in player_matches}
 
         if not player_matches:
-            await context.bot.send_message(chat_id=chat_id, text=f"No matches found for any of the {len(steam_ids_32)} linked users in the last {days} days.")
+            if quiet:
+                return
+            await _send_report(context, chat_id, f"No matches found for any of the {len(steam_ids_32)} linked users in the last {days} days.", progress_message)
             return
 
         match_players = {}
@@ -188,31 +710,58 @@ async def _find_and_store_common_games(context, chat_id, steam_ids_32, days):
         common_matches = {match_id: players for match_id, players in match_players.items() if len(players) >= 2}
 
         if not common_matches:
-            await context.bot.send_message(chat_id=chat_id, text=f"No common games found between the linked users in the last {days} days.")
+            if quiet:
+                return
+            await _send_report(context, chat_id, f"No common games found between the linked users in the last {days} days.", progress_message)
             return
 
-        stored_matches_count = 0
-        for match_id, players in common_matches.items():
-            if await db.get_match(match_id):
+        existing_match_ids = await db.get_existing_match_ids(common_matches)
+        new_matches = [
+            (match_id, players)
+            for match_id, players in common_matches.items()
+            if str(match_id) not in existing_match_ids
+        ]
+
+        # Details fetched before (e.g. by another chat) come from the local store
+        match_details_by_id = await db.get_match_details_many([match_id for match_id, _ in new_matches])
+        missing_match_ids = [match_id for match_id, _ in new_matches if match_id not in match_details_by_id]
+        if missing_match_ids:
+            await _show_progress(progress_message, f"Fetching the details of {len(missing_match_ids)} new common games...")
+        fetched_match_details = await _gather_bounded(
+            lambda match_id: _fetch_match_details(match_id, priority), missing_match_ids
+        )
+        for match_id, match_details in zip(missing_match_ids, fetched_match_details):
+            if isinstance(match_details, BaseException):
+                logger.error(f"Error getting match details for {match_id}: {match_details}")
                 continue
-
-            match_details = await get_match_details(match_id)
             if match_details:
-                winner = "radiant" if match_details.get("radiant_win") else "dire"
-                radiant_players = [p["account_id"] for p in match_details["players"] if p.get("isRadiant")]
-                dire_players = [p["account_id"] for p in match_details["players"] if not p.get("isRadiant")]
-                await db.store_match(match_id, chat_id, winner, ",".join(map(str, radiant_players)), ",".join(map(str, dire_players)))
-                stored_matches_count += 1
+                match_details_by_id[match_id] = match_details
 
-                player_names = []
-                for steam_id_32 in players:
-                    user_info = await db.get_user_info_by_steam_id_32(steam_id_32)
-                    player_names.append(user_info["first_name"] if user_info else f"Unknown({steam_id_32})")
-                
-                await context.bot.send_message(chat_id=chat_id, text=f"Found a game played by {', '.join(player_names)}.")
+        matches_to_store = []
+        found_games = []
+        for match_id, players in new_matches:
+            match_details = match_details_by_id.get(match_id)
+            if not match_details:
+                continue
+            winner = "radiant" if match_details.get("radiant_win") else "dire"
+            radiant_players = [p["account_id"] for p in match_details["players"] if p.get("isRadiant")]
+            dire_players = [p["account_id"] for p in match_details["players"] if not p.get("isRadiant")]
+            matches_to_store.append(
+                (match_id, winner, ",".join(map(str, radiant_players)), ",".join(map(str, dire_players)))
+            )
+            found_games.append((match_id, players, match_details))
+
+        await db.store_matches(chat_id, matches_to_store)
+        if quiet and not found_games:
+            return
 
-        await context.bot.send_message(chat_id=chat_id, text=f"Found and stored {stored_matches_count} new common games from the last {days} days.")
+        player_names = await db.get_user_names_by_steam_ids_32(
+            {steam_id_32 for _, players, _ in found_games for steam_id_32 in players}
+        )
+        await _send_report(context, chat_id, format_games_digest(found_games, player_names, days), progress_message)
 
     except (DotaApiError, DatabaseError) as e:
         logger.error(f"Error finding and storing common games: {e}")
-        await context.bot.send_message(chat_id=chat_id, text=f"An error occurred while checking for games: {e}")
\ No newline at end of file
+        if quiet:
+            return
+        await _send_report(context, chat_id, f"An error occurred while checking for games: {e}", progress_message)
\ No newline at end of file
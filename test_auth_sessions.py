@@ -0,0 +1,58 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, AsyncMock
+
+from auth_sessions import SteamAuthSessionStore
+
+
+class TestSteamAuthSessionStore(unittest.IsolatedAsyncioTestCase):
+    async def test_pop_returns_session_once(self):
+        """Test that a session can be completed only once"""
+        store = SteamAuthSessionStore(ttl=60, max_size=10)
+        token = await store.create("1", "-100")
+
+        self.assertEqual(await store.pop(token), ("1", "-100"))
+        self.assertIsNone(await store.pop(token))
+
+    async def test_new_session_replaces_pending_one(self):
+        """Test that a user has at most one pending session"""
+        store = SteamAuthSessionStore(ttl=60, max_size=10)
+        first = await store.create("1", "-100")
+        second = await store.create("1", "-200")
+
+        self.assertIsNone(await store.pop(first))
+        self.assertEqual(await store.pop(second), ("1", "-200"))
+
+    async def test_expired_sessions_are_evicted(self):
+        """Test that sessions older than the TTL are dropped"""
+        store = SteamAuthSessionStore(ttl=60, max_size=10)
+        token = await store.create("1", "-100")
+        telegram_id, chat_id, created_at = store.sessions[token]
+        store.sessions[token] = (telegram_id, chat_id, created_at - timedelta(minutes=5))
+
+        self.assertIsNone(await store.pop(token))
+        self.assertEqual(len(store), 0)
+
+    async def test_size_cap_drops_oldest(self):
+        """Test that the store never grows above its size cap"""
+        store = SteamAuthSessionStore(ttl=60, max_size=2)
+        first = await store.create("1", "")
+        await store.create("2", "")
+        await store.create("3", "")
+
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(await store.pop(first))
+
+    @patch("auth_sessions.db.get_steam_auth_sessions", new_callable=AsyncMock)
+    async def test_load_restores_persisted_sessions(self, mock_get_sessions):
+        """Test that persisted sessions survive a restart"""
+        mock_get_sessions.return_value = [("token1", "1", "-100", datetime.now())]
+        store = SteamAuthSessionStore(ttl=60, max_size=10, persist=True)
+
+        with patch("auth_sessions.db.delete_steam_auth_sessions", new_callable=AsyncMock):
+            await store.load()
+            self.assertEqual(await store.pop("token1"), ("1", "-100"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import patch
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patch("circuit_breaker.time.monotonic", lambda: self.now).start()
+        self.addCleanup(patch.stopall)
+        self.breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=60)
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        for _ in range(3):
+            self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_half_open_lets_one_probe_through(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 61
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_probe_opens_again(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 61
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.now += 30
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_latency_percentile(self):
+        self.assertIsNone(self.breaker.latency_percentile(95))
+        for i in range(1, 101):
+            self.breaker.record_success(i / 100)
+
+        self.assertEqual(self.breaker.latency_percentile(95), 0.95)
+        self.assertEqual(self.breaker.latency_percentile(50), 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+
+import db
+import export
+
+
+class TestExport(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "test.db")
+        db.Base.metadata.create_all(create_engine(f"sqlite:///{self.db_path}"))
+
+        conn = sqlite3.connect(self.db_path)
+        for chat_id in ("-100", "-200"):
+            for i in range(5):
+                cursor = conn.execute(
+                    "INSERT INTO polls (chat_id, poll_id, trigger_time) VALUES (?, ?, '2025-09-01 15:30:00')",
+                    (chat_id, f"{chat_id}:{i}"),
+                )
+                conn.execute(
+                    "INSERT INTO votes (poll_id, user_id, option_index) VALUES (?, '1', ?)",
+                    (cursor.lastrowid, i % 2),
+                )
+        conn.execute(
+            "INSERT INTO matches (match_id, chat_id, winner, radiant_players, dire_players) VALUES ('7', '-100', 'dire', '1,2', '3,4')"
+        )
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def collect(self, export_format, tables, batch_size=export.EXPORT_BATCH_SIZE):
+        chunks = []
+        async for chunk in export.iter_export(
+            "-100", export_format, tables, self.db_path, batch_size
+        ):
+            chunks.append(chunk)
+        return chunks
+
+    async def test_csv_is_streamed_in_batches(self):
+        """Test that each batch becomes its own chunk and only the first has a header"""
+        chunks = await self.collect("csv", ["votes"], batch_size=2)
+
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.reader(io.StringIO("".join(chunks))))
+        self.assertEqual(rows[0], ["id", "poll_id", "user_id", "option_index", "response_time"])
+        self.assertEqual([row[3] for row in rows[1:]], ["0", "1", "0", "1", "0"])
+
+    async def test_ndjson_tags_rows_with_table(self):
+        """Test that NDJSON holds only the chat's rows of every requested table"""
+        lines = "".join(await self.collect("ndjson", ["polls", "matches"])).splitlines()
+        records = [json.loads(line) for line in lines]
+
+        self.assertEqual([r["table"] for r in records], ["polls"] * 5 + ["matches"])
+        self.assertTrue(all(r["chat_id"] == "-100" for r in records))
+        self.assertEqual(records[-1]["winner"], "dire")
+
+    async def test_csv_of_empty_table_has_header(self):
+        chunks = []
+        async for chunk in export.iter_export("-300", "csv", ["matches"], self.db_path):
+            chunks.append(chunk)
+        self.assertEqual(
+            "".join(chunks).strip(),
+            "id,match_id,chat_id,winner,radiant_players,dire_players,created_at",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import patch
+
+import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        registry_patch = patch("metrics.REGISTRY", [])
+        registry_patch.start()
+        self.addCleanup(registry_patch.stop)
+
+    def test_counter_renders_labels(self):
+        """Test the text format of a labelled counter"""
+        counter = metrics.Counter("test_total", "Test counter", ["status"])
+        counter.inc(status=200)
+        counter.inc(2, status=200)
+        counter.inc(status="error")
+
+        output = metrics.render()
+
+        self.assertIn("# TYPE test_total counter", output)
+        self.assertIn('test_total{status="200"} 3', output)
+        self.assertIn('test_total{status="error"} 1', output)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that histogram buckets, sum and count are exported"""
+        histogram = metrics.Histogram("test_seconds", "Test histogram", buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.1)
+        histogram.observe(5)
+
+        output = metrics.render()
+
+        self.assertIn('test_seconds_bucket{le="0.1"} 2', output)
+        self.assertIn('test_seconds_bucket{le="1.0"} 2', output)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3', output)
+        self.assertIn("test_seconds_count 3", output)
+        self.assertIn("test_seconds_sum 5.15", output)
+
+    def test_gauge_reads_function(self):
+        """Test that a gauge can be computed on every scrape"""
+        gauge = metrics.Gauge("test_active", "Test gauge")
+        gauge.set_function(lambda: 7)
+
+        self.assertIn("test_active 7", metrics.render())
+
+    def test_wrong_labels_are_rejected(self):
+        """Test that label names must match the declaration"""
+        counter = metrics.Counter("test_total", "Test counter", ["status"])
+
+        with self.assertRaises(ValueError):
+            counter.inc(code=200)
+
+
+if __name__ == "__main__":
+    unittest.main()
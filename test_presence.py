@@ -0,0 +1,146 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import presence
+from exceptions import SteamApiError
+
+STEAM_ID_OFFSET = 76561197960265728
+
+
+class PresenceTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tracker = presence.PresenceTracker()
+        patch("presence.presence_tracker", self.tracker).start()
+        patch(
+            "presence.db.get_linked_steam_ids",
+            AsyncMock(return_value=[str(STEAM_ID_OFFSET + i) for i in (1, 2, 3)]),
+        ).start()
+        self.summaries = AsyncMock(
+            return_value={
+                str(STEAM_ID_OFFSET + 1): {"personaname": "Alice", "personastate": 1, "gameid": "570"},
+                str(STEAM_ID_OFFSET + 2): {"personaname": "Bob", "personastate": 1},
+                str(STEAM_ID_OFFSET + 3): {"personaname": "Carol", "personastate": 0},
+            }
+        )
+        patch("presence.steam.get_player_summaries", self.summaries).start()
+        self.addCleanup(patch.stopall)
+
+
+class TestPresenceTracker(PresenceTestCase):
+    async def test_refresh_builds_presence_map(self):
+        await self.tracker.refresh()
+
+        self.assertTrue(presence.is_playing_dota(self.tracker.get("1")))
+        self.assertTrue(self.tracker.get("2")["online"])
+        self.assertFalse(self.tracker.get("3")["online"])
+        self.summaries.assert_awaited_once()
+
+    async def test_chat_text_is_answered_from_memory(self):
+        self.assertIsNone(await presence.get_chat_presence_text("-100"))
+
+        await self.tracker.refresh()
+        self.tracker.presence["2"]["seen_at"] -= timedelta(minutes=3)
+        with patch("presence.db.get_chat_steam_ids_32", AsyncMock(return_value=["1", "2", "3", "4"])), patch(
+            "presence.db.get_user_names_by_steam_ids_32", AsyncMock(return_value={"4": "Dave"})
+        ):
+            text = await presence.get_chat_presence_text("-100")
+
+        self.assertEqual(
+            text,
+            "🎮 В Dota 2:\nAlice\nОнлайн:\nBob\nОффлайн:\nCarol, Dave\n🕒 Данные обновлены 3 мин. назад",
+        )
+        self.summaries.assert_awaited_once()
+
+    async def test_failed_batch_keeps_previous_presence(self):
+        await self.tracker.refresh()
+        self.summaries.return_value = {
+            str(STEAM_ID_OFFSET + 2): {"personaname": "Bob", "personastate": 1},
+        }
+
+        await self.tracker.refresh()
+
+        self.assertEqual(self.tracker.get("1")["name"], "Alice")
+        self.assertLess(self.tracker.get("1")["seen_at"], self.tracker.refreshed_at)
+
+    async def test_all_batches_failing_leaves_tracker_not_ready(self):
+        self.summaries.return_value = {}
+
+        self.assertEqual(await self.tracker.refresh(), [])
+
+        self.assertFalse(self.tracker.ready)
+        self.assertIsNone(await presence.get_chat_presence_text("-100"))
+
+        self.summaries.return_value = {str(STEAM_ID_OFFSET + 1): {"personaname": "Alice", "personastate": 1}}
+        await self.tracker.refresh()
+        refreshed_at = self.tracker.refreshed_at
+        self.summaries.return_value = {}
+        await self.tracker.refresh()
+        self.assertEqual(self.tracker.refreshed_at, refreshed_at)
+
+    async def test_refresh_job_logs_api_errors(self):
+        self.summaries.side_effect = SteamApiError("down")
+
+        await presence.refresh_presence(None)
+
+        self.assertFalse(self.tracker.ready)
+
+
+class TestPresenceEvents(PresenceTestCase):
+    async def test_transitions_are_diffed_after_the_first_refresh(self):
+        self.assertEqual(await self.tracker.refresh(), [])
+
+        self.summaries.return_value = {
+            str(STEAM_ID_OFFSET + 1): {"personaname": "Alice", "personastate": 1},
+            str(STEAM_ID_OFFSET + 2): {"personaname": "Bob", "personastate": 1, "gameid": "570"},
+            str(STEAM_ID_OFFSET + 3): {"personaname": "Carol", "personastate": 0},
+        }
+        events = await self.tracker.refresh()
+
+        self.assertEqual(
+            [(event["type"], event["name"]) for event in events],
+            [(presence.STOPPED_PLAYING, "Alice"), (presence.STARTED_PLAYING, "Bob")],
+        )
+        self.assertEqual(self.tracker.recently_stopped(["1", "2"]), ["1"])
+
+    async def test_started_playing_notifies_opted_in_chats(self):
+        context = MagicMock()
+        context.bot.send_message = AsyncMock()
+        events = [
+            {"type": presence.STARTED_PLAYING, "steam_id_32": "1", "name": "Alice"},
+            {"type": presence.STARTED_PLAYING, "steam_id_32": "2", "name": "Bob"},
+        ]
+
+        with patch("presence.db.get_dota_start_notification_chats", AsyncMock(return_value=["-100"])), patch(
+            "presence.db.get_chats_by_steam_ids_32",
+            AsyncMock(return_value={"-100": ["1", "2"], "-200": ["1"]}),
+        ):
+            await presence.handle_presence_events(context, events)
+
+        context.bot.send_message.assert_awaited_once_with(chat_id="-100", text="🎮 Зашли в Dota 2: Alice, Bob")
+        context.job_queue.run_once.assert_not_called()
+
+    async def test_stopped_playing_checks_games_of_just_those_players(self):
+        context = MagicMock()
+        events = [{"type": presence.STOPPED_PLAYING, "steam_id_32": "1", "name": "Alice"}]
+        await presence.handle_presence_events(context, events)
+        context.job_queue.run_once.assert_called_once()
+        self.assertEqual(context.job_queue.run_once.call_args.kwargs["data"], ["1"])
+
+        self.tracker.stopped_at = {"1": datetime.now(), "2": datetime.now() - timedelta(minutes=5)}
+        context.job.data = ["1"]
+        with patch("presence.db.get_chats_by_steam_ids_32", AsyncMock(return_value={"-100": ["1"], "-200": ["1"]})), patch(
+            "presence.db.get_chat_steam_ids_32", AsyncMock(side_effect=[["1", "2", "3"], ["1", "3"]])
+        ), patch("presence.steam._sync_players", AsyncMock(return_value={})) as sync, patch(
+            "presence.steam._find_and_store_common_games", AsyncMock()
+        ) as find:
+            await presence.check_games_after_stop(context)
+
+        sync.assert_awaited_once_with(["1", "2"], 1)
+        find.assert_awaited_once()
+        self.assertEqual(find.await_args.args[1:3], ("-100", ["1", "2"]))
+        self.assertTrue(find.await_args.kwargs["quiet"])
+
+
+if __name__ == "__main__":
+    unittest.main()
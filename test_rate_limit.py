@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+
+from rate_limit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PriorityTokenBucket
+
+
+class TestPriorityTokenBucket(unittest.IsolatedAsyncioTestCase):
+    async def test_burst_then_rate(self):
+        """Test that the burst is served at once and later tokens at the refill rate"""
+        bucket = PriorityTokenBucket(rate=50, capacity=2)
+        loop = asyncio.get_running_loop()
+
+        started = loop.time()
+        for _ in range(4):
+            await bucket.acquire()
+        elapsed = loop.time() - started
+
+        self.assertGreaterEqual(elapsed, 0.035)
+        self.assertLess(elapsed, 0.5)
+
+    async def test_interactive_callers_go_first(self):
+        """Test that waiting interactive callers overtake queued background ones"""
+        bucket = PriorityTokenBucket(rate=100, capacity=1)
+        await bucket.acquire()
+        order = []
+
+        async def call(name, priority):
+            await bucket.acquire(priority)
+            order.append(name)
+
+        tasks = [asyncio.create_task(call(f"background {i}", PRIORITY_BACKGROUND)) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call("interactive", PRIORITY_INTERACTIVE)))
+        await asyncio.gather(*tasks)
+
+        self.assertEqual(order[0], "interactive")
+        self.assertEqual(order[1:], ["background 0", "background 1", "background 2"])
+
+    async def test_block_for_pauses_all_callers(self):
+        bucket = PriorityTokenBucket(rate=1000, capacity=5)
+        bucket.block_for(0.1)
+
+        waited = await bucket.acquire(PRIORITY_INTERACTIVE)
+
+        self.assertGreaterEqual(waited, 0.09)
+
+    async def test_no_burst_after_block(self):
+        """Test that tokens refill at the normal rate once a block ends"""
+        bucket = PriorityTokenBucket(rate=20, capacity=5)
+        bucket.block_for(0.1)
+        loop = asyncio.get_running_loop()
+
+        started = loop.time()
+        for _ in range(3):
+            await bucket.acquire()
+        elapsed = loop.time() - started
+
+        self.assertGreaterEqual(elapsed, 0.19)
+
+    def test_rate_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            PriorityTokenBucket(rate=0, capacity=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,141 +1,619 @@
 import asyncio
+import os
+import tempfile
+import time
 import unittest
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
 from unittest.mock import patch, MagicMock, AsyncMock
 
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import db
+import presence
 import steam
+import utils
+from exceptions import DotaApiError, OpenDotaUnavailableError, SteamApiError
+from mock_steam_api import STEAM_ID_64_OFFSET, MockSteamApi
 
 
-class TestSteam(unittest.TestCase):
-    @patch("steam.aiohttp.ClientSession")
-    async def test_send_steam_request_success(self, mock_session):
-        """Test successful Steam API request"""
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json.return_value = {"response": {"players": [{"steamid": "123"}]}}
+class TestSteamAgainstMock(unittest.IsolatedAsyncioTestCase):
+    """The Dota pipeline end to end against the local OpenDota/Steam mock"""
 
-        mock_session.return_value.__aenter__.return_value.get.return_value = mock_response
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        db.Base.metadata.create_all(engine)
+        patch("db.SessionLocal", sessionmaker(bind=engine)).start()
+        self.addCleanup(self.tmp_dir.cleanup)
 
-        result = await steam._send_steam_request("123", "test_api_key", "test action")
+        self.mock = MockSteamApi(players=10, days=2, retry_after=0.01, seed=1)
+        await self.mock.start()
+        patch("steam.OPENDOTA_API_URL", self.mock.opendota_url).start()
+        patch("steam.STEAM_API_URL", self.mock.steam_url).start()
+        patch("steam.STEAM_API_KEY", "key").start()
+        patch("steam.opendota_limiter", steam.PriorityTokenBucket(rate=1000, capacity=100)).start()
+        patch("steam.steam_api_limiter", steam.PriorityTokenBucket(rate=1000, capacity=100)).start()
+        patch("steam.opendota_breaker", steam.CircuitBreaker("OpenDota", failure_threshold=5, reset_timeout=60)).start()
+        self.addCleanup(patch.stopall)
 
-        self.assertEqual(result, {"response": {"players": [{"steamid": "123"}]}})
+        self.context = MagicMock()
+        self.context.bot.send_message = AsyncMock()
 
-    @patch("steam.aiohttp.ClientSession")
-    async def test_send_steam_request_rate_limit(self, mock_session):
-        """Test Steam API rate limit handling"""
-        mock_response_429 = AsyncMock()
-        mock_response_429.status = 429
+    async def asyncTearDown(self):
+        await steam.close_opendota_session()
+        await self.mock.stop()
 
-        mock_response_200 = AsyncMock()
-        mock_response_200.status = 200
-        mock_response_200.json.return_value = {"response": {"players": [{"steamid": "123"}]}}
+    def link_accounts(self, chat_id, account_ids):
+        session = db.SessionLocal()
+        for account_id in account_ids:
+            steam_id_64 = str(STEAM_ID_64_OFFSET + account_id)
+            session.add(db.User(telegram_id=str(account_id), steam_id=steam_id_64, first_name=f"user{account_id}"))
+            session.add(db.UserSteamChat(telegram_id=str(account_id), steam_id=steam_id_64, chat_id=chat_id))
+        session.commit()
+        session.close()
 
-        # Simulate one rate limit error, then a success
-        mock_session.return_value.__aenter__.return_value.get.side_effect = [
-            mock_response_429,
-            mock_response_200,
-        ]
+    async def test_verify_steam_id(self):
+        profile = await steam.verify_steam_id(str(STEAM_ID_64_OFFSET + 3))
+
+        self.assertEqual(profile["steam_id"], str(STEAM_ID_64_OFFSET + 3))
+        self.assertEqual(profile["username"], "player3")
+        self.assertIsNone(await steam.verify_steam_id(str(STEAM_ID_64_OFFSET + 99)))
+
+    async def test_player_summaries_are_retried_after_a_429(self):
+        self.mock.rate_limit_rate = 0.5  # with seed 1 only the first request is rate limited
+        steam_ids = [str(STEAM_ID_64_OFFSET + i) for i in (1, 2)]
+        self.mock.set_presence(2, in_game=True)
+
+        summaries = await steam.get_player_summaries(steam_ids)
+
+        self.assertEqual(summaries[steam_ids[1]]["gameid"], "570")
+        self.assertNotIn("gameid", summaries[steam_ids[0]])
+        self.assertEqual(sum(self.mock.requests.values()), 2)
+
+    async def test_get_steam_player_statuses(self):
+        self.link_accounts("-100", [1, 2])
+        self.mock.set_presence(2, online=False)
+
+        result = await steam.get_steam_player_statuses("-100")
+
+        self.assertEqual(result, "Онлайн:\nplayer1\nОффлайн:\nplayer2")
+
+    async def test_check_and_store_dota_games_finds_party_matches(self):
+        self.link_accounts("-100", [1, 2, 3])
+        await db.store_game_participants("-100", ["1", "2", "3"])
+
+        await steam.check_and_store_dota_games(self.context)
+
+        recent = [match_id for match_id, match in self.mock.matches.items()
+                  if 1 in match["radiant"] and match["start_time"] > time.time() - 24 * 3600]
+        self.assertEqual(len(recent), 3)
+        self.assertEqual(len(await db.get_existing_match_ids(recent)), 3)
+        self.assertEqual(await db.get_game_participants(), [])
+        self.context.bot.send_message.assert_awaited_once()
+        self.assertTrue(
+            self.context.bot.send_message.await_args.kwargs["text"].startswith("Found and stored 3 new common games")
+        )
+
+        # A second check finds nothing new and fetches no match twice
+        matches_served = self.mock.requests["/opendota/api/matches/{match_id}"]
+        await db.store_game_participants("-100", ["1", "2"])
+        await steam.check_and_store_dota_games(self.context)
+        self.assertEqual(self.mock.requests["/opendota/api/matches/{match_id}"], matches_served)
+
+    async def test_game_played_after_a_check_is_found_by_the_next_one(self):
+        self.link_accounts("-100", [1, 2])
+        await db.store_game_participants("-100", ["1", "2"])
+        await steam.check_and_store_dota_games(self.context)
+
+        match_id = self.mock.add_match([1, 2])
+        await db.store_game_participants("-100", ["1", "2"])
+        await steam.check_and_store_dota_games(self.context)
+
+        self.assertEqual(await db.get_existing_match_ids([match_id]), {str(match_id)})
+        self.assertTrue(
+            self.context.bot.send_message.await_args.kwargs["text"].startswith("Found and stored 1 new common games")
+        )
+
+    async def test_presence_refresh_sees_who_is_in_dota(self):
+        self.link_accounts("-100", [1, 2])
+        self.mock.set_presence(1, in_game=True)
+        tracker = presence.PresenceTracker()
+
+        await tracker.refresh()
+
+        self.assertTrue(presence.is_playing_dota(tracker.get("1")))
+        self.assertFalse(presence.is_playing_dota(tracker.get("2")))
+        self.assertEqual(self.mock.requests["/steam/ISteamUser/GetPlayerSummaries/v2/"], 1)
+
+
+class TestOpenDotaClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.peers = set()
+        self.rate_limited = 0
+
+        self.requests = 0
+
+        async def player(request):
+            self.peers.add(request.transport.get_extra_info("peername"))
+            self.requests += 1
+            if request.match_info["account_id"] == "0":
+                await asyncio.sleep(1)
+            if request.match_info["account_id"] == "500":
+                return web.Response(status=500)
+            if request.match_info["account_id"] == "slow" and self.requests == 1:
+                await asyncio.sleep(2)
+            if request.match_info["account_id"] == "429" and self.rate_limited < 2:
+                self.rate_limited += 1
+                return web.Response(status=429, headers={"Retry-After": "0.05"})
+            return web.json_response({"profile": {"personaname": "p"}})
+
+        app = web.Application()
+        app.router.add_get("/api/players/{account_id}", player)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        patch("steam.OPENDOTA_API_URL", str(self.server.make_url("/api"))).start()
+        patch("steam.opendota_limiter", steam.PriorityTokenBucket(rate=1000, capacity=10)).start()
+        self.breaker = steam.CircuitBreaker("OpenDota", failure_threshold=3, reset_timeout=60)
+        patch("steam.opendota_breaker", self.breaker).start()
+        self.addCleanup(patch.stopall)
 
-        with patch("asyncio.sleep", new_callable=AsyncMock):
-            result = await steam._send_steam_request(
-                "123", "test_api_key", "test action"
+    async def asyncTearDown(self):
+        await steam.close_opendota_session()
+        await self.server.close()
+
+    async def test_open_breaker_fails_fast(self):
+        for _ in range(3):
+            with self.assertRaises(DotaApiError):
+                await steam._send_opendota_request("players/500")
+        self.assertEqual(steam.get_opendota_health()["state"], "open")
+
+        with self.assertRaises(OpenDotaUnavailableError):
+            await steam._send_opendota_request("players/1")
+        self.assertEqual(self.requests, 3)
+
+    async def test_probe_cancelled_while_queued_is_released(self):
+        breaker = steam.CircuitBreaker("OpenDota", failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        limiter = steam.PriorityTokenBucket(rate=1000, capacity=10)
+        limiter.block_for(60)
+
+        with patch("steam.opendota_breaker", breaker), patch("steam.opendota_limiter", limiter):
+            probe = asyncio.ensure_future(steam._send_opendota_request("players/1"))
+            await asyncio.sleep(0.01)
+            self.assertTrue(breaker.probe_in_flight)
+            probe.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await probe
+
+        self.assertFalse(breaker.probe_in_flight)
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(self.requests, 0)
+
+    async def test_slow_interactive_request_is_hedged(self):
+        for _ in range(20):
+            self.breaker.record_success(0.01)
+
+        with patch("steam.OPENDOTA_HEDGE_MIN_DELAY", 0.05):
+            started = asyncio.get_running_loop().time()
+            data = await steam._send_opendota_request("players/slow", steam.PRIORITY_INTERACTIVE)
+            elapsed = asyncio.get_running_loop().time() - started
+
+        self.assertEqual(data["profile"]["personaname"], "p")
+        self.assertEqual(self.requests, 2)
+        self.assertLess(elapsed, 1)
+
+    async def test_caller_cancelled_during_hedge_delay_cancels_the_fetch(self):
+        for _ in range(20):
+            self.breaker.record_success(0.01)
+        fetch_cancelled = asyncio.Event()
+
+        async def slow_fetch(url, endpoint):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                fetch_cancelled.set()
+                raise
+
+        with patch("steam._fetch_opendota", slow_fetch), patch("steam.OPENDOTA_HEDGE_MIN_DELAY", 1):
+            caller = asyncio.ensure_future(
+                steam._hedged_fetch_opendota("url", "players/1", steam.PRIORITY_INTERACTIVE)
             )
+            await asyncio.sleep(0.05)
+            caller.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await caller
 
-        self.assertEqual(result, {"response": {"players": [{"steamid": "123"}]}})
-
-    @patch("steam._send_steam_request")
-    async def test_verify_steam_id_success(self, mock_send_request):
-        """Test successful Steam ID verification"""
-        mock_send_request.return_value = {
-            "response": {
-                "players": [
-                    {
-                        "steamid": "123",
-                        "personaname": "test_user",
-                        "profileurl": "test_url",
-                        "avatar": "test_avatar",
-                        "personastate": 1,
-                        "realname": "test_real_name",
-                        "communityvisibilitystate": 3,
-                    }
-                ]
-            }
-        }
+        self.assertTrue(fetch_cancelled.is_set())
 
-        result = await steam.verify_steam_id("123", "test_api_key")
+    async def test_requests_reuse_pooled_connection(self):
+        """Test that sequential requests share one keep-alive connection"""
+        for account_id in range(1, 6):
+            data = await steam._send_opendota_request(f"players/{account_id}")
+            self.assertEqual(data["profile"]["personaname"], "p")
 
-        self.assertEqual(result["steam_id"], "123")
-        self.assertEqual(result["username"], "test_user")
+        self.assertEqual(len(self.peers), 1)
 
-    @patch("steam._send_steam_request")
-    async def test_check_verification_code_success(self, mock_send_request):
-        """Test successful verification code check"""
-        mock_send_request.return_value = {
-            "response": {"players": [{"personaname": "test_user_12345"}]}
-        }
+    async def test_rate_limited_request_is_retried_after_retry_after(self):
+        """Test that a 429 pauses the limiter for Retry-After and the request is retried"""
+        started = asyncio.get_running_loop().time()
+        data = await steam._send_opendota_request("players/429")
+        elapsed = asyncio.get_running_loop().time() - started
 
-        result = await steam.check_verification_code("123", "12345", "test_api_key")
-
-        self.assertTrue(result)
-
-    @patch("steam.db.get_steam_users")
-    @patch("steam.db.is_steam_id_linked_to_chat")
-    @patch("steam.poll_state.is_active")
-    @patch("steam.aiohttp.ClientSession")
-    async def test_check_steam_status(
-        self, mock_session, mock_is_active, mock_is_linked, mock_get_users
-    ):
-        """Test the check_steam_status function"""
-        mock_get_users.return_value = ([
-            ("user1", "steam1", "name1", "chat1"),
-            ("user2", "steam2", "name2", "chat1"),
-        ], {})
-        mock_is_linked.return_value = True
-        mock_is_active.return_value = False
-
-        mock_response1 = AsyncMock()
-        mock_response1.status = 200
-        mock_response1.json.return_value = {
-            "response": {"players": [{"gameid": "570", "gameextrainfo": "Dota 2"}]}
-        }
+        self.assertEqual(data["profile"]["personaname"], "p")
+        self.assertEqual(self.rate_limited, 2)
+        self.assertGreaterEqual(elapsed, 0.1)
+
+    async def test_exhausted_rate_limit_retries_do_not_count_as_failures(self):
+        with patch("steam.OPENDOTA_MAX_RETRIES", 1):
+            with self.assertRaises(DotaApiError):
+                await steam._send_opendota_request("players/429")
+
+        self.assertEqual(self.breaker.consecutive_failures, 0)
+        self.assertTrue(self.breaker.allow_request())
+
+    async def test_timeout_raises_dota_api_error(self):
+        timeout = steam.aiohttp.ClientTimeout(total=0.1)
+        with patch("steam.OPENDOTA_TIMEOUT", timeout):
+            await steam.close_opendota_session()
+            with self.assertRaises(DotaApiError):
+                await steam._send_opendota_request("players/0")
+
+
+class TestSteamPlayerSummaries(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.batches = []
+        self.rate_limited = 0
+
+        async def summaries(request):
+            if request.query["key"] != "key":
+                return web.Response(status=403)
+            if self.rate_limited < 1:
+                self.rate_limited += 1
+                return web.Response(status=429, headers={"Retry-After": "0.01"})
+            steam_ids = request.query["steamids"].split(",")
+            self.batches.append(steam_ids)
+            players = [{"steamid": sid, "personastate": 1, "personaname": f"p{sid}"} for sid in steam_ids]
+            return web.json_response({"response": {"players": players}})
+
+        app = web.Application()
+        app.router.add_get("/ISteamUser/GetPlayerSummaries/v2/", summaries)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        patch("steam.STEAM_API_URL", str(self.server.make_url("")).rstrip("/")).start()
+        patch("steam.STEAM_API_KEY", "key").start()
+        patch("steam.steam_api_limiter", steam.PriorityTokenBucket(rate=1000, capacity=10)).start()
+        self.addCleanup(patch.stopall)
+
+    async def asyncTearDown(self):
+        await steam.close_opendota_session()
+        await self.server.close()
+
+    async def test_unique_ids_are_batched_by_100(self):
+        steam_ids = [str(76561197960265728 + i) for i in range(300)]
+
+        summaries = await steam.get_player_summaries(steam_ids + steam_ids[:50])
+
+        self.assertEqual(len(summaries), 300)
+        self.assertEqual(sorted(len(batch) for batch in self.batches), [100, 100, 100])
+        self.assertEqual(self.rate_limited, 1)
+
+    async def test_missing_api_key_raises(self):
+        with patch("steam.STEAM_API_KEY", ""):
+            with self.assertRaises(SteamApiError):
+                await steam._send_steam_api_request("ISteamUser/GetPlayerSummaries/v2/", {})
 
-        mock_response2 = AsyncMock()
-        mock_response2.status = 200
-        mock_response2.json.return_value = {"response": {"players": [{}]}}
 
-        mock_session.return_value.__aenter__.return_value.get.side_effect = [
-            mock_response1,
-            mock_response2,
+class TestOpenDotaFanOut(unittest.IsolatedAsyncioTestCase):
+    async def test_player_statuses_are_fetched_concurrently(self):
+        """Test that a 20-player chat takes about one request, and failures stay partial"""
+        in_flight = 0
+        peak = 0
+
+        async def fake_request(endpoint, priority=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+            if endpoint == "players/13":
+                raise DotaApiError("boom")
+            return {"profile": {"personaname": endpoint, "last_login": None}}
+
+        steam_ids = [str(i) for i in range(20)]
+        with patch("steam.db.get_chat_steam_ids_32", AsyncMock(return_value=steam_ids)), patch(
+            "steam.db.get_user_info_by_steam_id_32", AsyncMock(return_value={"first_name": "Fallback"})
+        ), patch("steam._send_opendota_request", fake_request), patch("steam.OPENDOTA_CONCURRENCY", 20), patch(
+            "steam.OPENDOTA_CACHE_TTLS", {}
+        ):
+            started = asyncio.get_running_loop().time()
+            result = await steam.get_steam_player_statuses("-100")
+            elapsed = asyncio.get_running_loop().time() - started
+
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(peak, 20)
+        self.assertIn("players/19", result)
+        self.assertIn("Fallback", result)
+
+    async def test_concurrency_is_bounded(self):
+        in_flight = 0
+        peak = 0
+
+        async def work(item):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return item * 2
+
+        results = await steam._gather_bounded(work, range(10), limit=3)
+
+        self.assertEqual(results, [i * 2 for i in range(10)])
+        self.assertEqual(peak, 3)
+
+
+class TestOpenDotaCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        db.Base.metadata.create_all(engine)
+        patch("db.SessionLocal", sessionmaker(bind=engine)).start()
+        self.addCleanup(patch.stopall)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.requests = []
+
+        async def fake_request(endpoint, priority=None):
+            self.requests.append(endpoint)
+            return {"profile": {"personaname": endpoint}}
+
+        patch("steam._send_opendota_request", fake_request).start()
+
+    async def test_repeated_lookups_within_ttl_make_no_requests(self):
+        for _ in range(3):
+            data = await steam._get_opendota("players/1")
+            self.assertEqual(data["profile"]["personaname"], "players/1")
+
+        self.assertEqual(self.requests, ["players/1"])
+
+    async def test_expired_entries_are_refetched(self):
+        with patch.dict("steam.OPENDOTA_CACHE_TTLS", {"players/:id": 0.01}):
+            await steam._get_opendota("players/1")
+            await asyncio.sleep(0.05)
+            await steam._get_opendota("players/1")
+
+        self.assertEqual(self.requests, ["players/1", "players/1"])
+        self.assertEqual(await db.purge_opendota_cache(), 0)
+
+    async def test_uncached_endpoints_always_hit_the_api(self):
+        for _ in range(2):
+            await steam._get_opendota("matches/5")
+            await steam._get_opendota("players/1/matches?date=1")
+
+        self.assertEqual(self.requests, ["matches/5", "players/1/matches?date=1"] * 2)
+
+    async def test_stale_response_is_served_when_the_api_fails(self):
+        with patch.dict("steam.OPENDOTA_CACHE_TTLS", {"players/:id": 0.01}):
+            await steam._get_opendota("players/1")
+            await asyncio.sleep(0.05)
+            with patch("steam._send_opendota_request", AsyncMock(side_effect=OpenDotaUnavailableError("open"))):
+                data = await steam._get_opendota("players/1")
+
+            self.assertEqual(data["profile"]["personaname"], "players/1")
+            with patch("steam._send_opendota_request", AsyncMock(side_effect=OpenDotaUnavailableError("open"))):
+                with self.assertRaises(OpenDotaUnavailableError):
+                    await steam._get_opendota("players/2")
+
+    async def test_database_errors_fall_back_to_the_api(self):
+        with patch("steam.db.get_opendota_cache", AsyncMock(side_effect=steam.DatabaseError("locked"))):
+            data = await steam._get_opendota("players/2")
+
+        self.assertEqual(data["profile"]["personaname"], "players/2")
+
+
+class TestMatchSync(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        db.Base.metadata.create_all(engine)
+        patch("db.SessionLocal", sessionmaker(bind=engine)).start()
+        patch("steam.MATCH_SYNC_PAGE_SIZE", 10).start()
+        self.addCleanup(patch.stopall)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        # One match every 6 hours over the last 60 days, newest first
+        now = int(time.time())
+        self.history = [
+            {"match_id": 1000 - i, "start_time": now - i * 6 * 3600 - 60, "hero_id": 1} for i in range(240)
         ]
+        self.returned = 0
+        patch("steam._send_opendota_request", self.fake_opendota).start()
 
-        mock_context = MagicMock()
-        mock_context.bot.send_message = AsyncMock()
+    async def fake_opendota(self, endpoint, priority=None):
+        query = parse_qs(urlsplit(endpoint).query)
+        since = time.time() - int(query["date"][0]) * 24 * 3600
+        less_than = int(query.get("less_than_match_id", [10**9])[0])
+        page = [
+            {"match_id": m["match_id"], "start_time": m["start_time"]}
+            for m in self.history
+            if m["start_time"] >= since and m["match_id"] < less_than
+        ][: int(query["limit"][0])]
+        self.returned += len(page)
+        return page
 
-        with patch("asyncio.sleep", new_callable=AsyncMock):
-            await steam.check_steam_status(mock_context, "test_api_key", AsyncMock())
+    async def test_first_sync_pages_through_the_window(self):
+        match_ids = await steam.sync_player_matches("1", days=7)
 
-        mock_context.bot.send_message.assert_called_once()
+        self.assertEqual(len(match_ids), 28)
+        self.assertEqual(self.returned, 28)
 
-    @patch("steam.db.safe_db_connect")
-    @patch("steam.aiohttp.ClientSession")
-    async def test_get_steam_player_statuses(self, mock_session, mock_db_connect):
-        """Test the get_steam_player_statuses function"""
-        mock_cursor = MagicMock()
-        mock_cursor.fetchall.return_value = [("user1", "steam1", "name1")]
-        mock_db_connect.return_value.__enter__.return_value.cursor.return_value = (
-            mock_cursor
-        )
+    async def test_steady_state_sync_only_fetches_new_matches(self):
+        await steam.sync_player_matches("1", days=7)
+        self.returned = 0
 
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json.return_value = {
-            "response": {"players": [{"gameid": "570", "gameextrainfo": "Dota 2"}]}
+        # OpenDota can only filter by days, so at most the last day is transferred again
+        match_ids = await steam.sync_player_matches("1", days=7)
+        self.assertEqual(len(match_ids), 28)
+        self.assertLessEqual(self.returned, 4)
+
+        self.returned = 0
+        self.history.insert(0, {"match_id": 1001, "start_time": int(time.time()), "hero_id": 1})
+        match_ids = await steam.sync_player_matches("1", days=1)
+        self.assertIn(1001, match_ids)
+        self.assertLessEqual(self.returned, 5)
+
+    async def test_longer_window_backfills_older_history(self):
+        await steam.sync_player_matches("1", days=1)
+        self.returned = 0
+        match_ids = await steam.sync_player_matches("1", days=30)
+
+        # The 4 synced matches are read again by the cursor sync, not by the backfill
+        self.assertEqual(len(match_ids), 120)
+        self.assertEqual(self.returned, 120)
+        cursor = await db.get_player_sync_cursor("1")
+        self.assertEqual(cursor["last_match_id"], 1000)
+        self.assertLessEqual(cursor["synced_since"], time.time() - 30 * 24 * 3600 + 5)
+
+
+class TestMatchDetailsStore(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        db.Base.metadata.create_all(engine)
+        patch("db.SessionLocal", sessionmaker(bind=engine)).start()
+        self.addCleanup(patch.stopall)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.payload = {
+            "match_id": 42,
+            "radiant_win": True,
+            "start_time": 1700000000,
+            "duration": 2400,
+            "picks_bans": [{"hero_id": i} for i in range(24)],
+            "players": [
+                {"account_id": 10 + i, "isRadiant": i < 5, "hero_id": i, "kills": i, "gold_t": list(range(60))}
+                for i in range(10)
+            ],
         }
-        mock_session.return_value.__aenter__.return_value.get.return_value = mock_response
+        self.fetch = AsyncMock(return_value=self.payload)
+        patch("steam._send_opendota_request", self.fetch).start()
+
+    async def test_fetched_match_is_stored_projected(self):
+        fetched = await steam._fetch_match_details(42)
+        stored = (await db.get_match_details_many([42]))[42]
+
+        self.fetch.assert_awaited_once()
+        self.assertEqual(fetched, stored)
+        self.assertTrue(stored["radiant_win"])
+        self.assertEqual(stored["players"][0], {
+            "account_id": 10, "isRadiant": True, "hero_id": 0, "kills": 0, "deaths": None, "assists": None
+        })
+        self.assertNotIn("gold_t", stored["players"][0])
+
+    async def test_raw_payload_is_not_kept_without_zstandard(self):
+        with patch("steam.zstandard", None):
+            await steam._fetch_match_details(42)
+
+        self.assertIsNone(await db.get_raw_match_details(42))
+        self.assertIsNone(await steam.get_raw_match_details(42))
+
+    @unittest.skipIf(steam.zstandard is None, "zstandard is not installed")
+    async def test_raw_payload_round_trips(self):
+        await steam._fetch_match_details(42)
+
+        self.assertEqual(await steam.get_raw_match_details(42), self.payload)
+
 
-        with patch("asyncio.sleep", new_callable=AsyncMock):
-            result = await steam.get_steam_player_statuses("chat1", "test_api_key")
+class TestCommonGames(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        db.Base.metadata.create_all(self.engine)
+        patch("db.SessionLocal", sessionmaker(bind=self.engine)).start()
+        patch("steam.sync_player_matches", AsyncMock(return_value=set(range(1, 101)))).start()
+        self.addCleanup(patch.stopall)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.context = MagicMock()
+        self.context.bot.send_message = AsyncMock()
+
+    def count_queries(self):
+        queries = []
+        listener = lambda *args: queries.append(args[2])
+        event.listen(self.engine, "before_cursor_execute", listener)
+        self.addCleanup(event.remove, self.engine, "before_cursor_execute", listener)
+        return queries
+
+    async def test_candidate_matches_take_a_constant_number_of_queries(self):
+        session = db.SessionLocal()
+        session.add(db.User(telegram_id="1", steam_id=str(76561197960265728 + 10), first_name="Alice"))
+        session.commit()
+        session.close()
+        for match_id in range(1, 101):
+            await db.store_match_details({
+                "match_id": match_id, "radiant_win": match_id % 2 == 0, "start_time": 0, "duration": 0,
+                "players": [{"account_id": 10, "isRadiant": True}, {"account_id": 20, "isRadiant": False}],
+            })
+        await db.store_matches("-100", [(1, "radiant", "10", "20")])
+
+        queries = self.count_queries()
+        with patch("steam._send_opendota_request", AsyncMock()) as fetch:
+            await steam._find_and_store_common_games(self.context, "-100", ["10", "20"], 7)
+
+        fetch.assert_not_awaited()
+        self.assertLessEqual(len(queries), 5)
+        self.assertEqual(len(await db.get_existing_match_ids(range(1, 101))), 100)
+        chunks = [call.kwargs["text"] for call in self.context.bot.send_message.await_args_list]
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(all(len(chunk) <= utils.TELEGRAM_MESSAGE_LIMIT for chunk in chunks))
+        digest = "\n".join(chunks)
+        self.assertTrue(digest.startswith("Found and stored 99 new common games from the last 7 days."))
+        self.assertIn("Alice, Unknown(20) — https://www.opendota.com/matches/100", digest)
+
+    async def test_players_in_several_chats_are_synced_once(self):
+        session = db.SessionLocal()
+        for user_id in ("1", "2", "3"):
+            session.add(db.User(telegram_id=user_id, steam_id=str(76561197960265728 + int(user_id))))
+        session.commit()
+        session.close()
+        await db.store_game_participants("-100", ["1", "2"])
+        await db.store_game_participants("-200", ["1", "2", "3"])
+        await db.store_game_participants("-300", ["2", "3"])
+
+        with patch("steam._find_and_store_common_games", AsyncMock()) as find:
+            await steam.check_and_store_dota_games(self.context)
+
+        synced = sorted(call.args[0] for call in steam.sync_player_matches.await_args_list)
+        self.assertEqual(synced, ["1", "2", "3"])
+        self.assertEqual(find.await_count, 3)
+        self.assertEqual(await db.get_game_participants(), [])
+
+    async def test_long_digest_edits_progress_message_and_splits_at_the_limit(self):
+        details = {
+            match_id: {"match_id": match_id, "radiant_win": True, "start_time": 1700000000 + match_id, "players": []}
+            for match_id in range(1, 101)
+        }
+        progress_message = MagicMock()
+        progress_message.edit_text = AsyncMock()
+
+        with patch("steam._send_opendota_request", AsyncMock()), patch(
+            "steam.db.get_match_details_many", AsyncMock(return_value=details)
+        ), patch("steam.split_message", partial(utils.split_message, limit=1000)):
+            await steam._find_and_store_common_games(
+                self.context, "-100", ["10", "20"], 7, progress_message=progress_message
+            )
 
-        self.assertIn("В Dota 2:", result)
+        edits = [call.args[0] for call in progress_message.edit_text.await_args_list]
+        self.assertEqual(edits[0], "Syncing the matches of 2 players...")
+        self.assertTrue(edits[-1].startswith("Found and stored 100 new common games"))
+        sent = [call.kwargs["text"] for call in self.context.bot.send_message.await_args_list]
+        self.assertTrue(sent)
+        self.assertTrue(all(len(chunk) <= 1000 for chunk in [edits[-1], *sent]))
+        self.assertEqual(sum(chunk.count("•") for chunk in [edits[-1], *sent]), 100)
 
 
 if __name__ == "__main__":
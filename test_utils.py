@@ -0,0 +1,28 @@
+import unittest
+
+from utils import convert_steamid_64_to_32, split_message
+
+
+class TestUtils(unittest.TestCase):
+    def test_convert_steamid_64_to_32(self):
+        self.assertEqual(convert_steamid_64_to_32("76561197960265738"), "10")
+
+    def test_short_message_is_not_split(self):
+        self.assertEqual(split_message("a\nb"), ["a\nb"])
+
+    def test_message_is_split_between_lines(self):
+        text = "\n".join(f"line {i:03d}" for i in range(100))
+
+        chunks = split_message(text, limit=100)
+
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual("\n".join(chunks), text)
+
+    def test_overlong_line_is_cut(self):
+        chunks = split_message("x" * 250, limit=100)
+
+        self.assertEqual([len(chunk) for chunk in chunks], [100, 100, 50])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,479 @@
+import gzip
+import json
+import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from urllib.parse import urlencode
+from unittest.mock import patch, AsyncMock
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import AioHTTPTestCase, TestServer
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import charts
+import db
+import health
+import poll_state as poll_state_module
+import web_server
+
+
+class TestStaticAssets(AioHTTPTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.static_patch = patch("web_server.STATIC_DIR", pathlib.Path(self.tmp_dir.name))
+        self.static_patch.start()
+        await super().asyncSetUp()
+
+    async def asyncTearDown(self):
+        await super().asyncTearDown()
+        self.static_patch.stop()
+        self.tmp_dir.cleanup()
+
+    async def get_application(self):
+        app = web_server.create_app()
+        app.router.add_get(
+            "/big", lambda request: web.Response(text="x" * 5000, content_type="text/html")
+        )
+        return app
+
+    def test_write_static_asset_replaces_old_versions(self):
+        """Test that a new version of an asset removes the previous one"""
+        first = web_server.write_static_asset("stats_1", "<html>one</html>")
+        second = web_server.write_static_asset("stats_1", "<html>two</html>")
+
+        self.assertNotEqual(first, second)
+        self.assertRegex(second, r"^stats_1\.[0-9a-f]{12}\.html$")
+        files = {p.name for p in web_server.STATIC_DIR.iterdir()}
+        self.assertIn(second, files)
+        self.assertIn(second + ".gz", files)
+        self.assertNotIn(first, files)
+        self.assertNotIn(first + ".gz", files)
+
+    async def test_hashed_asset_is_immutable_and_precompressed(self):
+        """Test that hashed assets are served from the gzip sidecar with long caching"""
+        filename = web_server.write_static_asset("stats_1", "<html>" + "a" * 5000 + "</html>")
+
+        resp = await self.client.get(
+            f"/static/{filename}", headers={"Accept-Encoding": "gzip"}, auto_decompress=False
+        )
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(resp.headers["Cache-Control"], web_server.STATIC_CACHE_CONTROL)
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        body = gzip.decompress(await resp.read())
+        self.assertTrue(body.startswith(b"<html>"))
+
+    async def test_large_response_is_compressed(self):
+        """Test on-the-fly compression of responses above the size threshold"""
+        resp = await self.client.get("/big", headers={"Accept-Encoding": "gzip"})
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertEqual(await resp.text(), "x" * 5000)
+
+    async def test_small_response_is_not_compressed(self):
+        """Test that responses below the threshold are sent as is"""
+        resp = await self.client.get("/", headers={"Accept-Encoding": "gzip, br"})
+
+        self.assertEqual(resp.status, 200)
+        self.assertNotIn("Content-Encoding", resp.headers)
+
+
+class TestHealthEndpoints(AioHTTPTestCase):
+    async def get_application(self):
+        return web_server.create_app()
+
+    async def test_healthz_reports_event_loop_lag(self):
+        """Test that liveness fails once the event loop lag is above the threshold"""
+        with patch("metrics.latest_event_loop_lag", 0.01):
+            resp = await self.client.get("/healthz")
+            self.assertEqual(resp.status, 200)
+
+        with patch("metrics.latest_event_loop_lag", 60.0):
+            resp = await self.client.get("/healthz")
+            data = await resp.json()
+            self.assertEqual(resp.status, 503)
+            self.assertEqual(data["checks"]["event_loop"]["lag_seconds"], 60.0)
+
+    @patch("health.db.ping", new_callable=AsyncMock)
+    async def test_readyz_checks_database(self, mock_ping):
+        """Test that readiness fails when the database is unreachable"""
+        resp = await self.client.get("/readyz")
+        self.assertEqual(resp.status, 200)
+
+        mock_ping.side_effect = db.DatabaseError("disk I/O error")
+        resp = await self.client.get("/readyz")
+        data = await resp.json()
+        self.assertEqual(resp.status, 503)
+        self.assertFalse(data["checks"]["database"]["ok"])
+
+    def test_quiet_chats_do_not_fail_readiness(self):
+        """Test that an old last update only fails readiness with HEALTH_MAX_UPDATE_AGE set"""
+        application = SimpleNamespace(updater=SimpleNamespace(running=True))
+        with patch("health.last_telegram_update_at", time.time() - 24 * 3600):
+            check = health.check_telegram(application)
+            self.assertTrue(check["ok"])
+            self.assertGreaterEqual(check["last_update_age_seconds"], 24 * 3600)
+
+            with patch("health.MAX_UPDATE_AGE", 3600):
+                self.assertFalse(health.check_telegram(application)["ok"])
+
+        application.updater.running = False
+        self.assertFalse(health.check_telegram(application)["ok"])
+
+    async def test_hanging_database_times_out(self):
+        """Test that a blocking database query cannot stall the readiness probe"""
+        with patch("health.db._ping", lambda: time.sleep(1)), patch("health.DB_TIMEOUT", 0.1):
+            started = time.perf_counter()
+            check = await health.check_database()
+            elapsed = time.perf_counter() - started
+
+        self.assertFalse(check["ok"])
+        self.assertLess(elapsed, 0.5)
+
+
+def create_poll_database(db_path):
+    """Creates a database with 30 daily polls, each with one vote for the first option"""
+    db.Base.metadata.create_all(create_engine(f"sqlite:///{db_path}"))
+    conn = sqlite3.connect(db_path)
+    start = datetime(2025, 9, 1, 15, 30)
+    for day in range(30):
+        trigger_time = (start + timedelta(days=day)).isoformat(sep=" ")
+        cursor = conn.execute(
+            "INSERT INTO polls (chat_id, poll_id, trigger_time) VALUES (?, ?, ?)",
+            ("-100", str(day), trigger_time),
+        )
+        conn.execute(
+            "INSERT INTO votes (poll_id, user_id, option_index, response_time) VALUES (?, ?, ?, ?)",
+            (cursor.lastrowid, "1", 0, trigger_time),
+        )
+    conn.commit()
+    conn.close()
+
+
+class TestPollHistory(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "test.db")
+        create_poll_database(self.db_path)
+        self.db_patch = patch("web_server.DATABASE", self.db_path)
+        self.db_patch.start()
+
+    def tearDown(self):
+        self.db_patch.stop()
+        self.tmp_dir.cleanup()
+
+    async def test_history_pages_follow_keyset_cursor(self):
+        """Test that history pages are contiguous and end with no cursor"""
+        options = ["a", "b"]
+        first_page = await web_server.get_poll_history_page("-100", options)
+        second_page = await web_server.get_poll_history_page(
+            "-100", options, before=first_page["next_before"]
+        )
+
+        self.assertEqual(len(first_page["polls"]), web_server.HISTORY_PAGE_SIZE)
+        self.assertEqual(first_page["polls"][0]["time"], "30.09.2025 15:30")
+        self.assertEqual(first_page["polls"][0]["votes"], [1, 0])
+        self.assertEqual(len(second_page["polls"]), 30 - web_server.HISTORY_PAGE_SIZE)
+        self.assertIsNone(second_page["next_before"])
+
+    async def test_stats_respect_date_range(self):
+        """Test that the from/to window limits the aggregated polls"""
+        date_from = datetime(2025, 9, 10)
+        date_to = datetime(2025, 9, 19) + timedelta(days=1)
+
+        stats = await web_server.get_detailed_poll_stats("-100", ["a", "b"], date_from, date_to)
+
+        self.assertEqual(stats["total_polls"], 10)
+        self.assertEqual(stats["option_votes"], [10, 0])
+        self.assertEqual(len(stats["recent_polls"]), web_server.RECENT_POLLS_LIMIT)
+
+
+class TestCharts(AioHTTPTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "test.db")
+        create_poll_database(self.db_path)
+        self.db_patch = patch("web_server.DATABASE", self.db_path)
+        self.db_patch.start()
+        self.cache_patch = patch("charts._chart_cache", charts.OrderedDict())
+        self.cache_patch.start()
+        await super().asyncSetUp()
+
+    async def asyncTearDown(self):
+        await super().asyncTearDown()
+        self.cache_patch.stop()
+        self.db_patch.stop()
+        self.tmp_dir.cleanup()
+
+    async def get_application(self):
+        return web_server.create_app()
+
+    async def test_versioned_chart_is_immutable(self):
+        """Test that a chart pinned to the current data version is cached for good"""
+        version = await web_server.get_stats_data_version("-100", web_server.DEFAULT_POLL_OPTIONS)
+
+        resp = await self.client.get(f"/stats/-100/charts/options.svg?v={version}")
+        body = await resp.text()
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(resp.content_type, "image/svg+xml")
+        self.assertEqual(resp.headers["Cache-Control"], web_server.STATIC_CACHE_CONTROL)
+        self.assertTrue(body.startswith("<svg"))
+        self.assertIn(">30</text>", body)
+
+        resp = await self.client.get(
+            f"/stats/-100/charts/options.svg?v={version}",
+            headers={"If-None-Match": resp.headers["ETag"]},
+        )
+        self.assertEqual(resp.status, 304)
+
+    async def test_new_vote_changes_version(self):
+        """Test that the data version and the chart change when a vote arrives"""
+        options = web_server.DEFAULT_POLL_OPTIONS
+        old_version = await web_server.get_stats_data_version("-100", options)
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "INSERT INTO votes (poll_id, user_id, option_index, response_time) VALUES (1, '2', 1, '2025-09-01 15:40:00')"
+        )
+        conn.commit()
+        conn.close()
+        new_version = await web_server.get_stats_data_version("-100", options)
+
+        self.assertNotEqual(old_version, new_version)
+        resp = await self.client.get(f"/stats/-100/charts/options.svg?v={old_version}")
+        self.assertEqual(resp.headers["Cache-Control"], "no-cache")
+        self.assertEqual(resp.headers["ETag"], f'"{new_version}"')
+
+    async def test_unknown_chart_is_not_found(self):
+        resp = await self.client.get("/stats/-100/charts/unknown.svg")
+        self.assertEqual(resp.status, 404)
+
+
+class TestAdminDashboard(AioHTTPTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "test.db")
+        create_poll_database(self.db_path)
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO chat_settings (chat_id, chat_name) VALUES ('-100', 'Сосисочная')")
+        conn.execute("INSERT INTO chat_settings (chat_id, chat_name) VALUES ('-200', 'Пустой чат')")
+        conn.execute(
+            "INSERT INTO user_steam_chats (telegram_id, steam_id, chat_id) VALUES ('1', '76561197960265738', '-100')"
+        )
+        conn.execute(
+            "INSERT INTO matches (match_id, chat_id, winner, radiant_players, dire_players) VALUES ('1', '-100', 'radiant', '10,11', '20')"
+        )
+        conn.execute(
+            "INSERT INTO matches (match_id, chat_id, winner, radiant_players, dire_players) VALUES ('2', '-100', 'dire', '10', '20')"
+        )
+        conn.commit()
+        conn.close()
+
+        engine = create_engine(f"sqlite:///{self.db_path}")
+        patch("db.SessionLocal", sessionmaker(bind=engine)).start()
+        patch("web_server.ADMIN_TOKEN", "secret").start()
+        self.addCleanup(patch.stopall)
+        await super().asyncSetUp()
+
+    async def asyncTearDown(self):
+        await super().asyncTearDown()
+        self.tmp_dir.cleanup()
+
+    async def get_application(self):
+        return web_server.create_app()
+
+    async def test_requires_admin_token(self):
+        resp = await self.client.get("/admin")
+        self.assertEqual(resp.status, 401)
+
+        resp = await self.client.get("/admin", headers={"Authorization": "Bearer wrong"})
+        self.assertEqual(resp.status, 401)
+
+        with patch("web_server.ADMIN_TOKEN", ""):
+            resp = await self.client.get("/admin", headers={"Authorization": "Bearer "})
+            self.assertEqual(resp.status, 404)
+
+    async def test_dashboard_shows_refreshed_aggregates(self):
+        """Test that the dashboard lists every chat from the aggregate table"""
+        await db.refresh_chat_aggregates()
+        chats = {chat["chat_id"]: chat for chat in await db.get_chat_aggregates()}
+
+        self.assertEqual(set(chats), {"-100", "-200"})
+        self.assertEqual(chats["-100"]["total_polls"], 30)
+        self.assertEqual(chats["-100"]["participation_rate"], 1.0)
+        self.assertEqual(chats["-100"]["matches_stored"], 2)
+        self.assertEqual(chats["-100"]["win_rate"], 0.5)
+        self.assertIsNone(chats["-200"]["win_rate"])
+
+        resp = await self.client.get(
+            "/admin?sort=win_rate", auth=aiohttp.BasicAuth("admin", "secret")
+        )
+        self.assertEqual(resp.status, 200)
+        body = await resp.text()
+        self.assertIn("Сосисочная", body)
+        self.assertIn("50.0%", body)
+        self.assertLess(body.index("Сосисочная"), body.index("Пустой чат"))
+
+    async def test_aggregate_scan_runs_off_the_event_loop(self):
+        """Test that the match scan neither blocks the loop nor holds the database semaphore"""
+        scans = []
+        chat_won_match = db._chat_won_match
+
+        def record_scan(match, chat_steam_ids_32):
+            scans.append((threading.current_thread() is threading.main_thread(), db.db_semaphore.locked()))
+            return chat_won_match(match, chat_steam_ids_32)
+
+        with patch("db._chat_won_match", record_scan):
+            await db.refresh_chat_aggregates()
+
+        self.assertEqual(scans, [(False, False), (False, False)])
+        self.assertEqual(len(await db.get_chat_aggregates()), 2)
+
+    async def test_export_streams_csv(self):
+        """Test that the export endpoint streams one CSV table with chunked encoding"""
+        with patch("web_server.DATABASE", self.db_path):
+            resp = await self.client.get(
+                "/export/-100.csv?table=votes", headers={"Authorization": "Bearer secret"}
+            )
+            body = await resp.text()
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(resp.headers["Transfer-Encoding"], "chunked")
+        self.assertEqual(len(body.strip().splitlines()), 31)
+
+        resp = await self.client.get("/export/-100.ndjson")
+        self.assertEqual(resp.status, 401)
+
+
+class TestSteamCallback(AioHTTPTestCase):
+    async def asyncSetUp(self):
+        async def check_authentication(request):
+            return web.Response(text="ns:http://specs.openid.net/auth/2.0\nis_valid:true\n")
+
+        steam_app = web.Application()
+        steam_app.router.add_post("/openid/login", check_authentication)
+        self.steam = TestServer(steam_app)
+        await self.steam.start_server()
+        patch("web_server.STEAM_OPENID_URL", str(self.steam.make_url("/openid/login"))).start()
+        self.complete = patch("web_server.complete_steam_link", AsyncMock(return_value=("1", "-100"))).start()
+        self.addCleanup(patch.stopall)
+        await super().asyncSetUp()
+
+    async def asyncTearDown(self):
+        await super().asyncTearDown()
+        await self.steam.close()
+
+    async def get_application(self):
+        return web_server.create_app()
+
+    def callback_url(self, query_token, signed_token, base_url=None):
+        return_to = f"{base_url or web_server.get_base_url()}/auth/steam/callback?session={signed_token}"
+        params = {
+            "session": query_token,
+            "openid.mode": "id_res",
+            "openid.claimed_id": "https://steamcommunity.com/openid/id/76561197960265738",
+            "openid.return_to": return_to,
+            "openid.signed": "signed,op_endpoint,claimed_id,identity,return_to,response_nonce,assoc_handle",
+        }
+        return "/auth/steam/callback?" + urlencode(params)
+
+    async def test_session_comes_from_signed_return_to(self):
+        resp = await self.client.get(self.callback_url("mine", "mine"), allow_redirects=False)
+
+        self.assertEqual(resp.status, 302)
+        self.assertTrue(resp.headers["Location"].startswith("/auth/steam/success"))
+        self.complete.assert_awaited_once()
+        self.assertEqual(self.complete.await_args.args[1:], ("mine", "76561197960265738"))
+
+    async def test_replayed_assertion_with_another_session_is_rejected(self):
+        for url in (
+            self.callback_url("victim", "mine"),
+            self.callback_url("mine", "mine", base_url="https://evil.example"),
+        ):
+            resp = await self.client.get(url, allow_redirects=False)
+            self.assertEqual(resp.status, 302)
+            self.assertEqual(resp.headers["Location"], "/auth/steam/cancel")
+
+        self.complete.assert_not_awaited()
+
+
+class TestLivePage(AioHTTPTestCase):
+    async def asyncSetUp(self):
+        self.state = web_server.poll_state.__class__()
+        patch("web_server.poll_state", self.state).start()
+        patch("poll_state.db.store_user_info", new_callable=AsyncMock).start()
+        patch("poll_state.db.store_vote", new_callable=AsyncMock).start()
+        self.addCleanup(patch.stopall)
+        await super().asyncSetUp()
+
+    async def get_application(self):
+        return web_server.create_app()
+
+    async def read_event(self, resp):
+        lines = []
+        while True:
+            line = (await resp.content.readline()).decode("utf-8").rstrip("\n")
+            if not line:
+                break
+            lines.append(line)
+        event = lines[0][len("event: "):]
+        return event, json.loads(lines[1][len("data: "):])
+
+    async def test_stream_sends_snapshot_then_votes(self):
+        """Test that a subscriber gets the current poll and then each vote as a delta"""
+        self.state.active_polls["-100"] = {
+            "poll_id": "p1",
+            "votes": {},
+            "started_at": datetime(2025, 9, 1, 15, 30),
+            "all_users": {1, 2},
+            "voted_users": set(),
+            "db_poll_id": 1,
+        }
+
+        resp = await self.client.get("/live/-100/events")
+        self.assertEqual(resp.headers["Content-Type"], "text/event-stream")
+        event, data = await self.read_event(resp)
+        self.assertEqual(event, "snapshot")
+        self.assertTrue(data["active"])
+        self.assertEqual(data["not_voted"], 2)
+
+        await self.state.add_vote("p1", SimpleNamespace(id=1, first_name="Вася"), 2)
+        event, data = await self.read_event(resp)
+        self.assertEqual(event, "vote")
+        self.assertEqual((data["name"], data["option"], data["previous_option"]), ("Вася", 2, None))
+
+        resp.close()
+
+    async def test_hostile_chat_id_is_not_found(self):
+        """Test that only integer chat IDs reach the page and its script"""
+        for path in ("/live/%22%3Balert(document.cookie)%3B%2F%2F", "/live/abc/events"):
+            resp = await self.client.get(path)
+            self.assertEqual(resp.status, 404)
+
+        resp = await self.client.get("/live/-100")
+        self.assertEqual(resp.status, 200)
+        self.assertIn('new EventSource("/live/-100/events")', await resp.text())
+
+    def test_lagging_subscriber_gets_snapshot(self):
+        """Test that a full queue is replaced by a single snapshot"""
+        queue = self.state.subscribe("-100")
+        for _ in range(poll_state_module.LIVE_QUEUE_SIZE + 1):
+            self.state._publish("-100", {"type": "closed"})
+
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(queue.get_nowait()["type"], "snapshot")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import patch, AsyncMock
+
+from aiohttp.test_utils import AioHTTPTestCase
+
+import web_server
+import web_workers
+from auth_sessions import SteamAuthSessionStore
+
+
+class TestInternalApi(AioHTTPTestCase):
+    async def asyncSetUp(self):
+        self.store = SteamAuthSessionStore(ttl=60, max_size=10)
+        patch("web_workers.steam_auth_sessions", self.store).start()
+        patch("web_server.steam_auth_sessions", self.store).start()
+        self.addCleanup(patch.stopall)
+        await super().asyncSetUp()
+
+    async def get_application(self):
+        return web_workers.create_internal_app(None, "secret")
+
+    def headers(self, token="secret"):
+        return {web_server.INTERNAL_TOKEN_HEADER: token}
+
+    async def test_rejects_requests_without_token(self):
+        resp = await self.client.post(
+            "/internal/steam/sessions", json={"telegram_id": "1"}, headers=self.headers("wrong")
+        )
+        self.assertEqual(resp.status, 403)
+        self.assertEqual(len(self.store), 0)
+
+    @patch("web_server.db.update_user_steam_id", new_callable=AsyncMock)
+    async def test_worker_login_is_completed_by_bot_process(self, mock_update):
+        """Test that a session started for a worker is linked and consumed by the bot process"""
+        resp = await self.client.post(
+            "/internal/steam/sessions",
+            json={"telegram_id": "1", "chat_id": "-100"},
+            headers=self.headers(),
+        )
+        token = (await resp.json())["token"]
+
+        resp = await self.client.post(
+            "/internal/steam/complete",
+            json={"session": token, "steam_id": "76561197960287930"},
+            headers=self.headers(),
+        )
+        self.assertEqual(await resp.json(), {"telegram_id": "1", "chat_id": "-100"})
+        mock_update.assert_awaited_once_with("1", "76561197960287930", "-100")
+
+        # The session is single use
+        resp = await self.client.post(
+            "/internal/steam/complete",
+            json={"session": token, "steam_id": "76561197960287930"},
+            headers=self.headers(),
+        )
+        self.assertEqual(resp.status, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,2 +1,29 @@
+# Longest text Telegram accepts in one message
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
 def convert_steamid_64_to_32(steam_id_64):
     return str(int(steam_id_64) - 76561197960265728)
+
+
+def split_message(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Split text into chunks Telegram accepts, breaking between lines where possible."""
+    chunks = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if not current:
+            current = line
+        elif len(current) + 1 + len(line) <= limit:
+            current += "\n" + line
+        else:
+            chunks.append(current)
+            current = line
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
@@ -1,17 +1,35 @@
+import asyncio
+import gzip
+import hashlib
+import json
 import logging
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from aiohttp import web
 import socket
 import sqlite3
 import pathlib
-import secrets
 import re
+import secrets
 import aiohttp
 import ssl
+from html import escape
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
 
+import charts
 import db
+import export
+import health
+import metrics
 from db import DB_FILE  # Import DB_FILE constant
+from exceptions import DatabaseError
+from auth_sessions import steam_auth_sessions
+from poll_state import poll_state
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -29,10 +47,6 @@ PORT = DEV_PORT if DEV_MODE else PROD_PORT
 # Steam OpenID configuration
 STEAM_OPENID_URL = "https://steamcommunity.com/openid/login"
 
-# Storage for temporary states and telegram_id <-> session code mappings
-steam_auth_sessions = {}  # session_id -> (telegram_id, chat_id)
-telegram_auth_requests = {}  # telegram_id -> session_id
-
 # Database file
 DATABASE = DB_FILE
 
@@ -40,6 +54,64 @@ DATABASE = DB_FILE
 STATIC_DIR = pathlib.Path(__file__).parent / "static"
 os.makedirs(STATIC_DIR, exist_ok=True)
 
+# Poll history settings
+RECENT_POLLS_LIMIT = 5
+HISTORY_PAGE_SIZE = 20
+
+# Poll options used when the request does not pass its own
+DEFAULT_POLL_OPTIONS = [
+    "Конечно, нахуй, да!",
+    "А когда не сасать?!",
+    "Со вчерашнего рот болит",
+    "5-10 минут и готов сасать",
+    "Полчасика и буду пасасэо",
+]
+
+# Charts served under /stats/{chat_id}/charts/{name}.svg
+CHART_NAMES = ("options", "weekdays", "times")
+
+# Outbound HTTP client settings
+CLIENT_POOL_SIZE = int(os.environ.get("WEB_CLIENT_POOL_SIZE", 20))
+CLIENT_DNS_CACHE_TTL = 300  # seconds
+CLIENT_KEEPALIVE_TIMEOUT = 30  # seconds
+CLIENT_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5)
+CLIENT_SESSION_KEY = web.AppKey("client_session", aiohttp.ClientSession)
+
+# Telegram application of the bot, used by the readiness probe
+BOT_APPLICATION_KEY = web.AppKey("bot_application", object)
+
+# Runner of the started web server, used for a clean shutdown
+_runner = None
+
+# Live poll page settings
+LIVE_PING_INTERVAL = 15  # seconds between keep-alive comments on an idle event stream
+LIVE_STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=5)
+
+# Token guarding the admin pages; they are disabled while it is unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Set by the supervisor when the server runs in a worker process (see web_workers.py);
+# the worker then hands everything that needs the bot process over to its internal API
+INTERNAL_API_URL = os.environ.get("WEB_INTERNAL_API_URL", "")
+INTERNAL_API_TOKEN = os.environ.get("WEB_INTERNAL_API_TOKEN", "")
+INTERNAL_TOKEN_HEADER = "X-Internal-Token"
+WORKER_MODE = bool(INTERNAL_API_URL)
+
+# Response compression settings
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSIBLE_CONTENT_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+)
+BROTLI_DYNAMIC_QUALITY = 5  # Fast enough to compress pages on every request
+BROTLI_STATIC_QUALITY = 11  # Sidecar files are compressed once, so use the best ratio
+
+# Static files with a content hash in the name never change and can be cached forever
+HASHED_ASSET_RE = re.compile(r"\.[0-9a-f]{12}\.\w+$")
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 # HTML page template
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -250,9 +322,151 @@ HTML_TEMPLATE = """
 """
 
 
-async def get_detailed_poll_stats(chat_id, poll_options):
-    """Retrieves detailed poll statistics for a specific chat"""
-    conn = sqlite3.connect(DATABASE)
+def connect_database():
+    """Opens the statistics database, read-only in worker processes"""
+    if db.DB_READ_ONLY:
+        return sqlite3.connect(f"file:{DATABASE}?mode=ro", uri=True)
+    return sqlite3.connect(DATABASE)
+
+
+def parse_date_range(query):
+    """Parses the optional from/to query parameters (YYYY-MM-DD, both inclusive)"""
+    date_from = date_to = None
+    if query.get("from"):
+        date_from = datetime.strptime(query["from"], "%Y-%m-%d")
+    if query.get("to"):
+        date_to = datetime.strptime(query["to"], "%Y-%m-%d") + timedelta(days=1)
+    return date_from, date_to
+
+
+def build_poll_filter(chat_id, date_from=None, date_to=None):
+    """Builds the WHERE clause selecting the chat's polls (aliased as p) in a date range"""
+    # trigger_time is stored as an ISO string, so it compares correctly as text
+    # and the (chat_id, trigger_time) index can serve the range
+    poll_filter = "p.chat_id = ?"
+    poll_params = [chat_id]
+    if date_from:
+        poll_filter += " AND p.trigger_time >= ?"
+        poll_params.append(date_from.isoformat(sep=" "))
+    if date_to:
+        poll_filter += " AND p.trigger_time < ?"
+        poll_params.append(date_to.isoformat(sep=" "))
+    return poll_filter, poll_params
+
+
+def fetch_poll_history(c, poll_filter, poll_params, poll_options, limit, before=None):
+    """Fetches one page of polls (newest first) using the poll ID as keyset cursor"""
+    history_filter = poll_filter
+    history_params = list(poll_params)
+    if before is not None:
+        history_filter += " AND p.id < ?"
+        history_params.append(before)
+
+    # Fetch one extra row to know whether there is another page
+    c.execute(
+        f"""
+        SELECT p.id, p.trigger_time
+        FROM polls p
+        WHERE {history_filter}
+        ORDER BY p.id DESC
+        LIMIT ?
+    """,
+        history_params + [limit + 1],
+    )
+    rows = c.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], None
+
+    # Votes for all polls of the page in a single query
+    poll_ids = [row["id"] for row in rows]
+    placeholders = ",".join("?" * len(poll_ids))
+    c.execute(
+        f"""
+        SELECT poll_id, option_index, COUNT(*) as count
+        FROM votes
+        WHERE poll_id IN ({placeholders})
+        GROUP BY poll_id, option_index
+    """,
+        poll_ids,
+    )
+    poll_votes = {poll_id: [0] * len(poll_options) for poll_id in poll_ids}
+    for vote in c.fetchall():
+        option_index = vote["option_index"]
+        if 0 <= option_index < len(poll_options):
+            poll_votes[vote["poll_id"]][option_index] = vote["count"]
+
+    polls = [
+        {
+            "id": row["id"],
+            "time": datetime.fromisoformat(row["trigger_time"]).strftime("%d.%m.%Y %H:%M"),
+            "votes": poll_votes[row["id"]],
+        }
+        for row in rows
+    ]
+    next_before = poll_ids[-1] if has_more else None
+    return polls, next_before
+
+
+def query_data_version(c, poll_filter, poll_params, poll_options):
+    """Returns a short hash that changes whenever votes are added to the filtered polls"""
+    # Votes are only ever inserted, so their count and last ID identify the data
+    c.execute(
+        f"""
+        SELECT COUNT(*), COALESCE(MAX(v.id), 0) FROM votes v
+        JOIN polls p ON v.poll_id = p.id
+        WHERE {poll_filter}
+    """,
+        poll_params,
+    )
+    vote_count, last_vote_id = c.fetchone()
+    key = "\n".join([str(vote_count), str(last_vote_id), *map(str, poll_params), *poll_options])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+
+async def get_stats_data_version(chat_id, poll_options, date_from=None, date_to=None):
+    """Retrieves the data version of the statistics of a chat and optional date range"""
+    poll_filter, poll_params = build_poll_filter(chat_id, date_from, date_to)
+
+    conn = connect_database()
+    try:
+        return query_data_version(conn.cursor(), poll_filter, poll_params, poll_options)
+    finally:
+        conn.close()
+
+
+async def get_poll_history_page(chat_id, poll_options, before=None, date_from=None, date_to=None):
+    """Retrieves one page of a chat's poll history"""
+    poll_filter, poll_params = build_poll_filter(chat_id, date_from, date_to)
+
+    conn = connect_database()
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+
+    try:
+        c.execute("SELECT chat_name FROM chat_settings WHERE chat_id = ?", (chat_id,))
+        result = c.fetchone()
+        chat_name = result["chat_name"] if result else ""
+
+        polls, next_before = fetch_poll_history(
+            c, poll_filter, poll_params, poll_options, limit=HISTORY_PAGE_SIZE, before=before
+        )
+        return {
+            "chat_id": chat_id,
+            "chat_name": chat_name,
+            "polls": polls,
+            "next_before": next_before,
+        }
+    finally:
+        conn.close()
+
+
+async def get_detailed_poll_stats(chat_id, poll_options, date_from=None, date_to=None):
+    """Retrieves detailed poll statistics for a specific chat and optional date range"""
+    poll_filter, poll_params = build_poll_filter(chat_id, date_from, date_to)
+
+    conn = connect_database()
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
 
@@ -265,17 +479,17 @@ async def get_detailed_poll_stats(chat_id, poll_options):
             chat_name = result["chat_name"]
 
         # Total number of polls
-        c.execute("SELECT COUNT(*) FROM polls WHERE chat_id = ?", (chat_id,))
+        c.execute(f"SELECT COUNT(*) FROM polls p WHERE {poll_filter}", poll_params)
         total_polls = c.fetchone()[0]
 
         # Total number of votes
         c.execute(
-            """
+            f"""
             SELECT COUNT(*) FROM votes v
             JOIN polls p ON v.poll_id = p.id
-            WHERE p.chat_id = ?
+            WHERE {poll_filter}
         """,
-            (chat_id,),
+            poll_params,
         )
         total_votes = c.fetchone()[0]
 
@@ -285,14 +499,14 @@ async def get_detailed_poll_stats(chat_id, poll_options):
         # Answer popularity
         option_votes = [0] * len(poll_options)
         c.execute(
-            """
+            f"""
             SELECT option_index, COUNT(*) as count FROM votes v
             JOIN polls p ON v.poll_id = p.id
-            WHERE p.chat_id = ? 
+            WHERE {poll_filter}
             GROUP BY option_index
             ORDER BY option_index
         """,
-            (chat_id,),
+            poll_params,
         )
         for row in c.fetchall():
             option_index = row["option_index"]
@@ -301,75 +515,41 @@ async def get_detailed_poll_stats(chat_id, poll_options):
 
         # Active users
         c.execute(
-            """
+            f"""
             SELECT u.first_name || ' ' || COALESCE(u.last_name, '') as name FROM users u
             JOIN votes v ON u.telegram_id = v.user_id
             JOIN polls p ON v.poll_id = p.id
-            WHERE p.chat_id = ?
+            WHERE {poll_filter}
             GROUP BY u.telegram_id
             ORDER BY COUNT(*) DESC
             LIMIT 10
         """,
-            (chat_id,),
+            poll_params,
         )
         active_users = [row["name"].strip() for row in c.fetchall()]
 
         # Average voting time
         c.execute(
-            """
+            f"""
             SELECT AVG(strftime('%s', v.response_time) - strftime('%s', p.trigger_time)) as avg_time
             FROM votes v
             JOIN polls p ON v.poll_id = p.id
-            WHERE p.chat_id = ?
+            WHERE {poll_filter}
         """,
-            (chat_id,),
+            poll_params,
         )
         avg_seconds = c.fetchone()[0] or 0
         avg_minutes = int(avg_seconds / 60)
         avg_vote_time = f"{avg_minutes} мин"
 
         # Recent polls
-        c.execute(
-            """
-            SELECT p.id, p.trigger_time 
-            FROM polls p 
-            WHERE p.chat_id = ? 
-            ORDER BY p.trigger_time DESC 
-            LIMIT 5
-        """,
-            (chat_id,),
+        recent_polls, _ = fetch_poll_history(
+            c, poll_filter, poll_params, poll_options, limit=RECENT_POLLS_LIMIT
         )
-        recent_polls = []
-
-        for row in c.fetchall():
-            poll_id = row["id"]
-            poll_time = datetime.fromisoformat(row["trigger_time"]).strftime(
-                "%d.%m.%Y %H:%M"
-            )
-
-            # Votes for each poll
-            c.execute(
-                """
-                SELECT option_index, COUNT(*) as count
-                FROM votes
-                WHERE poll_id = ?
-                GROUP BY option_index
-                ORDER BY option_index
-            """,
-                (poll_id,),
-            )
-
-            poll_votes = [0] * len(poll_options)
-            for vote in c.fetchall():
-                option_index = vote["option_index"]
-                if 0 <= option_index < len(poll_votes):
-                    poll_votes[option_index] = vote["count"]
-
-            recent_polls.append({"time": poll_time, "votes": poll_votes})
 
         # Data for user votes table
         c.execute(
-            """
+            f"""
             SELECT 
                 u.telegram_id, 
                 u.first_name || ' ' || COALESCE(u.last_name, '') as name,
@@ -378,11 +558,11 @@ async def get_detailed_poll_stats(chat_id, poll_options):
             FROM users u
             JOIN votes v ON u.telegram_id = v.user_id
             JOIN polls p ON v.poll_id = p.id
-            WHERE p.chat_id = ?
+            WHERE {poll_filter}
             GROUP BY u.telegram_id, v.option_index
             ORDER BY u.telegram_id, v.option_index
         """,
-            (chat_id,),
+            poll_params,
         )
 
         user_votes_data = {}
@@ -399,18 +579,18 @@ async def get_detailed_poll_stats(chat_id, poll_options):
 
         # Data for votes by weekday table
         c.execute(
-            """
+            f"""
             SELECT 
                 strftime('%w', p.trigger_time) as weekday,
                 v.option_index,
                 COUNT(*) as vote_count
             FROM votes v
             JOIN polls p ON v.poll_id = p.id
-            WHERE p.chat_id = ?
+            WHERE {poll_filter}
             GROUP BY weekday, v.option_index
             ORDER BY weekday, v.option_index
         """,
-            (chat_id,),
+            poll_params,
         )
 
         weekday_votes_data = {}
@@ -438,7 +618,7 @@ async def get_detailed_poll_stats(chat_id, poll_options):
 
         # Data for votes by time of day table
         c.execute(
-            """
+            f"""
             SELECT 
                 CASE
                     WHEN strftime('%H', p.trigger_time) BETWEEN '06' AND '11' THEN 'Утро'
@@ -450,7 +630,7 @@ async def get_detailed_poll_stats(chat_id, poll_options):
                 COUNT(*) as vote_count
             FROM votes v
             JOIN polls p ON v.poll_id = p.id
-            WHERE p.chat_id = ?
+            WHERE {poll_filter}
             GROUP BY time_of_day, v.option_index
             ORDER BY 
                 CASE time_of_day
@@ -460,7 +640,7 @@ async def get_detailed_poll_stats(chat_id, poll_options):
                     WHEN 'Ночь' THEN 4
                 END, v.option_index
         """,
-            (chat_id,),
+            poll_params,
         )
 
         time_votes_data = {}
@@ -475,10 +655,15 @@ async def get_detailed_poll_stats(chat_id, poll_options):
             if 0 <= option_index < len(poll_options):
                 time_votes_data[time_of_day][option_index] = vote_count
 
+        data_version = query_data_version(c, poll_filter, poll_params, poll_options)
+
         # Form the final data structure
         stats_data = {
             "chat_id": chat_id,
+            "data_version": data_version,
             "chat_name": chat_name,
+            "date_from": date_from,
+            "date_to": date_to,
             "total_polls": total_polls,
             "total_votes": total_votes,
             "avg_votes_per_poll": avg_votes_per_poll,
@@ -531,6 +716,20 @@ def format_poll_history(poll_history, poll_options):
     return html
 
 
+def get_chart_url(stats_data, name):
+    """Builds the versioned URL of a chart, so it can be cached until the votes change"""
+    date_from = stats_data.get("date_from")
+    date_to = stats_data.get("date_to")
+    params = {"v": stats_data["data_version"]}
+    if date_from:
+        params["from"] = date_from.strftime("%Y-%m-%d")
+    if date_to:
+        params["to"] = (date_to - timedelta(days=1)).strftime("%Y-%m-%d")
+    if stats_data["poll_options"] != DEFAULT_POLL_OPTIONS:
+        params["options"] = ",".join(stats_data["poll_options"])
+    return f"/stats/{stats_data['chat_id']}/charts/{name}.svg?{urlencode(params)}"
+
+
 def generate_stats_html(stats_data):
     """Generates an HTML page with statistics"""
     try:
@@ -546,10 +745,23 @@ def generate_stats_html(stats_data):
         user_votes_data = stats_data["user_votes_data"]
         weekday_votes_data = stats_data["weekday_votes_data"]
         time_votes_data = stats_data["time_votes_data"]
+        date_from = stats_data.get("date_from")
+        date_to = stats_data.get("date_to")
 
         # Determine the chat name for display
         display_chat_name = chat_name if chat_name else f"Чат {chat_id}"
 
+        # Selected date range for the filter form and the links (to is exclusive internally)
+        from_value = date_from.strftime("%Y-%m-%d") if date_from else ""
+        to_value = (date_to - timedelta(days=1)).strftime("%Y-%m-%d") if date_to else ""
+        range_query = urlencode({k: v for k, v in (("from", from_value), ("to", to_value)) if v})
+        range_suffix = f"?{range_query}" if range_query else ""
+
+        # Charts are separate cacheable images, the ampersands must be escaped in attributes
+        options_chart_url = escape(get_chart_url(stats_data, "options"))
+        weekday_chart_url = escape(get_chart_url(stats_data, "weekdays"))
+        time_chart_url = escape(get_chart_url(stats_data, "times"))
+
         # Start of HTML document with our CSS
         html = f"""
         <!DOCTYPE html>
@@ -596,6 +808,7 @@ def generate_stats_html(stats_data):
                     display: flex;
                     align-items: center;
                     justify-content: center;
+                    text-decoration: none;
                     transition: background-color 0.3s;
                 }}
                 .refresh-button:hover {{
@@ -715,6 +928,21 @@ def generate_stats_html(stats_data):
                 .section-content.active {{
                     display: block;
                 }}
+                .chart {{
+                    display: block;
+                    max-width: 100%;
+                    height: auto;
+                    margin-bottom: 20px;
+                }}
+                .date-filter {{
+                    display: flex;
+                    flex-wrap: wrap;
+                    gap: 10px;
+                    align-items: center;
+                }}
+                .date-filter input, .date-filter button {{
+                    padding: 6px;
+                }}
                 @media (max-width: 768px) {{
                     .stats-grid {{
                         grid-template-columns: 1fr;
@@ -733,13 +961,22 @@ def generate_stats_html(stats_data):
                 <div class="container">
                     <h1>Статистика опросов</h1>
                     <h2>{display_chat_name}</h2>
-                    <button class="refresh-button" title="Обновить статистику" onclick="window.location.reload()">
+                    <a class="refresh-button" title="Обновить статистику" href="/stats/{chat_id}{range_suffix}">
                         ↻
-                    </button>
+                    </a>
                 </div>
             </header>
             
             <div class="container">
+                <div class="stats-card">
+                    <form class="date-filter" method="get" action="/stats/{chat_id}">
+                        <label>С <input type="date" name="from" value="{from_value}"></label>
+                        <label>По <input type="date" name="to" value="{to_value}"></label>
+                        <button type="submit">Показать</button>
+                        <a href="/stats/{chat_id}">За всё время</a>
+                    </form>
+                </div>
+
                 <div class="stats-card">
                     <h2>Общая статистика</h2>
                     <div class="stats-grid">
@@ -764,6 +1001,7 @@ def generate_stats_html(stats_data):
                 
                 <div class="stats-card">
                     <h2>Популярные ответы</h2>
+                    <img class="chart" src="{options_chart_url}" alt="Популярные ответы">
                     <table class="options-table">
                         <thead>
                             <tr>
@@ -837,13 +1075,14 @@ def generate_stats_html(stats_data):
 
             html += f"<td>{total_user_votes}</td></tr>"
 
-        html += """
+        html += f"""
                             </tbody>
                         </table>
                     </div>
                     
                     <div id="weekday-votes" class="section-content">
                         <h3>Голоса по дням недели</h3>
+                        <img class="chart" src="{weekday_chart_url}" alt="Голоса по дням недели" loading="lazy">
                         <table class="options-table">
                             <thead>
                                 <tr>
@@ -861,19 +1100,8 @@ def generate_stats_html(stats_data):
                             <tbody>
         """
 
-        # Order of weekdays for display
-        weekday_order = [
-            "Понедельник",
-            "Вторник",
-            "Среда",
-            "Четверг",
-            "Пятница",
-            "Суббота",
-            "Воскресенье",
-        ]
-
         # Add data for weekdays
-        for weekday in weekday_order:
+        for weekday in charts.WEEKDAY_ORDER:
             if weekday in weekday_votes_data:
                 votes_array = weekday_votes_data[weekday]
                 total_weekday_votes = sum(votes_array)
@@ -890,13 +1118,14 @@ def generate_stats_html(stats_data):
                     html += "<td>0</td>"
                 html += "<td>0</td></tr>"
 
-        html += """
+        html += f"""
                             </tbody>
                         </table>
                     </div>
                     
                     <div id="time-votes" class="section-content">
                         <h3>Голоса по времени суток</h3>
+                        <img class="chart" src="{time_chart_url}" alt="Голоса по времени суток" loading="lazy">
                         <table class="options-table">
                             <thead>
                                 <tr>
@@ -914,11 +1143,8 @@ def generate_stats_html(stats_data):
                             <tbody>
         """
 
-        # Order of times of day for display
-        time_order = ["Утро", "День", "Вечер", "Ночь"]
-
         # Add data for times of day
-        for time_of_day in time_order:
+        for time_of_day in charts.TIME_OF_DAY_ORDER:
             if time_of_day in time_votes_data:
                 votes_array = time_votes_data[time_of_day]
                 total_time_votes = sum(votes_array)
@@ -969,8 +1195,12 @@ def generate_stats_html(stats_data):
 
             html += "</div>"
 
-        html += """
+        html += f"""
                     </div>
+                    <a href="/stats/{chat_id}/history{range_suffix}">Все опросы →</a>
+        """
+
+        html += """
                 </div>
             </div>
             
@@ -1005,6 +1235,75 @@ def generate_stats_html(stats_data):
         return f"<html><body><h1>Ошибка при создании статистики</h1><p>{str(e)}</p></body></html>"
 
 
+def write_static_asset(prefix, content, suffix=".html"):
+    """Writes a content-hashed static file with .gz/.br sidecars and returns its name"""
+    data = content.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    filename = f"{prefix}.{digest}{suffix}"
+    filepath = STATIC_DIR / filename
+
+    if filepath.exists():
+        return filename
+
+    # Remove previous versions of this asset (and the legacy unhashed file)
+    for stale_file in STATIC_DIR.glob(f"{prefix}.*{suffix}*"):
+        stale_file.unlink(missing_ok=True)
+    (STATIC_DIR / f"{prefix}{suffix}").unlink(missing_ok=True)
+
+    # Write the sidecars first so the plain file never appears without them
+    (STATIC_DIR / f"{filename}.gz").write_bytes(gzip.compress(data, compresslevel=9))
+    if brotli is not None:
+        (STATIC_DIR / f"{filename}.br").write_bytes(
+            brotli.compress(data, quality=BROTLI_STATIC_QUALITY)
+        )
+    filepath.write_bytes(data)
+
+    return filename
+
+
+@web.middleware
+async def compression_middleware(request, handler):
+    """Compresses large text responses and sets cache headers for static files"""
+    response = await handler(request)
+
+    if request.path.startswith("/static/"):
+        # Static files are served with their precompressed sidecars by aiohttp
+        if HASHED_ASSET_RE.search(request.path):
+            response.headers["Cache-Control"] = STATIC_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    # Only plain responses with a body in memory can be compressed here
+    if type(response) is not web.Response or not isinstance(response.body, bytes):
+        return response
+    if "Content-Encoding" in response.headers:
+        return response
+    if len(response.body) < COMPRESSION_MIN_SIZE:
+        return response
+    if not response.content_type.startswith(COMPRESSIBLE_CONTENT_TYPES):
+        return response
+
+    response.headers["Vary"] = "Accept-Encoding"
+    accept_encoding = request.headers.get("Accept-Encoding", "").lower()
+    if brotli is not None and "br" in accept_encoding:
+        response.body = brotli.compress(response.body, quality=BROTLI_DYNAMIC_QUALITY)
+        response.headers["Content-Encoding"] = "br"
+    elif "gzip" in accept_encoding:
+        response.enable_compression(web.ContentCoding.gzip)
+
+    return response
+
+
+def get_request_poll_options(request):
+    """Get poll options from the request (or use defaults)"""
+    poll_options = request.query.get("options", "").split(",")
+    if not poll_options or len(poll_options) < 2:
+        poll_options = DEFAULT_POLL_OPTIONS
+    return poll_options
+
+
 async def get_stats_handler(request):
     """GET request handler for retrieving statistics"""
     chat_id = request.match_info.get("chat_id", "")
@@ -1013,30 +1312,32 @@ async def get_stats_handler(request):
         return web.Response(text="Не указан ID чата", status=400)
 
     try:
-        # Get poll options from the request (or use defaults)
-        poll_options = request.query.get("options", "").split(",")
-        if not poll_options or len(poll_options) < 2:
-            # Default options
-            poll_options = [
-                "Конечно, нахуй, да!",
-                "А когда не сасать?!",
-                "Со вчерашнего рот болит",
-                "5-10 минут и готов сасать",
-                "Полчасика и буду пасасэо",
-            ]
+        date_from, date_to = parse_date_range(request.query)
+    except ValueError:
+        return web.Response(text="Неверный формат даты, используйте ГГГГ-ММ-ДД", status=400)
+
+    try:
+        poll_options = get_request_poll_options(request)
 
         # Generate HTML
-        stats = await get_detailed_poll_stats(chat_id, poll_options)
+        stats = await get_detailed_poll_stats(chat_id, poll_options, date_from, date_to)
         html = generate_stats_html(stats)
+        cache_stats_charts(stats)
 
-        # Save HTML to file
-        filename = f"stats_{chat_id}.html"
-        filepath = STATIC_DIR / filename
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(html)
+        # A date window is sent directly, only the full statistics page is kept as a file
+        if date_from or date_to:
+            return web.Response(text=html, content_type="text/html")
 
-        # Redirect to the created file
-        return web.HTTPFound(f"/static/{filename}")
+        # Save HTML to a content-hashed file with precompressed copies
+        loop = asyncio.get_running_loop()
+        filename = await loop.run_in_executor(
+            None, write_static_asset, f"stats_{chat_id}", html
+        )
+
+        # Redirect to the created file; the redirect itself must not be cached
+        return web.HTTPFound(
+            f"/static/{filename}", headers={"Cache-Control": "no-cache"}
+        )
 
     except Exception as e:
         logger.error(f"Error generating stats: {e}")
@@ -1045,6 +1346,526 @@ async def get_stats_handler(request):
         )
 
 
+def cache_stats_charts(stats_data):
+    """Renders all charts of the statistics page into the chart cache"""
+    for name, svg in charts.render_stats_charts(stats_data).items():
+        charts.store_chart((stats_data["chat_id"], name, stats_data["data_version"]), svg)
+
+
+async def get_chart_handler(request):
+    """GET request handler for the SVG charts of the statistics page"""
+    chat_id = request.match_info.get("chat_id", "")
+    name = request.match_info.get("name", "")
+    if name not in CHART_NAMES:
+        raise web.HTTPNotFound()
+
+    try:
+        date_from, date_to = parse_date_range(request.query)
+    except ValueError:
+        return web.Response(text="Неверный формат даты, используйте ГГГГ-ММ-ДД", status=400)
+
+    try:
+        poll_options = get_request_poll_options(request)
+        version = await get_stats_data_version(chat_id, poll_options, date_from, date_to)
+
+        # Only a URL pinned to the current version may be cached for good
+        headers = {
+            "ETag": f'"{version}"',
+            "Cache-Control": STATIC_CACHE_CONTROL
+            if request.query.get("v") == version
+            else "no-cache",
+        }
+        if request.headers.get("If-None-Match") == headers["ETag"]:
+            return web.Response(status=304, headers=headers)
+
+        svg = charts.get_cached_chart((chat_id, name, version))
+        if svg is None:
+            stats = await get_detailed_poll_stats(chat_id, poll_options, date_from, date_to)
+            cache_stats_charts(stats)
+            svg = charts.get_cached_chart((chat_id, name, stats["data_version"]))
+
+        return web.Response(text=svg, content_type="image/svg+xml", headers=headers)
+    except Exception as e:
+        logger.error(f"Error rendering chart {name} for chat {chat_id}: {e}")
+        return web.Response(text=f"Ошибка при построении графика: {str(e)}", status=500)
+
+
+async def get_history_handler(request):
+    """GET request handler for browsing the poll history page by page"""
+    chat_id = request.match_info.get("chat_id", "")
+
+    try:
+        date_from, date_to = parse_date_range(request.query)
+        before = int(request.query["before"]) if request.query.get("before") else None
+    except ValueError:
+        return web.Response(text="Неверные параметры запроса", status=400)
+
+    try:
+        poll_options = get_request_poll_options(request)
+        history = await get_poll_history_page(chat_id, poll_options, before, date_from, date_to)
+
+        range_params = {k: v for k, v in request.query.items() if k in ("from", "to")}
+        return web.Response(
+            text=generate_history_html(history, poll_options, range_params),
+            content_type="text/html",
+        )
+    except Exception as e:
+        logger.error(f"Error generating poll history: {e}")
+        return web.Response(
+            text=f"Ошибка при получении истории опросов: {str(e)}", status=500
+        )
+
+
+def generate_history_html(history, poll_options, range_params):
+    """Generates an HTML page with one page of the poll history"""
+    chat_id = history["chat_id"]
+    display_chat_name = history["chat_name"] or f"Чат {chat_id}"
+    range_query = urlencode(range_params)
+
+    next_link = ""
+    if history["next_before"] is not None:
+        next_query = urlencode({**range_params, "before": history["next_before"]})
+        next_link = f'<a href="/stats/{chat_id}/history?{next_query}">Более ранние опросы →</a>'
+
+    return f"""
+    <!DOCTYPE html>
+    <html lang="ru">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>История опросов - {display_chat_name}</title>
+        <style>
+            body {{
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                color: #333;
+                background-color: #f5f5f5;
+                margin: 0;
+                padding: 20px;
+            }}
+            .container {{
+                max-width: 1200px;
+                margin: 0 auto;
+            }}
+            .poll-item {{
+                background-color: white;
+                border-radius: 5px;
+                padding: 15px;
+                margin-bottom: 15px;
+                box-shadow: 0 2px 5px rgba(0,0,0,0.05);
+            }}
+            .poll-time {{
+                font-weight: bold;
+                margin-bottom: 5px;
+            }}
+            .option-bar {{
+                height: 20px;
+                background-color: #3498db;
+                border-radius: 3px;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <h1>История опросов</h1>
+            <h2>{display_chat_name}</h2>
+            <p><a href="/stats/{chat_id}{"?" + range_query if range_query else ""}">← К статистике</a></p>
+            {format_poll_history(history["polls"], poll_options)}
+            {next_link}
+        </div>
+    </body>
+    </html>
+    """
+
+
+async def metrics_handler(request):
+    """Exports the process metrics in the Prometheus text format"""
+    return web.Response(
+        body=metrics.render().encode("utf-8"),
+        headers={
+            "Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+            "Cache-Control": "no-cache",
+        },
+    )
+
+
+async def healthz_handler(request):
+    """Liveness probe: fails when the event loop is wedged"""
+    ok, checks = health.get_liveness()
+    return web.json_response(
+        {"status": "ok" if ok else "fail", "checks": checks}, status=200 if ok else 503
+    )
+
+
+async def readyz_handler(request):
+    """Readiness probe: checks the loop, the database, the scheduler and Telegram"""
+    ok, checks = await health.get_readiness(request.app[BOT_APPLICATION_KEY])
+    return web.json_response(
+        {"status": "ok" if ok else "fail", "checks": checks}, status=200 if ok else 503
+    )
+
+
+def get_live_chat_id(request):
+    """The chat ID of a live page request; chat IDs are integers, anything else is not found"""
+    chat_id = request.match_info["chat_id"]
+    if not re.fullmatch(r"-?[0-9]+", chat_id):
+        raise web.HTTPNotFound()
+    return chat_id
+
+
+async def live_page_handler(request):
+    """GET request handler for the live poll page"""
+    chat_id = get_live_chat_id(request)
+    return web.Response(text=generate_live_html(chat_id), content_type="text/html")
+
+
+async def live_events_handler(request):
+    """Streams the chat's poll as Server-Sent Events: a snapshot, then one event per change"""
+    chat_id = get_live_chat_id(request)
+    if WORKER_MODE:
+        return await proxy_event_stream(request, f"/internal/live/{chat_id}/events")
+
+    response = web.StreamResponse(
+        headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+    await response.prepare(request)
+
+    queue = poll_state.subscribe(chat_id)
+    try:
+        await response.write(format_sse(poll_state.get_live_snapshot(chat_id)))
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), LIVE_PING_INTERVAL)
+            except asyncio.TimeoutError:
+                await response.write(b": ping\n\n")
+                continue
+            await response.write(format_sse(event))
+    except ConnectionResetError:
+        pass
+    finally:
+        poll_state.unsubscribe(chat_id, queue)
+
+    return response
+
+
+def format_sse(event):
+    """Encodes an event dict as one Server-Sent Event"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def proxy_event_stream(request, path):
+    """Relays an event stream of the bot process to the client"""
+    session = request.app[CLIENT_SESSION_KEY]
+    async with session.get(
+        INTERNAL_API_URL + path,
+        headers={INTERNAL_TOKEN_HEADER: INTERNAL_API_TOKEN},
+        timeout=LIVE_STREAM_TIMEOUT,
+    ) as upstream:
+        response = web.StreamResponse(
+            status=upstream.status,
+            headers={
+                "Content-Type": upstream.headers.get("Content-Type", "text/event-stream"),
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            },
+        )
+        await response.prepare(request)
+        try:
+            async for chunk in upstream.content.iter_any():
+                await response.write(chunk)
+        except ConnectionResetError:
+            pass
+    return response
+
+
+def generate_live_html(chat_id):
+    """Generates the live poll page; all data arrives over the event stream"""
+    events_url = json.dumps(f"/live/{chat_id}/events")
+    return f"""
+    <!DOCTYPE html>
+    <html lang="ru">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Опрос в прямом эфире</title>
+        <style>
+            body {{
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                color: #333;
+                background-color: #f5f5f5;
+                margin: 0;
+                padding: 20px;
+            }}
+            .card {{
+                background-color: white;
+                border-radius: 5px;
+                box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+                padding: 20px;
+                margin-bottom: 20px;
+                max-width: 800px;
+            }}
+            .option {{
+                margin-bottom: 10px;
+            }}
+            .option-bar {{
+                height: 20px;
+                background-color: #3498db;
+                border-radius: 3px;
+                transition: width 0.3s;
+            }}
+            #state {{
+                color: #777;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="card">
+            <h1>Опрос в прямом эфире</h1>
+            <div id="state">Подключение…</div>
+        </div>
+        <div class="card"><div id="options"></div></div>
+        <div class="card">
+            <h2>Проголосовали</h2>
+            <ul id="voters"></ul>
+        </div>
+        <script>
+            var options = [];
+            var voters = {{}};
+
+            function render() {{
+                var counts = options.map(function () {{ return 0; }});
+                var list = document.getElementById("voters");
+                list.innerHTML = "";
+                Object.keys(voters).forEach(function (id) {{
+                    var voter = voters[id];
+                    counts[voter.option] += 1;
+                    var item = document.createElement("li");
+                    item.textContent = voter.name + ": " + options[voter.option];
+                    list.appendChild(item);
+                }});
+                var max = Math.max.apply(null, counts.concat([1]));
+                var container = document.getElementById("options");
+                container.innerHTML = "";
+                options.forEach(function (option, i) {{
+                    var row = document.createElement("div");
+                    row.className = "option";
+                    row.textContent = option + ": " + counts[i];
+                    var bar = document.createElement("div");
+                    bar.className = "option-bar";
+                    bar.style.width = (counts[i] / max * 100) + "%";
+                    row.appendChild(bar);
+                    container.appendChild(row);
+                }});
+            }}
+
+            var source = new EventSource({events_url});
+            source.addEventListener("snapshot", function (e) {{
+                var data = JSON.parse(e.data);
+                options = data.options;
+                voters = {{}};
+                (data.voters || []).forEach(function (v) {{ voters[v.user_id] = v; }});
+                document.getElementById("state").textContent = data.active
+                    ? "Опрос идёт, ещё не проголосовали: " + data.not_voted
+                    : "Сейчас нет активного опроса";
+                render();
+            }});
+            source.addEventListener("vote", function (e) {{
+                var v = JSON.parse(e.data);
+                voters[v.user_id] = v;
+                render();
+            }});
+            source.addEventListener("closed", function () {{
+                document.getElementById("state").textContent = "Опрос завершён";
+            }});
+            source.onerror = function () {{
+                document.getElementById("state").textContent = "Переподключение…";
+            }};
+        </script>
+    </body>
+    </html>
+    """
+
+
+def is_admin_request(request):
+    """Checks the admin token sent as a Bearer token or as the Basic auth password"""
+    if not ADMIN_TOKEN:
+        return False
+
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        token = authorization[len("Bearer "):]
+    else:
+        try:
+            token = aiohttp.BasicAuth.decode(authorization).password
+        except ValueError:
+            return False
+    return secrets.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+def require_admin(request):
+    """Rejects requests without the admin token; the pages do not exist without one"""
+    if not ADMIN_TOKEN:
+        raise web.HTTPNotFound()
+    if not is_admin_request(request):
+        raise web.HTTPUnauthorized(headers={"WWW-Authenticate": 'Basic realm="HWGA admin"'})
+
+
+async def admin_handler(request):
+    """GET request handler for the cross-chat admin dashboard"""
+    require_admin(request)
+
+    sort = request.query.get("sort", "participation")
+    if sort not in db.CHAT_AGGREGATE_SORT_COLUMNS:
+        sort = "participation"
+
+    try:
+        chats = await db.get_chat_aggregates(sort)
+    except DatabaseError as e:
+        logger.error(f"Error loading chat aggregates: {e}")
+        return web.Response(text="Ошибка при загрузке статистики чатов", status=500)
+
+    return web.Response(
+        text=generate_admin_html(chats, sort),
+        content_type="text/html",
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+def generate_admin_html(chats, sort):
+    """Generates the admin dashboard with one row per chat"""
+    refreshed_at = chats[0]["refreshed_at"].strftime("%d.%m.%Y %H:%M") if chats else "никогда"
+
+    columns = [
+        ("polls", "Опросов"),
+        (None, "Голосов"),
+        (None, "Участников"),
+        ("participation", "Участие"),
+        ("last_activity", "Последний опрос"),
+        ("matches", "Матчей"),
+        ("win_rate", "Винрейт"),
+    ]
+    header_cells = "".join(
+        f'<th><a href="/admin?sort={key}">{title}</a></th>' if key and key != sort
+        else f"<th>{title}</th>"
+        for key, title in columns
+    )
+
+    rows = ""
+    for place, chat in enumerate(chats, start=1):
+        chat_name = escape(chat["chat_name"] or f"Чат {chat['chat_id']}")
+        last_poll_end = (
+            chat["last_poll_end"].strftime("%d.%m.%Y %H:%M") if chat["last_poll_end"] else "—"
+        )
+        win_rate = f"{chat['win_rate'] * 100:.1f}%" if chat["win_rate"] is not None else "—"
+        rows += f"""
+            <tr>
+                <td>{place}</td>
+                <td><a href="/stats/{escape(chat['chat_id'])}">{chat_name}</a></td>
+                <td>{chat["total_polls"]}</td>
+                <td>{chat["total_votes"]}</td>
+                <td>{chat["voters"]}</td>
+                <td>{chat["participation_rate"] * 100:.1f}%</td>
+                <td>{last_poll_end}</td>
+                <td>{chat["matches_stored"]}</td>
+                <td>{win_rate}</td>
+            </tr>
+        """
+
+    return f"""
+    <!DOCTYPE html>
+    <html lang="ru">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>HWGA — все чаты</title>
+        <style>
+            body {{
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                color: #333;
+                background-color: #f5f5f5;
+                margin: 0;
+                padding: 20px;
+            }}
+            table {{
+                width: 100%;
+                border-collapse: collapse;
+                background-color: white;
+                box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+            }}
+            th, td {{
+                padding: 10px;
+                text-align: left;
+                border-bottom: 1px solid #ddd;
+            }}
+            th {{
+                background-color: #2c3e50;
+                color: white;
+            }}
+            th a {{
+                color: white;
+            }}
+            .refreshed {{
+                color: #777;
+                margin-bottom: 15px;
+            }}
+        </style>
+    </head>
+    <body>
+        <h1>Все чаты</h1>
+        <div class="refreshed">Данные обновлены: {refreshed_at}</div>
+        <table>
+            <thead>
+                <tr><th>#</th><th>Чат</th>{header_cells}</tr>
+            </thead>
+            <tbody>
+                {rows}
+            </tbody>
+        </table>
+    </body>
+    </html>
+    """
+
+
+async def export_handler(request):
+    """GET request handler streaming a chat's data as CSV or NDJSON"""
+    require_admin(request)
+
+    chat_id = request.match_info["chat_id"]
+    export_format = request.match_info["format"]
+
+    # CSV holds one table (votes unless asked otherwise), NDJSON all of them by default
+    requested = request.query.get("tables", request.query.get("table", ""))
+    tables = [t for t in requested.split(",") if t]
+    if not tables:
+        tables = ["votes"] if export_format == "csv" else list(export.EXPORT_TABLES)
+    if any(t not in export.EXPORT_TABLES for t in tables):
+        return web.Response(text="Неизвестная таблица", status=400)
+    if export_format == "csv" and len(tables) != 1:
+        return web.Response(text="CSV содержит ровно одну таблицу", status=400)
+
+    filename = f"{chat_id}_{'_'.join(tables)}.{export_format}"
+    response = web.StreamResponse(
+        headers={
+            "Content-Type": "text/csv; charset=utf-8"
+            if export_format == "csv"
+            else "application/x-ndjson; charset=utf-8",
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+        }
+    )
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    async for chunk in export.iter_export(chat_id, export_format, tables, DATABASE):
+        await response.write(chunk.encode("utf-8"))
+
+    await response.write_eof()
+    return response
+
+
 def get_stats_url(chat_id):
     """Get URL for statistics"""
     # Use domain instead of IP address
@@ -1053,12 +1874,37 @@ def get_stats_url(chat_id):
     return f"{base_url}/stats/{chat_id}"
 
 
-async def start_web_server():
-    """Starts the web server"""
-    app = web.Application()
+def get_live_url(chat_id):
+    """Get URL of the live poll page"""
+    return f"{get_base_url()}/live/{chat_id}"
+
+
+async def client_session_ctx(app):
+    """Keeps one pooled client session for all outbound calls of the app"""
+    connector = aiohttp.TCPConnector(
+        limit=CLIENT_POOL_SIZE,
+        ttl_dns_cache=CLIENT_DNS_CACHE_TTL,
+        keepalive_timeout=CLIENT_KEEPALIVE_TIMEOUT,
+    )
+    async with aiohttp.ClientSession(connector=connector, timeout=CLIENT_TIMEOUT) as session:
+        app[CLIENT_SESSION_KEY] = session
+        yield
+
+
+def create_app(application=None):
+    """Creates the web application with all routes"""
+    app = web.Application(middlewares=[compression_middleware])
+    app[BOT_APPLICATION_KEY] = application
+    app.cleanup_ctx.append(client_session_ctx)
 
     # Routes for statistics
     app.router.add_get("/stats/{chat_id}", get_stats_handler)
+    app.router.add_get("/stats/{chat_id}/history", get_history_handler)
+    app.router.add_get("/stats/{chat_id}/charts/{name}.svg", get_chart_handler)
+
+    # Routes for the live poll page
+    app.router.add_get("/live/{chat_id}", live_page_handler)
+    app.router.add_get("/live/{chat_id}/events", live_events_handler)
 
     # Routes for Steam OpenID authorization
     app.router.add_get("/auth/steam/login/{telegram_id}", steam_login_handler)
@@ -1066,6 +1912,15 @@ async def start_web_server():
     app.router.add_get("/auth/steam/success", steam_success_handler)
     app.router.add_get("/auth/steam/cancel", steam_cancel_handler)
 
+    # Admin routes
+    app.router.add_get("/admin", admin_handler)
+    app.router.add_get("/export/{chat_id}.{format:csv|ndjson}", export_handler)
+
+    # Monitoring routes; a worker only answers liveness for itself
+    app.router.add_get("/metrics", proxy_to_bot_process if WORKER_MODE else metrics_handler)
+    app.router.add_get("/healthz", healthz_handler)
+    app.router.add_get("/readyz", proxy_to_bot_process if WORKER_MODE else readyz_handler)
+
     # Test route
     app.router.add_get(
         "/", lambda request: web.Response(text="HWGA Bot Web Server is running!")
@@ -1073,12 +1928,27 @@ async def start_web_server():
 
     app.router.add_static("/static/", path=STATIC_DIR, name="static")
 
+    return app
+
+
+async def start_web_server(application=None):
+    """Starts the web server"""
+    global _runner
+
+    app = create_app(application)
+
+    # Restore Steam logins that were in flight before a restart
+    if not WORKER_MODE:
+        await steam_auth_sessions.load()
+
     # Start the server
     runner = web.AppRunner(app)
     await runner.setup()
+    _runner = runner
 
     # Start HTTP server on the main port
-    http_site = web.TCPSite(runner, HOST, PORT)
+    # Worker processes share the listening ports through SO_REUSEPORT
+    http_site = web.TCPSite(runner, HOST, PORT, reuse_port=WORKER_MODE)
     await http_site.start()
     logger.info(f"HTTP web server started at http://{HOST}:{PORT}")
 
@@ -1098,7 +1968,9 @@ async def start_web_server():
 
         # Start HTTPS server on standard port 443
         try:
-            https_site = web.TCPSite(runner, HOST, 443, ssl_context=ssl_context)
+            https_site = web.TCPSite(
+                runner, HOST, 443, ssl_context=ssl_context, reuse_port=WORKER_MODE
+            )
             await https_site.start()
             logger.info(f"HTTPS web server started at https://{HOST}")
         except OSError as e:
@@ -1107,7 +1979,9 @@ async def start_web_server():
             logger.warning(
                 f"Failed to start HTTPS server on port 443: {e}. Trying port {alt_port}..."
             )
-            https_site = web.TCPSite(runner, HOST, alt_port, ssl_context=ssl_context)
+            https_site = web.TCPSite(
+                runner, HOST, alt_port, ssl_context=ssl_context, reuse_port=WORKER_MODE
+            )
             await https_site.start()
             logger.info(f"HTTPS web server started at https://{HOST}:{alt_port}")
     else:
@@ -1118,6 +1992,16 @@ async def start_web_server():
     return runner
 
 
+async def stop_web_server():
+    """Stops the web server and closes its outbound client session"""
+    global _runner
+
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
+        logger.info("Web server stopped")
+
+
 def format_user_votes_table(user_votes_data, poll_options):
     """Formats the table with user votes"""
     if not user_votes_data:
@@ -1304,6 +2188,100 @@ def get_base_url():
     return base_url
 
 
+async def call_bot_process(request, path, payload):
+    """Posts to the internal API of the bot process; returns None if it answers 404"""
+    session = request.app[CLIENT_SESSION_KEY]
+    async with session.post(
+        INTERNAL_API_URL + path,
+        json=payload,
+        headers={INTERNAL_TOKEN_HEADER: INTERNAL_API_TOKEN},
+    ) as resp:
+        if resp.status == 404:
+            return None
+        resp.raise_for_status()
+        return await resp.json()
+
+
+async def proxy_to_bot_process(request):
+    """Serves monitoring endpoints from the bot process, which owns the state they report"""
+    session = request.app[CLIENT_SESSION_KEY]
+    async with session.get(
+        INTERNAL_API_URL + request.path, headers={INTERNAL_TOKEN_HEADER: INTERNAL_API_TOKEN}
+    ) as resp:
+        return web.Response(
+            body=await resp.read(),
+            status=resp.status,
+            headers={
+                "Content-Type": resp.headers.get("Content-Type", "text/plain"),
+                "Cache-Control": "no-cache",
+            },
+        )
+
+
+async def create_steam_auth_session(request, telegram_id, chat_id):
+    """Starts a pending Steam login in the process that owns the session store"""
+    if WORKER_MODE:
+        data = await call_bot_process(
+            request, "/internal/steam/sessions", {"telegram_id": telegram_id, "chat_id": chat_id}
+        )
+        return data["token"]
+    return await steam_auth_sessions.create(telegram_id, chat_id)
+
+
+async def link_steam_session(session_token, steam_id):
+    """Links a verified Steam ID to the user of a pending login, returns (telegram_id, chat_id)"""
+    session_data = await steam_auth_sessions.pop(session_token)
+    if not session_data:
+        return None
+
+    telegram_id, chat_id = session_data
+
+    # Update the user's Steam ID in the database
+    if chat_id:
+        # Link to specific chat
+        await db.update_user_steam_id(telegram_id, steam_id, chat_id)
+        logger.info(
+            f"Updated Steam ID for Telegram user {telegram_id} in chat {chat_id}: {steam_id}"
+        )
+    else:
+        # Just update global Steam ID
+        await db.update_user_steam_id(telegram_id, steam_id)
+        logger.info(
+            f"Updated global Steam ID for Telegram user {telegram_id}: {steam_id}"
+        )
+
+    return telegram_id, chat_id
+
+
+async def complete_steam_link(request, session_token, steam_id):
+    """Completes a Steam login in the bot process, the only database writer"""
+    if WORKER_MODE:
+        data = await call_bot_process(
+            request, "/internal/steam/complete", {"session": session_token, "steam_id": steam_id}
+        )
+        return (data["telegram_id"], data["chat_id"]) if data else None
+    return await link_steam_session(session_token, steam_id)
+
+
+def get_signed_session_token(params):
+    """The session token of a Steam callback, taken from the return_to URL Steam signed
+
+    Returns None unless return_to points at our callback, is among the signed fields
+    and carries the same token as the callback's own query.
+    """
+    if "return_to" not in params.get("openid.signed", "").split(","):
+        return None
+    return_to = urlsplit(params.get("openid.return_to", ""))
+    expected = urlsplit(f"{get_base_url()}/auth/steam/callback")
+    if (return_to.scheme, return_to.netloc, return_to.path) != (expected.scheme, expected.netloc, expected.path):
+        return None
+    tokens = parse_qs(return_to.query).get("session", [])
+    query_token = params.get("session", "")
+    if len(tokens) != 1 or not secrets.compare_digest(tokens[0].encode("utf-8"), query_token.encode("utf-8")):
+        return None
+    return tokens[0]
+
+
 async def steam_login_handler(request):
     """Handles the initial Steam login request"""
     telegram_id = request.match_info.get("telegram_id", "")
@@ -1325,15 +2303,11 @@ async def steam_login_handler(request):
                     redirect_url = f"/auth/steam/success?telegram_id={telegram_id}&steam_id={user_info['steam_id']}&chat_id={chat_id}&already_linked=true"
                     return web.HTTPFound(redirect_url)
 
-        # Generate a unique session ID
-        session_id = secrets.token_hex(16)
-
-        # Store the session mapping with chat_id
-        steam_auth_sessions[session_id] = (telegram_id, chat_id)
-        telegram_auth_requests[telegram_id] = session_id
+        # Start a session; its token comes back to us through return_to
+        session_token = await create_steam_auth_session(request, telegram_id, chat_id)
 
         # Generate Steam OpenID parameters
-        return_url = f"{get_base_url()}/auth/steam/callback"
+        return_url = f"{get_base_url()}/auth/steam/callback?{urlencode({'session': session_token})}"
 
         params = {
             "openid.ns": "http://specs.openid.net/auth/2.0",
@@ -1345,7 +2319,7 @@ async def steam_login_handler(request):
         }
 
         # Construct the Steam OpenID URL
-        url = STEAM_OPENID_URL + "?" + "&".join([f"{k}={v}" for k, v in params.items()])
+        url = STEAM_OPENID_URL + "?" + urlencode(params)
 
         # Redirect the user to Steam
         return web.HTTPFound(url)
@@ -1375,56 +2349,41 @@ async def steam_callback_handler(request):
             return web.HTTPFound("/auth/steam/cancel")
 
         steam_id = steam_id_match.group(1)
-        logger.info(f"Successfully authenticated Steam ID: {steam_id}")
+
+        # Only return_to is signed, so the session token must come from there
+        session_token = get_signed_session_token(params)
+        if not session_token:
+            logger.error(f"Steam callback return_to does not match our session: {params.get('openid.return_to', '')}")
+            return web.HTTPFound("/auth/steam/cancel")
 
         # Verify the response with Steam
-        verification_params = dict(params)
+        verification_params = {k: v for k, v in params.items() if k.startswith("openid.")}
         verification_params["openid.mode"] = "check_authentication"
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(STEAM_OPENID_URL, data=verification_params) as resp:
-                verification_result = await resp.text()
-
-                if "is_valid:true" not in verification_result:
-                    logger.error(
-                        f"Steam OpenID verification failed: {verification_result}"
-                    )
-                    return web.HTTPFound("/auth/steam/cancel")
-
-        # Find the associated Telegram ID
-        # Since we can't store session in the browser easily for this use case,
-        # we'll check all pending authentications to find a match
-        for session_id, session_data in list(steam_auth_sessions.items()):
-            telegram_id, chat_id = session_data
-
-            # Update the user's Steam ID in the database
-            if chat_id:
-                # Link to specific chat
-                await db.update_user_steam_id(telegram_id, steam_id, chat_id)
-                logger.info(
-                    f"Updated Steam ID for Telegram user {telegram_id} in chat {chat_id}: {steam_id}"
-                )
-            else:
-                # Just update global Steam ID
-                await db.update_user_steam_id(telegram_id, steam_id)
-                logger.info(
-                    f"Updated global Steam ID for Telegram user {telegram_id}: {steam_id}"
+        session = request.app[CLIENT_SESSION_KEY]
+        async with session.post(STEAM_OPENID_URL, data=verification_params) as resp:
+            verification_result = await resp.text()
+
+            if "is_valid:true" not in verification_result:
+                logger.error(
+                    f"Steam OpenID verification failed: {verification_result}"
                 )
+                return web.HTTPFound("/auth/steam/cancel")
+        logger.info(f"Successfully authenticated Steam ID: {steam_id}")
 
-            # Clean up the auth session
-            del steam_auth_sessions[session_id]
-            if telegram_id in telegram_auth_requests:
-                del telegram_auth_requests[telegram_id]
+        # Find the associated Telegram ID by the token we put into return_to and link the account
+        session_data = await complete_steam_link(request, session_token, steam_id)
+        if not session_data:
+            return web.Response(
+                text="Не удалось найти сессию аутентификации. Пожалуйста, попробуйте снова.",
+                status=400,
+            )
 
-            # Redirect to success page showing the steam_id and telegram_id
-            success_url = f"/auth/steam/success?telegram_id={telegram_id}&steam_id={steam_id}&chat_id={chat_id}"
-            return web.HTTPFound(success_url)
+        telegram_id, chat_id = session_data
 
-        # If no matching session was found
-        return web.Response(
-            text="Не удалось найти сессию аутентификации. Пожалуйста, попробуйте снова.",
-            status=400,
-        )
+        # Redirect to success page showing the steam_id and telegram_id
+        success_url = f"/auth/steam/success?telegram_id={telegram_id}&steam_id={steam_id}&chat_id={chat_id}"
+        return web.HTTPFound(success_url)
 
     except Exception as e:
         logger.error(f"Error in steam_callback_handler: {e}")
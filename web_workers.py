@@ -0,0 +1,199 @@
+"""Runs the web server in separate worker processes, away from the bot's event loop.
+
+The bot process keeps the only writable database connection, the pending
+Steam logins and the live poll state. It serves a small internal API on
+localhost that the workers use to start and complete Steam logins, to relay
+live poll events and to report readiness and metrics.
+"""
+
+import asyncio
+import logging
+import os
+import secrets
+import signal
+import sys
+
+from aiohttp import web
+
+import metrics
+import web_server
+from auth_sessions import steam_auth_sessions
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Worker settings
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", 0))  # 0 serves the web app in the bot process
+INTERNAL_HOST = "127.0.0.1"
+INTERNAL_PORT = int(os.environ.get("WEB_INTERNAL_PORT", 8091))
+WORKER_RESTART_DELAY = 5  # seconds before a crashed worker is started again
+WORKER_STOP_TIMEOUT = 10  # seconds a worker gets to exit before it is killed
+
+INTERNAL_TOKEN_KEY = web.AppKey("internal_token", str)
+
+# Supervisor of the running workers, used for a clean shutdown
+_supervisor = None
+
+
+@web.middleware
+async def internal_auth_middleware(request, handler):
+    """Only lets requests carrying the token given to our own workers through"""
+    token = request.headers.get(web_server.INTERNAL_TOKEN_HEADER, "")
+    if not secrets.compare_digest(token, request.app[INTERNAL_TOKEN_KEY]):
+        raise web.HTTPForbidden()
+    return await handler(request)
+
+
+async def internal_create_session_handler(request):
+    """Starts a pending Steam login for a worker"""
+    data = await request.json()
+    token = await steam_auth_sessions.create(str(data["telegram_id"]), data.get("chat_id") or "")
+    return web.json_response({"token": token})
+
+
+async def internal_complete_session_handler(request):
+    """Links the Steam ID verified by a worker to the user of the pending login"""
+    data = await request.json()
+    session_data = await web_server.link_steam_session(data["session"], data["steam_id"])
+    if not session_data:
+        raise web.HTTPNotFound()
+
+    telegram_id, chat_id = session_data
+    return web.json_response({"telegram_id": telegram_id, "chat_id": chat_id})
+
+
+def create_internal_app(application, token):
+    """Creates the internal API the workers call back into"""
+    app = web.Application(middlewares=[internal_auth_middleware])
+    app[INTERNAL_TOKEN_KEY] = token
+    app[web_server.BOT_APPLICATION_KEY] = application
+
+    app.router.add_post("/internal/steam/sessions", internal_create_session_handler)
+    app.router.add_post("/internal/steam/complete", internal_complete_session_handler)
+    app.router.add_get("/internal/live/{chat_id}/events", web_server.live_events_handler)
+    app.router.add_get("/metrics", web_server.metrics_handler)
+    app.router.add_get("/readyz", web_server.readyz_handler)
+
+    return app
+
+
+class WebWorkerSupervisor:
+    """Starts the worker processes, restarts them when they die and stops them on shutdown"""
+
+    def __init__(self, application, workers):
+        self.application = application
+        self.workers = workers
+        self.token = secrets.token_urlsafe(32)
+        self.processes = {}
+        self.tasks = []
+        self.runner = None
+        self.stopping = False
+
+    async def start(self):
+        await steam_auth_sessions.load()
+
+        self.runner = web.AppRunner(create_internal_app(self.application, self.token))
+        await self.runner.setup()
+        await web.TCPSite(self.runner, INTERNAL_HOST, INTERNAL_PORT).start()
+        logger.info(f"Internal API for web workers started at http://{INTERNAL_HOST}:{INTERNAL_PORT}")
+
+        for worker_id in range(self.workers):
+            self.tasks.append(asyncio.create_task(self._run_worker(worker_id)))
+
+    def _worker_env(self, worker_id):
+        env = dict(os.environ)
+        env.update(
+            {
+                "DB_READ_ONLY": "1",
+                "WEB_WORKER_ID": str(worker_id),
+                "WEB_INTERNAL_API_URL": f"http://{INTERNAL_HOST}:{INTERNAL_PORT}",
+                "WEB_INTERNAL_API_TOKEN": self.token,
+            }
+        )
+        return env
+
+    async def _run_worker(self, worker_id):
+        while not self.stopping:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                os.path.abspath(__file__),
+                env=self._worker_env(worker_id),
+                cwd=os.getcwd(),
+            )
+            self.processes[worker_id] = process
+            logger.info(f"Started web worker {worker_id} (pid {process.pid})")
+
+            returncode = await process.wait()
+            if self.stopping:
+                break
+            logger.error(
+                f"Web worker {worker_id} exited with code {returncode}, "
+                f"restarting in {WORKER_RESTART_DELAY}s"
+            )
+            await asyncio.sleep(WORKER_RESTART_DELAY)
+
+    async def stop(self):
+        self.stopping = True
+
+        running = [p for p in self.processes.values() if p.returncode is None]
+        for process in running:
+            process.terminate()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(p.wait() for p in running)), WORKER_STOP_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            for process in running:
+                if process.returncode is None:
+                    logger.warning(f"Web worker pid {process.pid} did not stop, killing it")
+                    process.kill()
+
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        if self.runner is not None:
+            await self.runner.cleanup()
+        logger.info("Web workers stopped")
+
+
+async def start_web_workers(application):
+    """Starts the supervised web worker processes"""
+    global _supervisor
+
+    _supervisor = WebWorkerSupervisor(application, WEB_WORKERS)
+    await _supervisor.start()
+    return _supervisor
+
+
+async def stop_web_workers():
+    """Stops the web worker processes and the internal API"""
+    global _supervisor
+
+    if _supervisor is not None:
+        await _supervisor.stop()
+        _supervisor = None
+
+
+async def serve_worker():
+    """Serves the web app in this worker process until it is told to stop"""
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    monitor_task = asyncio.create_task(metrics.monitor_event_loop_lag())
+    await web_server.start_web_server()
+    try:
+        await stop_event.wait()
+    finally:
+        monitor_task.cancel()
+        await web_server.stop_web_server()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format=f"%(asctime)s - worker {os.environ.get('WEB_WORKER_ID', '?')} - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+    asyncio.run(serve_worker())
@@ -2,11 +2,11 @@
 
 import asyncio
 import logging
-import aiohttp
 import sqlite3
-import os
 import sys
 
+import steam
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -17,7 +17,6 @@ logger = logging.getLogger(__name__)
 
 # Constants
 DB_FILE = "poll_bot.db"
-STEAM_API_KEY = os.environ.get("STEAM_API_KEY", "")
 
 
 async def get_steam_users():
@@ -44,84 +43,19 @@ async def get_steam_users():
         return []
 
 
-async def check_steam_status(steam_id, steam_api_key):
-    """Checks the status of a user on Steam"""
-    if not steam_api_key:
-        logger.warning("Steam API key не указан, невозможно проверить статус")
-        return None
-
-    try:
-        async with aiohttp.ClientSession() as session:
-            url = f"https://api.steampowered.com/ISteamUser/GetPlayerSummaries/v2/?key={steam_api_key}&steamids={steam_id}"
-
-            # Retry mechanism to handle error 429
-            max_retries = 3
-            for retry in range(max_retries):
-                try:
-                    async with session.get(url) as response:
-                        if response.status == 429:  # Too Many Requests
-                            logger.warning(
-                                f"Ошибка API Steam 429 для пользователя со Steam ID {steam_id}, попытка {retry + 1}/{max_retries}"
-                            )
-                            if retry < max_retries - 1:
-                                wait_time = (retry + 1) * 5
-                                await asyncio.sleep(wait_time)
-                                continue
-                            else:
-                                logger.error(
-                                    f"Достигнуто максимальное число попыток для Steam ID {steam_id}"
-                                )
-                                return None
-
-                        if response.status != 200:
-                            logger.error(
-                                f"API Steam вернул статус {response.status} для Steam ID {steam_id}"
-                            )
-                            return None
-
-                        data = await response.json()
-                        players = data.get("response", {}).get("players", [])
-                        if players:
-                            player = players[0]
-                            persona_state = player.get("personastate", 0)
-                            game_id = player.get("gameid")
-                            game_name = player.get("gameextrainfo")
-
-                            logger.info(
-                                f"Статус Steam для Steam ID {steam_id}: персона={persona_state}, игра={game_name} ({game_id})"
-                            )
-
-                            return {
-                                "persona_state": persona_state,
-                                "game_id": game_id,
-                                "game_name": game_name,
-                                "username": player.get("personaname", "Unknown"),
-                            }
-                        else:
-                            logger.warning(
-                                f"Не найдены данные игрока для Steam ID: {steam_id}"
-                            )
-                            return None
-
-                        # Successfully received data, exiting the loop
-                        break
-                except Exception as e:
-                    logger.error(
-                        f"Ошибка запроса API Steam для Steam ID {steam_id}: {e}"
-                    )
-                    if retry < max_retries - 1:
-                        wait_time = (retry + 1) * 5
-                        await asyncio.sleep(wait_time)
-                    else:
-                        return None
-    except Exception as e:
-        logger.error(f"Ошибка проверки статуса Steam для Steam ID {steam_id}: {e}")
-        return None
+def get_user_status(summary):
+    """Extracts the online and game status from a Steam player summary"""
+    return {
+        "persona_state": summary.get("personastate", 0),
+        "game_id": summary.get("gameid"),
+        "game_name": summary.get("gameextrainfo"),
+        "username": summary.get("personaname", "Unknown"),
+    }
 
 
 async def main():
     """Main function for checking the online status of Steam users"""
-    if not STEAM_API_KEY:
+    if not steam.STEAM_API_KEY:
         logger.error(
             "STEAM_API_KEY не установлен. Установите переменную окружения STEAM_API_KEY."
         )
@@ -141,7 +75,15 @@ async def main():
             {"telegram_id": telegram_id, "steam_id": steam_id, "first_name": first_name}
         )
 
-    # Check the status of each user in each chat
+    # Every account is requested once, in batches of up to 100, however many chats it is in
+    try:
+        summaries = await steam.get_player_summaries(
+            user["steam_id"] for users in users_by_chat.values() for user in users
+        )
+    finally:
+        await steam.close_opendota_session()
+    logger.info(f"Получены статусы {len(summaries)} аккаунтов Steam")
+
     for chat_id, users in users_by_chat.items():
         logger.info(f"Проверка {len(users)} пользователей в чате {chat_id}")
 
@@ -149,31 +91,32 @@ async def main():
         in_game_users = []
 
         for user in users:
-            # Add a small delay between requests
-            await asyncio.sleep(1)
-
-            user_status = await check_steam_status(user["steam_id"], STEAM_API_KEY)
-
-            if user_status:
-                # Check persona status (0 = offline, 1+ = online)
-                if user_status["persona_state"] > 0:
-                    online_users.append(user["first_name"])
-                    logger.info(f"Пользователь {user['first_name']} онлайн")
-
-                    # Check if the user is playing a game
-                    if user_status["game_id"]:
-                        in_game_users.append(
-                            {
-                                "name": user["first_name"],
-                                "game": user_status["game_name"]
-                                or f"Игра ID {user_status['game_id']}",
-                            }
-                        )
-                        logger.info(
-                            f"Пользователь {user['first_name']} играет в {user_status['game_name'] or user_status['game_id']}"
-                        )
-                else:
-                    logger.info(f"Пользователь {user['first_name']} офлайн")
+            summary = summaries.get(str(user["steam_id"]))
+            if not summary:
+                logger.warning(f"Не найдены данные игрока для Steam ID: {user['steam_id']}")
+                continue
+
+            user_status = get_user_status(summary)
+
+            # Check persona status (0 = offline, 1+ = online)
+            if user_status["persona_state"] > 0:
+                online_users.append(user["first_name"])
+                logger.info(f"Пользователь {user['first_name']} онлайн")
+
+                # Check if the user is playing a game
+                if user_status["game_id"]:
+                    in_game_users.append(
+                        {
+                            "name": user["first_name"],
+                            "game": user_status["game_name"]
+                            or f"Игра ID {user_status['game_id']}",
+                        }
+                    )
+                    logger.info(
+                        f"Пользователь {user['first_name']} играет в {user_status['game_name'] or user_status['game_id']}"
+                    )
+            else:
+                logger.info(f"Пользователь {user['first_name']} офлайн")
 
         log_chat_results(chat_id, users, online_users, in_game_users)
 